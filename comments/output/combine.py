@@ -1,47 +1,193 @@
+import argparse
 import glob
+import hashlib
+import heapq
+import itertools
 import json
 import os
+import re
+import sys
+import tempfile
 
+try:
+    from youtube_comment_downloader.reader import CommentStream
+except ImportError:
+    # Running from a checkout in which the package is not installed
+    sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..'))
+    from youtube_comment_downloader.reader import CommentStream
 
-def combine_json_files():
-    # Initialize the combined structure
-    combined_data = {
-        "tutorial_ideas": [],
-        "use_cases": [],
-        "technical_questions": [],
-        "problem_statements": []
-    }
-    
-    # Get all JSON files in the current directory
-    json_files = glob.glob("*.json")
-    
-    # Process each JSON file
-    for file_path in json_files:
+CATEGORIES = ["tutorial_ideas", "use_cases", "technical_questions", "problem_statements"]
+
+VOTE_MULTIPLIERS = {"K": 10 ** 3, "M": 10 ** 6, "B": 10 ** 9}
+
+# The merge reads from every file at the same time, so it keeps the number of open files and the size of the read
+# buffers small. With more files than MAX_OPEN_FILES, groups of files are merged into temporary files first.
+MAX_OPEN_FILES = 64
+MERGE_CHUNK_SIZE = 1 << 12
+
+
+def iter_entries(file_path, category=None, chunk_size=MERGE_CHUNK_SIZE):
+    """Yield (category, entry) for the entries in a processed file, optionally only those of a single category"""
+    with open(file_path, 'r', encoding='utf-8') as file:
+        for key, entry in CommentStream(file, chunk_size=chunk_size).items():
+            if category is None or key == category:
+                yield key, entry
+
+
+def parse_votes(value):
+    """Convert a vote count (a number, or text such as '15', '1,234' or '1.2K') into an integer, 0 if unknown"""
+    if isinstance(value, bool):
+        return int(value)
+    if isinstance(value, (int, float)):
+        return int(value)
+    text = str(value or '').strip().replace(' ', '').upper()
+    multiplier = VOTE_MULTIPLIERS.get(text[-1:], 1)
+    if multiplier > 1:
+        text = text[:-1].replace(',', '.')
+    else:
+        text = text.replace(',', '')
+    try:
+        return int(round(float(text) * multiplier))
+    except ValueError:
+        return 0
+
+
+def normalize_entry(entry):
+    """Return a copy of the entry with the votes as an integer and hearted as a boolean"""
+    return dict(entry, votes=parse_votes(entry.get('votes', 0)), hearted=bool(entry.get('hearted', False)))
+
+
+def sort_key(entry):
+    return (entry['votes'], entry['hearted'])
+
+
+def get_dedupe_key(entry):
+    """Entries that only differ in case, whitespace or punctuation get the same key"""
+    text = f"{entry.get('author', '')}\n{entry.get('content', '')}".casefold()
+    text = ' '.join(re.sub(r'[^\w\s]', ' ', text).split())
+    return hashlib.sha1(text.encode('utf-8')).digest()
+
+
+def find_unsorted_categories(file_path):
+    """Return the categories of a processed file whose entries are not sorted by votes (highest to lowest)"""
+    unsorted = set()
+    last_votes = {}
+    for category, entry in iter_entries(file_path):
+        votes = parse_votes(entry.get('votes', 0))
+        if votes > last_votes.get(category, votes):
+            unsorted.add(category)
+        last_votes[category] = votes
+    return unsorted
+
+
+def iter_sorted(file_path, category, presorted=True):
+    """Yield the normalized entries of one category of a file, sorted by votes and hearted (highest first).
+
+    Files written by parse-comments.py are sorted by votes already, so those are streamed and only entries with
+    the same number of votes are reordered. Other files are sorted in memory.
+    """
+    entries = (normalize_entry(entry) for _, entry in iter_entries(file_path, category))
+    if not presorted:
+        yield from sorted(entries, key=sort_key, reverse=True)
+        return
+    for _, group in itertools.groupby(entries, key=lambda entry: entry['votes']):
+        yield from sorted(group, key=sort_key, reverse=True)
+
+
+def write_run(file_path, entries):
+    """Write merged entries to a temporary file, one JSON document per line"""
+    with open(file_path, 'w', encoding='utf-8') as file:
+        for entry in entries:
+            file.write(json.dumps(entry, ensure_ascii=False) + '\n')
+
+
+def iter_run(file_path):
+    """Yield the entries of a file written by write_run, and remove it once it has been read"""
+    with open(file_path, 'r', encoding='utf-8') as file:
+        for line in file:
+            yield json.loads(line)
+    os.remove(file_path)
+
+
+def merge_category(file_paths, category, unsorted=None, dedupe=False, max_open=MAX_OPEN_FILES):
+    """Merge the entries of one category from all files, highest votes first.
+
+    At most max_open files are read at the same time. With more files than that, the merge is done in rounds: groups
+    of max_open files are merged into temporary files, which are then merged in turn.
+    """
+    unsorted = unsorted or {}
+    # The files are only opened once the merge starts reading from them
+    iterators = [iter_sorted(file_path, category, category not in unsorted.get(file_path, ()))
+                 for file_path in file_paths]
+    with tempfile.TemporaryDirectory() as directory:
+        merge_round = 0
+        while len(iterators) > max_open:
+            runs = []
+            for start in range(0, len(iterators), max_open):
+                run = os.path.join(directory, f'{merge_round}_{start}.jsonl')
+                write_run(run, heapq.merge(*iterators[start:start + max_open], key=sort_key, reverse=True))
+                runs.append(iter_run(run))
+            iterators = runs
+            merge_round += 1
+
+        merged = heapq.merge(*iterators, key=sort_key, reverse=True)
+        if not dedupe:
+            yield from merged
+            return
+        # Only a short digest per entry is kept, and the first (highest voted) copy of an entry wins
+        seen = set()
+        for entry in merged:
+            key = get_dedupe_key(entry)
+            if key not in seen:
+                seen.add(key)
+                yield entry
+
+
+def write_combined(output_file, file_paths, unsorted=None, dedupe=False):
+    """Write the merged categories to output_file, formatted like json.dump(..., indent=4). Returns the number of
+    entries per category"""
+    counts = {}
+    with open(output_file, 'w', encoding='utf-8') as f:
+        f.write('{')
+        for index, category in enumerate(CATEGORIES):
+            f.write(f'{"," if index else ""}\n    {json.dumps(category)}: [')
+            count = 0
+            for count, entry in enumerate(merge_category(file_paths, category, unsorted, dedupe), 1):
+                # Strings never contain raw newlines, so the entry can be indented line by line
+                text = json.dumps(entry, indent=4, ensure_ascii=False).replace('\n', '\n        ')
+                f.write(f'{"," if count > 1 else ""}\n        {text}')
+            f.write('\n    ]' if count else ']')
+            counts[category] = count
+        f.write('\n}')
+    return counts
+
+
+def combine_json_files(directory='.', output_file='combined_comments.json', pattern='processed_*.json', dedupe=False):
+    # Get all processed files, skipping any that cannot be read
+    file_paths = []
+    unsorted = {}
+    for file_path in sorted(glob.glob(os.path.join(directory, pattern))):
+        if os.path.abspath(file_path) == os.path.abspath(output_file):
+            continue
         try:
-            with open(file_path, 'r', encoding='utf-8') as file:
-                data = json.load(file)
-                
-                # Combine each category
-                for category in combined_data.keys():
-                    if category in data:
-                        combined_data[category].extend(data[category])
+            unsorted[file_path] = find_unsorted_categories(file_path)
+            file_paths.append(file_path)
         except Exception as e:
             print(f"Error processing {file_path}: {str(e)}")
-    
-    # Sort each category by votes (highest to lowest)
-    for category in combined_data.keys():
-        combined_data[category] = sorted(
-            combined_data[category],
-            key=lambda x: (x.get('votes', 0), x.get('hearted', False)),
-            reverse=True
-        )
-    
-    # Save the combined data to a new JSON file
-    output_file = "combined_comments.json"
-    with open(output_file, 'w', encoding='utf-8') as f:
-        json.dump(combined_data, f, indent=4, ensure_ascii=False)
-    
-    print(f"Successfully combined {len(json_files)} files into {output_file}")
+
+    counts = write_combined(output_file, file_paths, unsorted, dedupe)
+    print(f"Successfully combined {len(file_paths)} files into {output_file} ({sum(counts.values())} entries)")
+    return counts
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Combine the processed comment files into a single file, sorted by votes')
+    parser.add_argument('--directory', '-d', default='.', help='Directory with the processed files. Defaults to the current directory')
+    parser.add_argument('--output', '-o', default='combined_comments.json', help='Output file. Defaults to combined_comments.json')
+    parser.add_argument('--pattern', '-p', default='processed_*.json', help='Pattern of the processed files. Defaults to processed_*.json')
+    parser.add_argument('--dedupe', action='store_true', help='Drop entries by the same author that only differ in case, whitespace or punctuation')
+    args = parser.parse_args(argv)
+    combine_json_files(args.directory, args.output, args.pattern, args.dedupe)
 
 if __name__ == "__main__":
-    combine_json_files()
+    main()
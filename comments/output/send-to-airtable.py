@@ -1,13 +1,30 @@
+import hashlib
 import json
 import os
+import random
+import sys
+import threading
+import time
 from datetime import datetime
-from typing import Dict, List
+from typing import Dict, List, Optional
 
 import requests
-from dotenv import load_dotenv
 
-# Load environment variables
-load_dotenv()
+try:
+    from youtube_comment_downloader.retry import parse_retry_after
+except ImportError:
+    # Running from a checkout in which the package is not installed
+    sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..'))
+    from youtube_comment_downloader.retry import parse_retry_after
+
+try:
+    from dotenv import load_dotenv
+except ImportError:
+    # Without python-dotenv, the variables have to be set in the environment
+    pass
+else:
+    # Load environment variables
+    load_dotenv()
 
 # Get environment variables
 AIRTABLE_API_KEY = os.getenv('AIRTABLE_API_KEY')
@@ -15,9 +32,20 @@ BASE_ID = os.getenv('AIRTABLE_BASE_ID')
 TABLE_ID = os.getenv('AIRTABLE_TABLE_ID')
 API_VERSION = os.getenv('AIRTABLE_API_VERSION')
 
-# Validate environment variables
-if not all([AIRTABLE_API_KEY, BASE_ID, TABLE_ID, API_VERSION]):
-    raise ValueError("Missing required environment variables. Please check your .env file.")
+AIRTABLE_API_URL = "https://api.airtable.com/v0"
+# Airtable accepts at most 10 records per request and 5 requests per second per base
+MAX_BATCH_SIZE = 10
+REQUESTS_PER_SECOND = 5
+# How long Airtable wants clients to wait after exceeding the rate limit
+RATE_LIMIT_PENALTY = 30
+
+# File with the comments to upload
+INPUT_FILE = 'combined_comments.json'
+# Local index of what has been uploaded, so that later runs only send new and changed records. It is kept next to
+# the input file.
+SYNC_STATE_FILE = 'airtable_sync_state.json'
+# Field holding the stable key of a record, used to upsert records
+SYNC_KEY_FIELD = 'Sync_Key'
 
 # Headers with API versioning
 headers = {
@@ -150,7 +178,8 @@ def analyze_schema(schema_data):
         "Votes": ("number", None),
         "Hearted": ("checkbox", None),
         "Has_Replies": ("checkbox", None),
-        "Last_Updated": ("dateTime", None)
+        "Last_Updated": ("dateTime", None),
+        SYNC_KEY_FIELD: ("singleLineText", None)
     }
     
     existing_fields = {field['name']: field['type'] for field in target_table.get('fields', [])}
@@ -175,31 +204,179 @@ def load_json_data(filepath: str) -> Dict:
         print(f"Error loading JSON file: {str(e)}")
         return None
 
-def create_record(record_data: Dict):
-    """Create a single record in Airtable"""
-    url = f"https://api.airtable.com/v0/{BASE_ID}/{TABLE_ID}"
-    
-    try:
-        response = requests.post(
-            url,
-            headers=headers,
-            json={"fields": record_data}
-        )
-        
-        if response.status_code == 200:
-            return True
-        else:
-            print(f"Error creating record: {response.status_code}")
-            print(f"Response: {response.text}")
-            return False
-            
-    except requests.exceptions.RequestException as e:
-        print(f"Error creating record: {str(e)}")
-        if hasattr(e, 'response') and e.response is not None:
-            print(f"Response: {e.response.text}")
-        return False
+class BatchFailure:
+    """A batch of records that could not be uploaded"""
+
+    def __init__(self, batch_number: int, records: List[Dict], error: str):
+        self.batch_number = batch_number
+        self.records = records
+        self.error = error
+
+    def __repr__(self):
+        return f"BatchFailure(batch {self.batch_number}, {len(self.records)} records: {self.error})"
+
+class AirtableUploader:
+    """Uploads records in batches of MAX_BATCH_SIZE over a single pooled session.
+
+    Requests are spaced out to stay under the per-base rate limit, and rate limited (429) or failed (5xx, connection
+    errors) requests are retried with exponential backoff. The session can be replaced by a local stand-in.
+    """
+
+    def __init__(self, base_id: str, table_id: str, api_key: str, session=None, api_url: str = AIRTABLE_API_URL,
+                 requests_per_second: float = REQUESTS_PER_SECOND, max_retries: int = 5, backoff: float = 1):
+        self.url = f"{api_url}/{base_id}/{table_id}"
+        self.session = session or requests.Session()
+        self.session.headers.update({
+            "Authorization": f"Bearer {api_key}",
+            "Content-Type": "application/json",
+            "User-Agent": "Python/AirtableAPI"
+        })
+        self.interval = 1.0 / requests_per_second
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.lock = threading.Lock()
+        self.next_request = 0.0
+
+    def _wait_for_slot(self):
+        """Space out requests so that we never exceed the rate limit"""
+        with self.lock:
+            now = time.monotonic()
+            delay = self.next_request - now
+            self.next_request = max(now, self.next_request) + self.interval
+        if delay > 0:
+            time.sleep(delay)
+
+    def _delay_all_requests(self, seconds: float):
+        with self.lock:
+            self.next_request = max(self.next_request, time.monotonic() + seconds)
+
+    def request(self, method: str, payload: Dict) -> Dict:
+        """Send a request, retrying when rate limited or when the server fails. Returns the JSON response"""
+        for attempt in range(self.max_retries + 1):
+            self._wait_for_slot()
+            try:
+                response = self.session.request(method, self.url, json=payload, timeout=60)
+            except requests.exceptions.RequestException as e:
+                error = str(e)
+            else:
+                if response.status_code == 200:
+                    return response.json()
+                error = f"{response.status_code}: {response.text}"
+                if response.status_code == 429:
+                    # Airtable blocks all requests for a while after the rate limit was exceeded
+                    retry_after = parse_retry_after(response.headers.get('Retry-After'))
+                    self._delay_all_requests(retry_after if retry_after is not None else RATE_LIMIT_PENALTY)
+                    continue
+                if response.status_code < 500:
+                    # Invalid records, permissions, etc. Retrying would not help.
+                    raise RuntimeError(error)
+
+            if attempt < self.max_retries:
+                time.sleep(self.backoff * 2 ** attempt * (0.5 + random.random() / 2))
+        raise RuntimeError(f"giving up after {self.max_retries + 1} attempts ({error})")
+
+    def send_batches(self, method: str, records: List[Dict], callback=None, options: Dict = None):
+        """Send the records in batches, adding the options to every request. Returns the resulting records (None for
+        records in failed batches) together with a list of BatchFailures"""
+        results: List[Optional[Dict]] = []
+        failures = []
+        for start in range(0, len(records), MAX_BATCH_SIZE):
+            batch = records[start:start + MAX_BATCH_SIZE]
+            batch_number = start // MAX_BATCH_SIZE + 1
+            failure = None
+            try:
+                response = self.request(method, dict(options or {}, records=batch))
+                results.extend(response["records"])
+            except Exception as e:
+                failure = BatchFailure(batch_number, batch, str(e))
+                failures.append(failure)
+                results.extend([None] * len(batch))
+            if callback:
+                callback(batch_number, failure)
+        return results, failures
+
+    def create_records(self, records: List[Dict], callback=None):
+        """Create records from the given fields"""
+        return self.send_batches("POST", [{"fields": fields} for fields in records], callback)
+
+    def upsert_records(self, records: List[Dict], merge_on: List[str], callback=None):
+        """Update the records that have the same values for the merge_on fields, and create the others"""
+        return self.send_batches("PATCH", [{"fields": fields} for fields in records], callback,
+                                 {"performUpsert": {"fieldsToMergeOn": merge_on}})
+
+def get_sync_key(fields: Dict) -> str:
+    """Stable key of a record: its category and author, plus a hash of its content"""
+    content_hash = hashlib.sha256(fields["Content"].encode('utf-8')).hexdigest()[:16]
+    return f"{fields['Category']}|{fields['Author']}|{content_hash}"
+
+def hash_fields(fields: Dict) -> str:
+    """Hash of the fields that matter for deciding whether a record changed"""
+    relevant = {name: value for name, value in fields.items() if name != "Last_Updated"}
+    return hashlib.sha256(json.dumps(relevant, sort_keys=True, ensure_ascii=False).encode('utf-8')).hexdigest()
+
+def get_sync_state_path(input_file: str) -> str:
+    """The sync state belongs to the input file, so it is kept next to it regardless of the current directory"""
+    return os.path.join(os.path.dirname(os.path.abspath(input_file)), SYNC_STATE_FILE)
+
+def load_sync_state(filepath: str) -> Dict:
+    """Load the sync state, which maps sync keys to the record ID and field hash of the last upload"""
+    if not os.path.exists(filepath):
+        return {}
+    with open(filepath, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+def save_sync_state(filepath: str, state: Dict):
+    tmp_filepath = filepath + '.tmp'
+    with open(tmp_filepath, 'w', encoding='utf-8') as f:
+        json.dump(state, f, indent=2, ensure_ascii=False)
+    os.replace(tmp_filepath, filepath)
+
+def sync_records(uploader: AirtableUploader, records: List[Dict], state: Dict, callback=None):
+    """Upsert the records that are new or changed since the last sync, and update the state accordingly.
+
+    Records are upserted on their sync key, so that nothing gets duplicated even if the state file is lost.
+    Returns the number of records that were sent and a list of BatchFailures.
+    """
+    changed = {}
+    for fields in records:
+        key = get_sync_key(fields)
+        fields = dict(fields, **{SYNC_KEY_FIELD: key})
+        if state.get(key, {}).get("hash") != hash_fields(fields):
+            # If the same record occurs more than once, the last one wins
+            changed[key] = fields
+
+    changed_records = list(changed.values())
+    results, failures = uploader.upsert_records(changed_records, [SYNC_KEY_FIELD], callback)
+    for fields, result in zip(changed_records, results):
+        if result is not None:
+            state[fields[SYNC_KEY_FIELD]] = {"id": result["id"], "hash": hash_fields(fields)}
+    return len(changed_records), failures
+
+def build_records(json_data: Dict) -> List[Dict]:
+    """Convert the combined comments into Airtable fields"""
+    last_updated = datetime.utcnow().isoformat()
+    records = []
+    for category, comments in json_data.items():
+        for comment in comments:
+            records.append({
+                "Category": category,
+                "Content": comment["content"],
+                "Author": comment["author"],
+                "Votes": comment["votes"],
+                "Hearted": comment["hearted"],
+                "Has_Replies": comment["has_replies"],
+                "Last_Updated": last_updated
+            })
+    return records
+
+def print_progress(batch_number: int, failure: Optional[BatchFailure]):
+    print("x" if failure else ".", end="", flush=True)  # Progress indicator per batch
 
 def main():
+    # Validate environment variables
+    if not all([AIRTABLE_API_KEY, BASE_ID, TABLE_ID, API_VERSION]):
+        raise ValueError("Missing required environment variables. Please check your .env file.")
+
     print("Getting current base schema...")
     schema_data = get_base_schema()
     
@@ -226,37 +403,27 @@ def main():
                 return
         
         # Load the JSON data
-        json_data = load_json_data('combined_comments.json')
+        json_data = load_json_data(INPUT_FILE)
         if not json_data:
             print("Failed to load JSON data")
             return
         
-        # Process and upload each category
-        total_records = 0
-        successful_records = 0
-        
-        for category, comments in json_data.items():
-            print(f"\nProcessing category: {category}")
-            
-            for comment in comments:
-                record_data = {
-                    "Category": category,
-                    "Content": comment["content"],
-                    "Author": comment["author"],
-                    "Votes": comment["votes"],
-                    "Hearted": comment["hearted"],
-                    "Has_Replies": comment["has_replies"],
-                    "Last_Updated": datetime.utcnow().isoformat()
-                }
-                
-                total_records += 1
-                if create_record(record_data):
-                    successful_records += 1
-                    print(".", end="", flush=True)  # Progress indicator
-                else:
-                    print("x", end="", flush=True)  # Error indicator
-        
-        print(f"\n\nUpload complete! Successfully uploaded {successful_records} of {total_records} records.")
+        # Upload the records that are new or changed since the last run, in batches
+        records = build_records(json_data)
+        uploader = AirtableUploader(BASE_ID, TABLE_ID, AIRTABLE_API_KEY)
+        state_file = get_sync_state_path(INPUT_FILE)
+        state = load_sync_state(state_file)
+        print(f"\nSyncing {len(records)} records...")
+        try:
+            sent, failures = sync_records(uploader, records, state, callback=print_progress)
+        finally:
+            save_sync_state(state_file, state)
+
+        for failure in failures:
+            print(f"\nBatch {failure.batch_number} failed: {failure.error}")
+        failed_records = sum(len(failure.records) for failure in failures)
+        print(f"\n\nUpload complete! Successfully uploaded {sent - failed_records} of {sent} new or changed records "
+              f"({len(records) - sent} unchanged).")
     else:
         print("Unable to proceed without schema information")
 
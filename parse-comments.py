@@ -1,17 +1,46 @@
+import hashlib
 import json
 import os
+import threading
 import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from pathlib import Path
 from html import unescape
 
-from openai import OpenAI
+from youtube_comment_downloader.reader import read_comments
 
-# WSL paths for JSON input files and output directory
+# WSL paths for JSON input files and output directory (can be overridden in config.json)
 json_directory = r'\\wsl.localhost\Ubuntu\home\richa\youtube-comment-downloader\youtube-comment-downloader\comments'
 output_directory = r'\\wsl.localhost\Ubuntu\home\richa\youtube-comment-downloader\youtube-comment-downloader\comments\output'
 
-# Ensure the output directory exists
-os.makedirs(output_directory, exist_ok=True)
+# Settings that can be overridden in config.json
+DEFAULT_SETTINGS = {
+    "json_directory": json_directory,
+    "output_directory": output_directory,
+    "model": "gpt-4o-mini",
+    "temperature": 0.1,
+    "max_tokens": 16384,
+    "workers": 4,
+    "requests_per_minute": 500,
+    "tokens_per_minute": 200000,
+    # Large files are split into chunks of at most this many tokens, which are processed in parallel
+    "chunk_tokens": 8000,
+    "chunk_workers": 4,
+    # Results are cached on disk, so unchanged comments are not sent to the model again (null disables the cache)
+    "cache_directory": str(Path(__file__).parent / '.llm-cache'),
+    "cache_max_bytes": 100 * 1024 * 1024,
+    "cache_max_age_days": 30,
+    # Tokens we expect a response to use, until the actual usage is known
+    "expected_output_tokens": 2000
+}
+
+EMPTY_RESULT = {
+    "tutorial_ideas": [],
+    "use_cases": [],
+    "technical_questions": [],
+    "problem_statements": []
+}
 
 def validate_json_structure(json_obj):
     """Enhanced validation of JSON structure and content"""
@@ -83,9 +112,9 @@ def is_valid_json_response(output):
     except json.JSONDecodeError:
         return False
 
-def load_config():
+def load_config(config_path=None):
     """Load configuration from config.json file"""
-    config_path = Path(__file__).parent / 'config.json'
+    config_path = Path(config_path) if config_path else Path(__file__).parent / 'config.json'
     if not config_path.exists():
         # Create default config file if it doesn't exist
         default_config = {
@@ -98,7 +127,18 @@ def load_config():
     
     with open(config_path) as f:
         config = json.load(f)
-    return config
+    return dict(DEFAULT_SETTINGS, **config)
+
+def load_prompt(prompt_path=None):
+    """Load the system prompt from prompt.txt"""
+    prompt_path = Path(prompt_path) if prompt_path else Path(__file__).parent / 'prompt.txt'
+    with open(prompt_path, 'r', encoding='utf-8') as f:
+        return f.read()
+
+def create_client(config):
+    """Create the OpenAI client. Setting base_url in config.json points it at another (e.g. local) endpoint"""
+    from openai import OpenAI
+    return OpenAI(api_key=config['openai_api_key'], base_url=config.get('base_url'))
 
 def clean_text(text):
     """Clean and normalize text content"""
@@ -121,110 +161,347 @@ def clean_text(text):
     
     return text.strip()
 
-def process_with_openai(content, max_retries=3):
-    config = load_config()
-    client = OpenAI(api_key=config['openai_api_key'])
-    
-    # Read prompt from file
-    prompt_path = Path(__file__).parent / 'prompt.txt'
-    with open(prompt_path, 'r', encoding='utf-8') as f:
-        prompt = f.read()
-    
-    for attempt in range(max_retries):
+def estimate_tokens(text):
+    """Rough token count (about 4 characters per token for English text)"""
+    return len(text) // 4 + 1
+
+def get_token_counter(model):
+    """Return a function that counts the tokens in a text, using tiktoken if it is installed"""
+    try:
+        import tiktoken
+        encoding = tiktoken.encoding_for_model(model)
+    except (ImportError, KeyError):
+        return estimate_tokens
+    return lambda text: len(encoding.encode(text))
+
+class ResponseTruncated(Exception):
+    """The model ran out of output tokens before finishing its response"""
+
+def chunk_comments(comments_data, max_tokens, count_tokens=estimate_tokens):
+    """Split the comments into chunks whose formatted text has at most max_tokens tokens"""
+    chunks, chunk, used = [], [], 0
+    for comment in comments_data:
+        # Comments are separated by an empty line, which is counted as part of the comment
+        tokens = count_tokens(format_comments([comment]) + "\n\n")
+        if chunk and used + tokens > max_tokens:
+            chunks.append(chunk)
+            chunk, used = [], 0
+        chunk.append(comment)
+        used += tokens
+    if chunk:
+        chunks.append(chunk)
+    return chunks
+
+def merge_results(results):
+    """Merge the results for all chunks of a file into a single result, sorted by votes per category"""
+    merged = {key: [] for key in EMPTY_RESULT}
+    for result in results:
+        for key in merged:
+            merged[key].extend(result[key])
+    for key in merged:
+        merged[key].sort(key=lambda x: x["votes"], reverse=True)
+    return merged
+
+class MinuteRateLimiter:
+    """Limits the number of requests and tokens per minute, shared by all worker threads"""
+
+    def __init__(self, requests_per_minute, tokens_per_minute):
+        self.requests_per_minute = requests_per_minute
+        self.tokens_per_minute = tokens_per_minute
+        self.condition = threading.Condition()
+        # [timestamp, tokens] for every request made during the last minute
+        self.window = deque()
+
+    def _expire(self, now):
+        while self.window and self.window[0][0] <= now - 60:
+            self.window.popleft()
+
+    def acquire(self, tokens):
+        """Wait until a request using this many tokens is allowed. Returns a handle for update()"""
+        # A single request can never use more than the whole budget
+        tokens = min(tokens, self.tokens_per_minute)
+        with self.condition:
+            while True:
+                now = time.monotonic()
+                self._expire(now)
+                used = sum(entry[1] for entry in self.window)
+                if len(self.window) < self.requests_per_minute and used + tokens <= self.tokens_per_minute:
+                    entry = [now, tokens]
+                    self.window.append(entry)
+                    return entry
+                # Wait until the oldest request leaves the window (or until update() frees up tokens)
+                self.condition.wait(max(self.window[0][0] + 60 - now, 0.01))
+
+    def update(self, entry, tokens):
+        """Replace the estimated number of tokens of a request with the actual number"""
+        with self.condition:
+            entry[1] = tokens
+            self.condition.notify_all()
+
+class ResultCache:
+    """On-disk cache for model results, keyed by a hash of everything that was sent to the model.
+
+    Entries older than max_age seconds are ignored and removed. If the cache grows beyond max_bytes, the least
+    recently used entries are removed.
+    """
+
+    def __init__(self, directory, max_bytes, max_age):
+        self.directory = Path(directory)
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self.lock = threading.Lock()
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.size = sum(path.stat().st_size for path in self.directory.glob('*/*.json'))
+
+    @staticmethod
+    def make_key(**request):
+        return hashlib.sha256(json.dumps(request, sort_keys=True, ensure_ascii=False).encode('utf-8')).hexdigest()
+
+    def _path(self, key):
+        return self.directory / key[:2] / f'{key}.json'
+
+    def get(self, key):
+        path = self._path(key)
         try:
-            response = client.chat.completions.create(
-                model="gpt-4o-mini",
-                messages=[
-                    {"role": "system", "content": prompt},
-                    {"role": "user", "content": content}
-                ],
-                temperature=0.1,
-                max_tokens=16384
-            )
-            
-            output = response.choices[0].message.content
-            
-            # Validate and sort the response
+            if time.time() - path.stat().st_mtime > self.max_age:
+                self._remove(path)
+                return None
+            with open(path, 'r', encoding='utf-8') as f:
+                value = f.read()
+            # The modification time doubles as the last time the entry was used
+            os.utime(path)
+            return value
+        except FileNotFoundError:
+            return None
+
+    def put(self, key, value):
+        path = self._path(key)
+        path.parent.mkdir(exist_ok=True)
+        tmp_path = path.with_name(f'{path.name}.{threading.get_ident()}.tmp')
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            f.write(value)
+        size = tmp_path.stat().st_size
+        with self.lock:
+            # Rewriting an entry replaces the old file, so only the difference in size counts
             try:
-                json_obj = json.loads(output)
-                if validate_json_structure(json_obj):
-                    # Clean text content in each category
-                    for category in json_obj:
-                        for item in json_obj[category]:
-                            item["content"] = clean_text(item["content"])
-                    
-                    # Sort each category by votes
-                    for category in json_obj:
-                        json_obj[category].sort(key=lambda x: x["votes"], reverse=True)
-                    
-                    return json.dumps(json_obj, ensure_ascii=False)
-                else:
-                    print(f"Invalid JSON structure (attempt {attempt + 1})")
+                size -= path.stat().st_size
+            except FileNotFoundError:
+                pass
+            os.replace(tmp_path, path)
+            self.size += size
+            if self.size > self.max_bytes:
+                self.evict()
+
+    def _remove(self, path):
+        try:
+            size = path.stat().st_size
+            path.unlink()
+        except FileNotFoundError:
+            return
+        with self.lock:
+            self.size -= size
+
+    def evict(self):
+        """Remove expired entries, then the least recently used ones until the cache is below 90% of max_bytes"""
+        # Should be called while holding the lock
+        entries = []
+        for path in self.directory.glob('*/*.json'):
+            try:
+                stat = path.stat()
+            except FileNotFoundError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+        entries.sort()
+
+        now = time.time()
+        self.size = sum(size for _, size, _ in entries)
+        for mtime, size, path in entries:
+            if now - mtime <= self.max_age and self.size <= self.max_bytes * 0.9:
+                break
+            try:
+                path.unlink()
+            except FileNotFoundError:
+                pass
+            self.size -= size
+
+class CommentPipeline:
+    """Sends comment files to the model using a pool of worker threads.
+
+    The config, prompt and client are loaded once and shared by all workers. Requests are paced by a
+    MinuteRateLimiter instead of fixed sleeps. The client can be anything with the same chat.completions.create
+    method as the OpenAI client, such as a local stand-in for testing.
+    """
+
+    def __init__(self, client, prompt, config=None, limiter=None, cache=None):
+        self.client = client
+        self.prompt = prompt
+        self.config = dict(DEFAULT_SETTINGS, **(config or {}))
+        self.limiter = limiter or MinuteRateLimiter(self.config['requests_per_minute'],
+                                                    self.config['tokens_per_minute'])
+        self.count_tokens = get_token_counter(self.config['model'])
+        if cache is None and self.config['cache_directory']:
+            cache = ResultCache(self.config['cache_directory'], self.config['cache_max_bytes'],
+                                self.config['cache_max_age_days'] * 24 * 3600)
+        self.cache = cache
+        # Chunks get their own pool, so that file workers waiting for their chunks cannot starve it
+        self.chunk_executor = ThreadPoolExecutor(max_workers=self.config['chunk_workers'])
+
+    def close(self):
+        self.chunk_executor.shutdown()
+
+    def process_with_openai(self, content, max_retries=3):
+        """Send the comments to the model and return the validated result as a JSON string"""
+        if self.cache:
+            key = ResultCache.make_key(prompt=self.prompt, content=content, model=self.config['model'],
+                                       temperature=self.config['temperature'], max_tokens=self.config['max_tokens'])
+            cached = self.cache.get(key)
+            if cached is not None:
+                return cached
+
+        estimate = self.count_tokens(self.prompt) + self.count_tokens(content) + self.config['expected_output_tokens']
+
+        for attempt in range(max_retries):
+            try:
+                entry = self.limiter.acquire(estimate)
+                response = self.client.chat.completions.create(
+                    model=self.config['model'],
+                    messages=[
+                        {"role": "system", "content": self.prompt},
+                        {"role": "user", "content": content}
+                    ],
+                    temperature=self.config['temperature'],
+                    max_tokens=self.config['max_tokens']
+                )
+                usage = getattr(response, 'usage', None)
+                if usage is not None:
+                    self.limiter.update(entry, usage.total_tokens)
+
+                if getattr(response.choices[0], 'finish_reason', None) == 'length':
+                    raise ResponseTruncated()
+                output = response.choices[0].message.content
+
+                # Validate and sort the response
+                try:
+                    json_obj = json.loads(output)
+                    if validate_json_structure(json_obj):
+                        # Clean text content in each category
+                        for category in json_obj:
+                            for item in json_obj[category]:
+                                item["content"] = clean_text(item["content"])
+
+                        # Sort each category by votes
+                        for category in json_obj:
+                            json_obj[category].sort(key=lambda x: x["votes"], reverse=True)
+
+                        result = json.dumps(json_obj, ensure_ascii=False)
+                        # Only valid results are cached, so failures are retried on the next run
+                        if self.cache:
+                            self.cache.put(key, result)
+                        return result
+                    else:
+                        print(f"Invalid JSON structure (attempt {attempt + 1})")
+                        continue
+                except json.JSONDecodeError as e:
+                    print(f"JSON parsing error (attempt {attempt + 1}): {str(e)}")
                     continue
-            except json.JSONDecodeError as e:
-                print(f"JSON parsing error (attempt {attempt + 1}): {str(e)}")
+
+            except ResponseTruncated:
+                # Retrying would run into the same limit
+                raise
+            except Exception as e:
+                print(f"OpenAI API error (attempt {attempt + 1}): {str(e)}")
+                if attempt < max_retries - 1:
+                    time.sleep(5 * (attempt + 1))
                 continue
 
-        except Exception as e:
-            print(f"OpenAI API error (attempt {attempt + 1}): {str(e)}")
-            if attempt < max_retries - 1:
-                time.sleep(5 * (attempt + 1))
-            continue
-    
-    return json.dumps({
-        "tutorial_ideas": [],
-        "use_cases": [],
-        "technical_questions": [],
-        "problem_statements": []
-    }, ensure_ascii=False)
-
-# Process files with delay to prevent overload
-for filename in os.listdir(json_directory):
-    if filename.endswith('.json'):
+        return json.dumps(EMPTY_RESULT, ensure_ascii=False)
+
+    def process_chunk(self, comments_data):
+        """Process a chunk of comments. If the response gets truncated, the chunk is split in half"""
         try:
-            file_path = os.path.join(json_directory, filename)
-            print(f"\nProcessing {filename}...")
-            
-            # Load JSON content
-            with open(file_path, 'r', encoding='utf-8') as file:
-                json_data = json.load(file)
-            
-            # Extract comments with text and author
-            comments_data = []
-            for comment in json_data.get("comments", []):
-                comments_data.append({
-                    "text": clean_text(comment['text']),
-                    "author": comment['author'],
-                    "votes": comment.get('votes', '0'),
-                    "heart": comment.get('heart', False),
-                    "replies": bool(comment.get('replies', ''))
-                })
-            
-            # Convert to formatted string for OpenAI
-            comments_text = "\n\n".join(
-                f"Comment by {c['author']}:\n{c['text']}\nVotes: {c['votes']}\nHearted: {c['heart']}\nHas replies: {c['replies']}"
-                for c in comments_data
-            )
-            
-            # Process with OpenAI
-            openai_output = process_with_openai(comments_text)
-            
-            # Parse the output to check if all arrays are empty
-            processed_data = json.loads(openai_output)
-            if all(len(processed_data[key]) == 0 for key in processed_data):
-                print(f"Skipping {filename} - no relevant content found")
-                continue
-            
-            # Save results only if there's relevant content
-            output_path = os.path.join(output_directory, f'processed_{filename}')
-            with open(output_path, 'w', encoding='utf-8') as output_file:
-                json.dump(processed_data, output_file, indent=4, ensure_ascii=False)
-            
-            print(f"Successfully processed {filename}")
-            
-            # Add a small delay between files to prevent rate limiting
-            time.sleep(2)
-            
-        except Exception as e:
-            print(f"Error processing file {filename}: {str(e)}")
-            continue
+            return json.loads(self.process_with_openai(format_comments(comments_data)))
+        except ResponseTruncated:
+            if len(comments_data) == 1:
+                print(f"Response truncated for a single comment by {comments_data[0]['author']}, skipping it")
+                return dict(EMPTY_RESULT)
+            middle = len(comments_data) // 2
+            return merge_results([self.process_chunk(comments_data[:middle]),
+                                  self.process_chunk(comments_data[middle:])])
+
+    def process_file(self, file_path, output_directory):
+        """Process a single comments file. Returns the output path, or None if there was nothing relevant"""
+        filename = os.path.basename(file_path)
+        comments_data = load_comments(file_path)
+
+        # Process with OpenAI, splitting files that are too large for a single request
+        chunks = chunk_comments(comments_data, self.config['chunk_tokens'], self.count_tokens)
+        if len(chunks) > 1:
+            print(f"Splitting {filename} into {len(chunks)} chunks")
+        processed_data = merge_results(self.chunk_executor.map(self.process_chunk, chunks))
+
+        # Check if all arrays are empty
+        if all(len(processed_data[key]) == 0 for key in processed_data):
+            return None
+
+        # Save results only if there's relevant content
+        output_path = os.path.join(output_directory, f'processed_{filename}')
+        with open(output_path, 'w', encoding='utf-8') as output_file:
+            json.dump(processed_data, output_file, indent=4, ensure_ascii=False)
+        return output_path
+
+    def process_directory(self, json_directory, output_directory):
+        """Process all JSON files in a directory concurrently. Returns a dict mapping filenames to results"""
+        os.makedirs(output_directory, exist_ok=True)
+        filenames = sorted(f for f in os.listdir(json_directory) if f.endswith('.json'))
+
+        results = {}
+        with ThreadPoolExecutor(max_workers=self.config['workers']) as executor:
+            futures = {executor.submit(self.process_file, os.path.join(json_directory, filename), output_directory):
+                       filename for filename in filenames}
+            # Every worker writes its own output file, so results are reported as soon as they are done
+            for future in as_completed(futures):
+                filename = futures[future]
+                try:
+                    results[filename] = future.result()
+                except Exception as e:
+                    results[filename] = e
+                    print(f"Error processing file {filename}: {str(e)}")
+                    continue
+                if results[filename] is None:
+                    print(f"Skipping {filename} - no relevant content found")
+                else:
+                    print(f"Successfully processed {filename}")
+        return results
+
+def load_comments(file_path):
+    """Load a comments file and extract the fields the model needs"""
+    # Comments are read one at a time, so only the extracted fields of the comments are kept in memory
+    comments_data = []
+    for comment in read_comments(file_path, fields=("text", "author", "votes", "heart", "replies")):
+        comments_data.append({
+            "text": clean_text(comment['text']),
+            "author": comment['author'],
+            "votes": comment.get('votes', '0'),
+            "heart": comment.get('heart', False),
+            "replies": bool(comment.get('replies', ''))
+        })
+    return comments_data
+
+def format_comments(comments_data):
+    """Convert the comments to a formatted string for OpenAI"""
+    return "\n\n".join(
+        f"Comment by {c['author']}:\n{c['text']}\nVotes: {c['votes']}\nHearted: {c['heart']}\nHas replies: {c['replies']}"
+        for c in comments_data
+    )
+
+def main():
+    config = load_config()
+    pipeline = CommentPipeline(create_client(config), load_prompt(), config)
+    print(f"Processing files in {config['json_directory']} using {config['workers']} worker(s)...")
+    try:
+        pipeline.process_directory(config['json_directory'], config['output_directory'])
+    finally:
+        pipeline.close()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,140 @@
+import json
+import threading
+import time
+
+from youtube_comment_downloader import main
+from youtube_comment_downloader.downloader import YoutubeCommentDownloader
+
+API_URL = '/youtubei/v1/next'
+
+
+def endpoint(token):
+    return {'commandMetadata': {'webCommandMetadata': {'apiUrl': API_URL}},
+            'continuationCommand': {'token': token}}
+
+
+class FakeResponse:
+
+    def __init__(self, url, status_code=200, text='', data=None, headers=None):
+        self.url = url
+        self.status_code = status_code
+        self.headers = headers or {}
+        self.text = text if data is None else json.dumps(data)
+        self.data = data
+
+    def json(self):
+        return self.data
+
+
+class FakeYoutube:
+    """
+    Serves a watch page and InnerTube continuation responses for a made up video, using the same structure as
+    Youtube does. Every thread has `replies` replies, which are split into pages of `page_size` comments.
+    Instead of numbers, `threads` can also be a list of thread IDs and `replies` a dictionary of reply counts.
+    """
+
+    def __init__(self, threads=10, replies=3, page_size=4, delay=0):
+        self.thread_ids = ['thread%d' % index for index in range(threads)] if isinstance(threads, int) else threads
+        self.replies = replies
+        self.page_size = page_size
+        self.delay = delay
+        self.lock = threading.Lock()
+        self.active = 0
+        self.max_active = 0
+        self.requests = []
+
+    def watch_page(self):
+        ytcfg = {'INNERTUBE_API_KEY': 'key', 'INNERTUBE_CONTEXT': {'client': {'hl': 'en'}}}
+        data = {'contents': {'itemSectionRenderer': {'contents': [
+            {'continuationItemRenderer': {'continuationEndpoint': endpoint('page:0')}}]}},
+            'header': {'sortFilterSubMenuRenderer': {'subMenuItems': [
+                {'title': 'Top comments', 'serviceEndpoint': endpoint('page:0')},
+                {'title': 'Newest first', 'serviceEndpoint': endpoint('page:0')}]}}}
+        return ('<html><script>ytcfg.set(' + json.dumps(ytcfg) + ');</script>'
+                '<script>var ytInitialData = ' + json.dumps(data) + ';</script></html>')
+
+    def comment(self, cid, replies=0):
+        key = 'toolbar-' + cid
+        entity = {'commentEntityPayload': {
+            'properties': {'commentId': cid, 'content': {'content': 'Text of ' + cid},
+                           'publishedTime': '3 days ago', 'toolbarStateKey': key},
+            'author': {'displayName': '@author-' + cid, 'channelId': 'channel-' + cid,
+                       'avatarThumbnailUrl': 'https://example.com/' + cid + '.jpg'},
+            'toolbar': {'likeCountNotliked': str(len(cid)), 'replyCount': str(replies) if replies else ''}}}
+        toolbar = {'engagementToolbarStateEntityPayload': {
+            'key': key, 'heartState': 'TOOLBAR_HEART_STATE_HEARTED' if cid.endswith('1') else 'TOOLBAR_HEART_STATE_UNHEARTED'}}
+        return [{'payload': entity}, {'payload': toolbar}]
+
+    def reply_count(self, cid):
+        return self.replies.get(cid, 0) if isinstance(self.replies, dict) else self.replies
+
+    def top_level_page(self, page):
+        start = page * self.page_size
+        cids = self.thread_ids[start:start + self.page_size]
+        items, mutations = [], []
+        for cid in cids:
+            thread = {'commentViewModel': {'commentViewModel': {'commentId': cid}}}
+            if self.reply_count(cid):
+                thread['replies'] = {'commentRepliesRenderer': {'contents': [
+                    {'continuationItemRenderer': {'continuationEndpoint': endpoint('replies:%s:0' % cid)}}]}}
+            items.append({'commentThreadRenderer': thread})
+            mutations.extend(self.comment(cid, self.reply_count(cid)))
+        if start + self.page_size < len(self.thread_ids):
+            items.append({'continuationItemRenderer': {'continuationEndpoint': endpoint('page:%d' % (page + 1))}})
+        action = 'reloadContinuationItemsCommand' if page == 0 else 'appendContinuationItemsAction'
+        return {'onResponseReceivedEndpoints': [{action: {'targetId': 'comments-section', 'continuationItems': items}}],
+                'frameworkUpdates': {'entityBatchUpdate': {'mutations': mutations}}}
+
+    def reply_page(self, cid, page):
+        start = page * self.page_size
+        end = min(start + self.page_size, self.reply_count(cid))
+        rids = ['%s.reply%d' % (cid, index) for index in range(start, end)]
+        items, mutations = [], []
+        for rid in rids:
+            items.append({'commentViewModel': {'commentViewModel': {'commentId': rid}}})
+            mutations.extend(self.comment(rid))
+        if end < self.reply_count(cid):
+            button = {'buttonRenderer': {'command': endpoint('replies:%s:%d' % (cid, page + 1))}}
+            items.append({'continuationItemRenderer': {'button': button}})
+        action = {'targetId': 'comment-replies-item-' + cid, 'continuationItems': items}
+        return {'onResponseReceivedEndpoints': [{'appendContinuationItemsAction': action}],
+                'frameworkUpdates': {'entityBatchUpdate': {'mutations': mutations}}}
+
+    def continuation(self, token):
+        kind, _, rest = token.partition(':')
+        if kind == 'page':
+            return self.top_level_page(int(rest))
+        cid, _, page = rest.rpartition(':')
+        return self.reply_page(cid, int(page))
+
+    def request(self, method, url, params=None, json=None, timeout=None, **kwargs):
+        with self.lock:
+            self.active += 1
+            self.max_active = max(self.max_active, self.active)
+            self.requests.append(json['continuation'] if json else url)
+        try:
+            if self.delay:
+                time.sleep(self.delay)
+            if method == 'GET':
+                return FakeResponse(url, text=self.watch_page())
+            return FakeResponse(url, data=self.continuation(json['continuation']))
+        finally:
+            with self.lock:
+                self.active -= 1
+
+
+def fake_downloader(youtube, **kwargs):
+    downloader = YoutubeCommentDownloader(**kwargs)
+    downloader.session = youtube
+    return downloader
+
+
+def run_main(monkeypatch, youtube, *args):
+    # Runs the command line interface against the fake Youtube, without sleeping between requests
+    monkeypatch.setattr(YoutubeCommentDownloader, 'request', lambda self, method, url, **kw: youtube.request(method, url, **kw))
+    monkeypatch.setattr('time.sleep', lambda seconds: None)
+    try:
+        main(['--youtubeid', 'fake', '--no-time-parsed'] + list(args))
+    except SystemExit as e:
+        return e.code
+    return 0
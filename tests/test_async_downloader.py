@@ -0,0 +1,111 @@
+import asyncio
+import inspect
+import json
+
+import pytest
+
+from youtube_comment_downloader.async_downloader import AsyncYoutubeCommentDownloader
+from youtube_comment_downloader.downloader import YoutubeCommentDownloader
+
+from .fake_youtube import FakeYoutube, fake_downloader
+
+httpx = pytest.importorskip('httpx')
+
+URL = 'https://www.youtube.com/watch?v=fake'
+
+
+def async_downloader(youtube, failures=0, delay=0):
+    state = {'failures': failures, 'active': 0, 'max_active': 0}
+
+    async def handler(request):
+        if request.method == 'POST' and state['failures']:
+            state['failures'] -= 1
+            raise httpx.ReadTimeout('timed out', request=request)
+        state['active'] += 1
+        state['max_active'] = max(state['max_active'], state['active'])
+        await asyncio.sleep(delay)
+        state['active'] -= 1
+        data = json.loads(request.content) if request.content else None
+        response = youtube.request(request.method, str(request.url), json=data)
+        return httpx.Response(response.status_code, text=response.text)
+
+    client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+    downloader = AsyncYoutubeCommentDownloader(client=client)
+    downloader.state = state
+    return downloader
+
+
+async def collect(downloader, sleep=0, **kwargs):
+    return [comment async for comment in downloader.get_comments_from_url(URL, sleep=sleep, **kwargs)]
+
+
+def test_that_async_downloader_yields_the_same_comments_as_the_sync_downloader():
+    expected = list(fake_downloader(FakeYoutube(threads=7, replies=5, page_size=3)).get_comments_from_url(
+        URL, sleep=0, time_parsed=False))
+
+    async def run():
+        async with async_downloader(FakeYoutube(threads=7, replies=5, page_size=3)) as downloader:
+            return await collect(downloader, time_parsed=False)
+
+    assert asyncio.run(run()) == expected
+
+
+def test_that_many_videos_can_be_downloaded_concurrently():
+    async def run():
+        async with async_downloader(FakeYoutube(threads=4, replies=2)) as downloader:
+            return await asyncio.gather(*[collect(downloader) for _ in range(20)])
+
+    results = asyncio.run(run())
+    assert len(results) == 20 and all(len(comments) == 12 for comments in results)
+
+
+def test_that_timeouts_are_retried(monkeypatch):
+    original_sleep = asyncio.sleep
+    monkeypatch.setattr(asyncio, 'sleep', lambda delay: original_sleep(0))
+
+    async def run():
+        async with async_downloader(FakeYoutube(threads=2, replies=0), failures=2) as downloader:
+            return [comment['cid'] for comment in await collect(downloader)]
+
+    assert asyncio.run(run()) == ['thread0', 'thread1']
+
+
+def test_that_cancelling_stops_the_download():
+    youtube = FakeYoutube(threads=100, replies=0, page_size=1)
+
+    async def run():
+        async with async_downloader(youtube) as downloader:
+            task = asyncio.ensure_future(collect(downloader, sleep=0.01))
+            await asyncio.sleep(0.05)
+            task.cancel()
+            with pytest.raises(asyncio.CancelledError):
+                await task
+
+    asyncio.run(run())
+    requests = len(youtube.requests)
+    assert 1 < requests < 100
+
+
+def test_that_the_async_downloader_supports_concurrency_and_known_comments():
+    expected = [comment['cid'] for comment in fake_downloader(FakeYoutube(threads=9, replies=7, page_size=3))
+                .get_comments_from_url(URL, sleep=0)]
+    youtube = FakeYoutube(threads=9, replies=7, page_size=3)
+    downloader = async_downloader(youtube, delay=0.01)
+
+    async def run(**kwargs):
+        return [comment['cid'] for comment in await collect(downloader, **kwargs)]
+
+    assert asyncio.run(run(concurrency=3)) == expected
+    assert 1 < downloader.state['max_active'] <= 3
+
+    # Only the thread with a different reply count is downloaded again, together with its replies
+    known = {cid: '7' for cid in expected if '.' not in cid}
+    known['thread2'] = '6'
+    new = asyncio.run(run(known=known))
+    assert new == ['thread2'] + ['thread2.reply%d' % index for index in range(7)]
+
+
+def test_that_the_arguments_match_the_sync_downloader():
+    sync_parameters = list(inspect.signature(YoutubeCommentDownloader.get_comments_from_url).parameters)
+    async_parameters = list(inspect.signature(AsyncYoutubeCommentDownloader.get_comments_from_url).parameters)
+    assert async_parameters == sync_parameters + ['timeout']
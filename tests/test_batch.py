@@ -0,0 +1,92 @@
+import json
+import threading
+import time
+
+import pytest
+
+from youtube_comment_downloader import main
+from youtube_comment_downloader.batch import BatchDownloader
+from youtube_comment_downloader.ratelimit import RateLimiter
+
+
+class FakeDownloader:
+
+    def __init__(self, rate_limiter=None):
+        self.rate_limiter = rate_limiter
+
+    def get_comments(self, youtube_id, **kwargs):
+        if youtube_id == 'broken':
+            raise RuntimeError('Failed to set sorting')
+        for index in range(3):
+            yield {'cid': '%s-%d' % (youtube_id, index), 'text': 'comment'}
+
+
+def test_that_every_video_gets_its_own_output_file(tmp_path):
+    batch = BatchDownloader(workers=2, downloader_factory=FakeDownloader)
+    results = batch.download_all(['a', 'b', 'c'], str(tmp_path))
+
+    assert results == {'a': 3, 'b': 3, 'c': 3}
+    for youtube_id in 'abc':
+        lines = (tmp_path / (youtube_id + '.json')).read_text().splitlines()
+        assert [json.loads(line)['cid'] for line in lines] == ['%s-%d' % (youtube_id, i) for i in range(3)]
+
+
+def test_that_pretty_output_and_limit_are_respected(tmp_path):
+    batch = BatchDownloader(workers=2, downloader_factory=FakeDownloader)
+    batch.download_all(['a'], str(tmp_path), pretty=True, limit=2)
+
+    data = json.loads((tmp_path / 'a.json').read_text())
+    assert [comment['cid'] for comment in data['comments']] == ['a-0', 'a-1']
+
+
+def test_that_a_failing_video_does_not_stop_the_batch(tmp_path):
+    batch = BatchDownloader(workers=2, downloader_factory=FakeDownloader)
+    results = batch.download_all(['a', 'broken', 'b'], str(tmp_path))
+
+    assert results['a'] == results['b'] == 3
+    assert isinstance(results['broken'], RuntimeError)
+
+
+def test_that_workers_share_the_rate_limiter(tmp_path):
+    limiters = []
+
+    def factory(rate_limiter=None):
+        limiters.append(rate_limiter)
+        return FakeDownloader(rate_limiter)
+
+    batch = BatchDownloader(workers=4, rate=10, downloader_factory=factory)
+    batch.download_all(['a', 'b', 'c', 'd', 'e', 'f'], str(tmp_path))
+
+    assert limiters and all(limiter is batch.rate_limiter for limiter in limiters)
+
+
+def test_that_rate_limiter_spaces_out_requests_per_host():
+    limiter = RateLimiter(rate=50)
+    timestamps = []
+
+    def worker():
+        limiter.wait('www.youtube.com')
+        timestamps.append(time.monotonic())
+
+    threads = [threading.Thread(target=worker) for _ in range(5)]
+    start = time.monotonic()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert max(timestamps) - start >= 4 * 0.02 * 0.9
+    limiter.wait('consent.youtube.com')
+    assert time.monotonic() - max(timestamps) < 0.02
+
+
+@pytest.mark.parametrize('option', [['--checkpoint'], ['--resume'], ['--incremental', 'index.json']])
+def test_that_per_video_options_are_rejected_with_batch(tmp_path, capsys, option):
+    batch_file = tmp_path / 'ids.txt'
+    batch_file.write_text('a\nb\n')
+    with pytest.raises(SystemExit) as e:
+        main(['--batch', str(batch_file), '--output', str(tmp_path / 'out')] + option)
+
+    assert e.value.code == 1
+    assert 'cannot be used with --batch' in capsys.readouterr().out
+    assert not (tmp_path / 'out').exists()
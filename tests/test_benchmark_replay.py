@@ -0,0 +1,142 @@
+"""
+End-to-end benchmarks that replay recorded videos through get_comments_from_url, without any network I/O.
+Synthetic recordings of different sizes are generated with FakeYoutube. Real recordings (made with
+replay.record_comments) can be benchmarked as well by putting them in tests/recordings. The huge recording takes a
+while, so it is only used if the BENCHMARK_HUGE environment variable is set.
+
+The extraction of ytcfg and ytInitialData from the watch page is benchmarked separately, for both the raw_decode
+extractor and the regular expressions it falls back to, on a large synthetic page and on the recorded pages.
+
+Besides the usual timings, every benchmark reports comments/sec, peak memory and the time spent in every stage
+(fetching/decoding responses, indexing pages and building comments) in its extra_info.
+"""
+import glob
+import json
+import os
+import time
+import tracemalloc
+from collections import Counter
+
+import pytest
+
+from youtube_comment_downloader.downloader import (YT_CFG_RE, YT_INITIAL_DATA_RE, YoutubeCommentDownloader,
+                                                   YoutubeCommentParser)
+from youtube_comment_downloader.replay import ReplaySession, record_comments
+
+from .fake_youtube import FakeYoutube, fake_downloader
+
+SIZES = {'small': dict(threads=50, replies=2, page_size=20),
+         'medium': dict(threads=1000, replies=5, page_size=20),
+         'huge': dict(threads=5000, replies=10, page_size=20)}
+
+RECORDINGS = sorted(glob.glob(os.path.join(os.path.dirname(__file__), 'recordings', '*.json*')))
+
+
+class StageTimingDownloader(YoutubeCommentDownloader):
+    """
+    Keeps track of the total time spent in every stage of the download.
+    """
+
+    def __init__(self, **kwargs):
+        super(StageTimingDownloader, self).__init__(**kwargs)
+        self.stages = Counter()
+
+    def ajax_request(self, *args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return super(StageTimingDownloader, self).ajax_request(*args, **kwargs)
+        finally:
+            self.stages['fetch'] += time.perf_counter() - start
+
+    def parse_page(self, *args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return super(StageTimingDownloader, self).parse_page(*args, **kwargs)
+        finally:
+            self.stages['parse_page'] += time.perf_counter() - start
+
+    def parse_comments(self, *args, **kwargs):
+        generator = super(StageTimingDownloader, self).parse_comments(*args, **kwargs)
+        while True:
+            start = time.perf_counter()
+            comment = next(generator, None)
+            self.stages['parse_comments'] += time.perf_counter() - start
+            if comment is None:
+                return
+            yield comment
+
+
+@pytest.fixture(scope='module', params=[name for name in SIZES] + RECORDINGS)
+def recording(request, tmp_path_factory):
+    if request.param in SIZES:
+        if request.param == 'huge' and not os.environ.get('BENCHMARK_HUGE'):
+            pytest.skip('set BENCHMARK_HUGE=1 to run benchmarks on the huge recording')
+        filename = str(tmp_path_factory.mktemp('recordings') / (request.param + '.json.gz'))
+        record_comments('fake', filename, fake_downloader(FakeYoutube(**SIZES[request.param])), sleep=0)
+        return filename
+    return request.param
+
+
+def download(session, downloader_class=YoutubeCommentDownloader, **kwargs):
+    session.rewind()
+    url = next(key[1] for key in session.responses if key[0] == 'GET')
+    downloader = downloader_class(session=session)
+    count = sum(1 for _ in downloader.get_comments_from_url(url, sleep=0, **kwargs))
+    return downloader, count
+
+
+def test_benchmark_replay(benchmark, recording):
+    session = ReplaySession.load(recording)
+    count = benchmark(lambda: download(session)[1])
+
+    downloader, _ = download(session, StageTimingDownloader)
+    tracemalloc.start()
+    try:
+        download(session)
+        peak_memory = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+    benchmark.extra_info['comments'] = count
+    benchmark.extra_info['peak_memory_bytes'] = peak_memory
+    benchmark.extra_info['stage_seconds'] = dict(downloader.stages)
+    if benchmark.stats:
+        benchmark.extra_info['comments_per_second'] = count / benchmark.stats.stats.mean
+    assert count > 0
+
+
+def make_large_watch_page(threads=3000):
+    """
+    Returns a watch page of over 1 MB, laid out like Youtube's: lots of scripts, followed by ytcfg and ytInitialData.
+    """
+    youtube = FakeYoutube(threads=threads)
+    scripts = ''.join('<script>(function(){var a%d = {"k": [%d]};if (a%d) {window.x = {};}})();</script>\n'
+                      % (index, index, index) for index in range(threads))
+    data = youtube.top_level_page(0)
+    data['contents'] = {'itemSectionRenderer': {'contents': [
+        {'continuationItemRenderer': {'continuationEndpoint': youtube.top_level_page(page)}}
+        for page in range(threads // youtube.page_size)]}}
+    ytcfg = {'INNERTUBE_API_KEY': 'key', 'INNERTUBE_CONTEXT': {'client': {'hl': 'en'}}}
+    return ('<html><head>' + scripts + '<script>ytcfg.set(' + json.dumps(ytcfg) + ');</script></head><body>'
+            '<script>var ytInitialData = ' + json.dumps(data) + ';</script></body></html>')
+
+
+def extract_with_regex(html):
+    return (json.loads(YoutubeCommentParser.regex_search(html, YT_CFG_RE)),
+            json.loads(YoutubeCommentParser.regex_search(html, YT_INITIAL_DATA_RE)))
+
+
+@pytest.fixture(scope='module', params=['large'] + RECORDINGS)
+def watch_page(request):
+    if request.param == 'large':
+        return make_large_watch_page()
+    session = ReplaySession.load(request.param)
+    return next(responses[0].text for key, responses in session.responses.items() if key[0] == 'GET')
+
+
+@pytest.mark.parametrize('extractor', ['raw_decode', 'regex'])
+def test_benchmark_parse_watch_page(benchmark, watch_page, extractor):
+    extract = YoutubeCommentParser().parse_watch_page if extractor == 'raw_decode' else extract_with_regex
+    ytcfg, data = benchmark(extract, watch_page)
+    benchmark.extra_info['page_bytes'] = len(watch_page)
+    assert ytcfg['INNERTUBE_API_KEY'] and data
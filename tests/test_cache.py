@@ -0,0 +1,77 @@
+from youtube_comment_downloader.cache import BootstrapCache
+from youtube_comment_downloader.downloader import (RequestError, SORT_BY_POPULAR, SORT_BY_RECENT,
+                                                   YoutubeCommentDownloader)
+
+from .fake_youtube import FakeResponse, FakeYoutube, fake_downloader
+
+URL = 'https://www.youtube.com/watch?v=fake'
+
+
+class ExpiringYoutube(FakeYoutube):
+    """
+    Rejects continuations that have expired, like Youtube does after a while.
+    """
+
+    def request(self, method, url, params=None, json=None, timeout=None, **kwargs):
+        if json and json['continuation'] == 'expired':
+            self.requests.append('expired')
+            return FakeResponse(url, status_code=400, text='invalid continuation')
+        return super(ExpiringYoutube, self).request(method, url, params, json, timeout, **kwargs)
+
+
+def download(youtube, cache, **kwargs):
+    downloader = fake_downloader(youtube, cache=cache)
+    return [comment['cid'] for comment in downloader.get_comments_from_url(URL, sleep=0, **kwargs)]
+
+
+def test_that_the_watch_page_is_only_loaded_once(tmp_path):
+    youtube = FakeYoutube(threads=5)
+    cache = BootstrapCache(str(tmp_path))
+    expected = download(youtube, cache)
+    assert youtube.requests.count(URL) == 1
+
+    assert download(youtube, cache) == expected
+    assert download(youtube, BootstrapCache(str(tmp_path))) == expected
+    assert youtube.requests.count(URL) == 1
+
+    # Entries are kept per sort order and language
+    download(youtube, cache, sort_by=SORT_BY_POPULAR)
+    download(youtube, cache, language='de')
+    assert youtube.requests.count(URL) == 3
+
+
+def test_that_expired_entries_are_not_used(tmp_path):
+    youtube = FakeYoutube(threads=5)
+    download(youtube, BootstrapCache(str(tmp_path), ttl=0))
+    download(youtube, BootstrapCache(str(tmp_path), ttl=0))
+    assert youtube.requests.count(URL) == 2
+
+
+def test_that_rejected_continuations_are_invalidated(tmp_path):
+    youtube = ExpiringYoutube(threads=5)
+    expected = download(youtube, None)
+    cache = BootstrapCache(str(tmp_path))
+    ytcfg, endpoint = YoutubeCommentDownloader(session=youtube).bootstrap(URL)
+    cache.put(URL, SORT_BY_RECENT, None, ytcfg, dict(endpoint, continuationCommand={'token': 'expired'}))
+    youtube.requests = []
+
+    assert download(youtube, cache) == expected
+    assert youtube.requests[:2] == ['expired', URL]
+    assert cache.get(URL, SORT_BY_RECENT, None)[1]['continuationCommand']['token'] == 'page:0'
+
+
+def test_that_throttling_is_not_a_rejection():
+    assert YoutubeCommentDownloader.is_rejection(RequestError('invalid continuation', 400))
+    assert YoutubeCommentDownloader.is_rejection(RuntimeError('Error returned from server: expired'))
+    for status_code in (408, 429, 503, None):
+        assert not YoutubeCommentDownloader.is_rejection(RequestError('failed', status_code))
+
+
+def test_that_cookies_are_kept(tmp_path):
+    downloader = YoutubeCommentDownloader(cache=BootstrapCache(str(tmp_path)))
+    downloader.session.cookies.set('SOCS', 'consented', domain='.youtube.com')
+    downloader.cache.save_cookies(downloader.session.cookies)
+
+    downloader = YoutubeCommentDownloader(cache=BootstrapCache(str(tmp_path)))
+    assert downloader.session.cookies.get('SOCS', domain='.youtube.com') == 'consented'
+    assert downloader.session.cookies.get('CONSENT', domain='.youtube.com') == 'YES+cb'
@@ -0,0 +1,62 @@
+import json
+import os
+
+import pytest
+
+from .fake_youtube import FakeYoutube, run_main
+
+
+class CrashingYoutube(FakeYoutube):
+
+    def __init__(self, crash_after=None, **kwargs):
+        super().__init__(**kwargs)
+        self.crash_after = crash_after
+
+    def request(self, method, url, **kwargs):
+        if self.crash_after is not None and len(self.requests) >= self.crash_after:
+            raise RuntimeError('connection reset')
+        return super().request(method, url, **kwargs)
+
+
+@pytest.mark.parametrize('options', [[], ['--pretty'], ['--order', 'breadth-first', '--max-pending', '2']])
+@pytest.mark.parametrize('crash_after', [6, 9])
+def test_that_a_resumed_download_produces_the_same_output(monkeypatch, tmp_path, options, crash_after):
+    expected_output = str(tmp_path / 'expected.json')
+    clean = FakeYoutube(threads=6, replies=3, page_size=2)
+    assert run_main(monkeypatch, clean, '-o', expected_output, *options) == 0
+
+    output = str(tmp_path / 'comments.json')
+    youtube = CrashingYoutube(crash_after=crash_after, threads=6, replies=3, page_size=2)
+    assert run_main(monkeypatch, youtube, '-o', output, '--checkpoint', *options) == 1
+    assert os.path.exists(output + '.checkpoint')
+
+    youtube.crash_after = None
+    assert run_main(monkeypatch, youtube, '-o', output, '--resume', *options) == 0
+    assert not os.path.exists(output + '.checkpoint')
+
+    with open(output, encoding='utf8') as fp, open(expected_output, encoding='utf8') as expected_fp:
+        assert fp.read() == expected_fp.read()
+    # The watch page and the pages that were written before the crash are not requested again
+    assert len(youtube.requests) == len(clean.requests)
+
+
+def test_that_the_checkpoint_records_the_pending_continuations(monkeypatch, tmp_path):
+    output = str(tmp_path / 'comments.json')
+    youtube = CrashingYoutube(crash_after=4, threads=6, replies=3, page_size=2)
+    run_main(monkeypatch, youtube, '-o', output, '--checkpoint')
+
+    with open(output + '.checkpoint', encoding='utf8') as fp:
+        checkpoint = json.load(fp)
+    with open(output, encoding='utf8') as fp:
+        lines = fp.read().splitlines()
+
+    assert checkpoint['count'] == len(lines)
+    assert checkpoint['ytcfg']['INNERTUBE_API_KEY'] == 'key'
+    assert checkpoint['continuations']['order'] == 'depth-first'
+    assert [c['continuationCommand']['token'] for c in checkpoint['continuations']['replies']] == \
+        ['page:1', 'replies:thread1:0']
+
+
+def test_that_resume_requires_a_checkpoint(monkeypatch, tmp_path):
+    output = str(tmp_path / 'comments.json')
+    assert run_main(monkeypatch, FakeYoutube(), '-o', output, '--resume') == 1
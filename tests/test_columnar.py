@@ -0,0 +1,65 @@
+import json
+
+import pytest
+
+from youtube_comment_downloader.columnar import parse_count, write_columnar
+
+from .fake_youtube import FakeYoutube, run_main
+
+pa = pytest.importorskip('pyarrow')
+
+
+def test_that_counts_are_parsed():
+    assert parse_count('') == 0
+    assert parse_count('15') == 15
+    assert parse_count('1,234') == 1234
+    assert parse_count('1.2K') == 1200
+    assert parse_count('1,5 K') == 1500
+    assert parse_count('3M') == 3000000
+    assert parse_count('many') is None
+
+
+def read_table(filename, format):
+    if format == 'parquet':
+        import pyarrow.parquet as pq
+        return pq.read_table(filename)
+    with pa.memory_map(filename) as source:
+        return pa.ipc.open_file(source).read_all()
+
+
+@pytest.mark.parametrize('format', ['parquet', 'arrow'])
+def test_that_columns_are_typed(monkeypatch, tmp_path, format):
+    youtube = FakeYoutube(threads=5, replies={'thread1': 2})
+    json_output, output = str(tmp_path / 'comments.json'), str(tmp_path / ('comments.' + format))
+    assert run_main(monkeypatch, youtube, '-o', json_output) == 0
+    assert run_main(monkeypatch, youtube, '-o', output, '--format', format) == 0
+
+    with open(json_output, encoding='utf8') as fp:
+        comments = [json.loads(line) for line in fp]
+    table = read_table(output, format)
+    assert table.num_rows == len(comments) == 7
+    assert table.schema.field('votes').type == pa.int64()
+    assert table.schema.field('heart').type == pa.bool_()
+    rows = table.to_pylist()
+    assert [row['cid'] for row in rows] == [comment['cid'] for comment in comments]
+    assert [row['votes'] for row in rows] == [int(comment['votes']) for comment in comments]
+    rows = {row['cid']: row for row in rows}
+    assert rows['thread1'] == dict(rows['thread1'], parent=None, replies=2, heart=True, reply=False, paid=False)
+    assert rows['thread1.reply0'] == dict(rows['thread1.reply0'], parent='thread1', replies=0, reply=True)
+
+
+def test_that_comments_are_written_in_row_groups(tmp_path):
+    import pyarrow.parquet as pq
+    comments = [{'cid': 'c%d' % index, 'text': '', 'time': '', 'author': '', 'channel': '', 'votes': '1K',
+                 'replies': '', 'photo': '', 'heart': False, 'reply': False, 'paid': '$5'} for index in range(25)]
+    filename = str(tmp_path / 'comments.parquet')
+    assert write_columnar(filename, iter(comments), limit=23, row_group_size=10) == 23
+    parquet = pq.ParquetFile(filename)
+    assert [parquet.metadata.row_group(i).num_rows for i in range(parquet.num_row_groups)] == [10, 10, 3]
+    row = parquet.read().to_pylist()[0]
+    assert (row['votes'], row['time_parsed'], row['paid'], row['paid_amount']) == (1000, None, True, '$5')
+
+
+def test_that_json_only_options_are_rejected(monkeypatch, tmp_path):
+    output = str(tmp_path / 'comments.parquet')
+    assert run_main(monkeypatch, FakeYoutube(), '-o', output, '--format', 'parquet', '--pretty') == 1
@@ -0,0 +1,99 @@
+import contextlib
+import importlib.util
+import io
+import json
+import os
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def load_script():
+    path = os.path.join(ROOT, 'comments', 'output', 'combine.py')
+    spec = importlib.util.spec_from_file_location('combine', path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+combine = load_script()
+
+
+def make_entry(content, votes, hearted=False, author='author'):
+    return {'content': content, 'author': author, 'votes': votes, 'hearted': hearted, 'has_replies': False}
+
+
+def write_processed(tmpdir, name, **categories):
+    data = {category: categories.get(category, []) for category in combine.CATEGORIES}
+    tmpdir.join(name).write_text(json.dumps(data, indent=4, ensure_ascii=False), encoding='utf-8')
+
+
+def test_that_json_is_streamed_entry_by_entry():
+    data = {'a': [{'x': 'é\n' * 50}, 12345678, [1, 2]], 'b': [], 'c': 'text', 'd': 1.5}
+    items = list(combine.CommentStream(io.StringIO(json.dumps(data, indent=4)), chunk_size=7).items())
+    assert items == [('a', {'x': 'é\n' * 50}), ('a', 12345678), ('a', [1, 2]), ('c', 'text'), ('d', 1.5)]
+
+
+def test_that_votes_are_coerced():
+    assert [combine.parse_votes(votes) for votes in (12, 3.0, '15', '1,234', '1.2K', '', None, 'many')] == \
+        [12, 3, 15, 1234, 1200, 0, 0, 0]
+
+
+def test_that_files_are_merged_by_votes(tmpdir):
+    write_processed(tmpdir, 'processed_1.json',
+                    use_cases=[make_entry('a', 10), make_entry('b', 5), make_entry('c', 5, True)])
+    write_processed(tmpdir, 'processed_2.json',
+                    use_cases=[make_entry('d', '1.2K'), make_entry('e', '7'), make_entry('f', 1)])
+    # Files that are not sorted are still merged correctly
+    write_processed(tmpdir, 'processed_3.json', use_cases=[make_entry('g', 2), make_entry('h', 6)],
+                    tutorial_ideas=[make_entry('über', 3)])
+    tmpdir.join('processed_4.json').write_text('{"use_cases": [', encoding='utf-8')
+    output = str(tmpdir.join('combined_comments.json'))
+
+    counts = combine.combine_json_files(str(tmpdir), output)
+    assert counts == {'tutorial_ideas': 1, 'use_cases': 8, 'technical_questions': 0, 'problem_statements': 0}
+
+    with open(output, encoding='utf-8') as f:
+        text = f.read()
+    data = json.loads(text)
+    assert [entry['content'] for entry in data['use_cases']] == ['d', 'a', 'e', 'h', 'c', 'b', 'g', 'f']
+    assert [entry['votes'] for entry in data['use_cases']] == [1200, 10, 7, 6, 5, 5, 2, 1]
+    assert text == json.dumps(data, indent=4, ensure_ascii=False)
+
+
+def test_that_near_identical_entries_can_be_dropped(tmpdir):
+    write_processed(tmpdir, 'processed_1.json', use_cases=[make_entry('Use it for invoices!', 3)])
+    write_processed(tmpdir, 'processed_2.json', use_cases=[make_entry('use it  for invoices', 8),
+                                                           make_entry('use it for invoices', 1, author='other')])
+    output = str(tmpdir.join('combined_comments.json'))
+
+    assert combine.combine_json_files(str(tmpdir), output)['use_cases'] == 3
+    assert combine.combine_json_files(str(tmpdir), output, dedupe=True)['use_cases'] == 2
+    with open(output, encoding='utf-8') as f:
+        assert [entry['votes'] for entry in json.load(f)['use_cases']] == [8, 1]
+
+
+def test_that_many_files_are_merged_in_rounds(tmpdir, monkeypatch):
+    for index in range(10):
+        write_processed(tmpdir, f'processed_{index}.json',
+                        use_cases=[make_entry(f'{index}.{votes}', votes) for votes in range(30 - index, 0, -7)])
+    file_paths = sorted(str(path) for path in tmpdir.listdir())
+    expected = list(combine.merge_category(file_paths, 'use_cases'))
+
+    state = {'open': 0, 'max': 0}
+
+    @contextlib.contextmanager
+    def tracking_open(*args, **kwargs):
+        with open(*args, **kwargs) as file:
+            state['open'] += 1
+            state['max'] = max(state['max'], state['open'])
+            try:
+                yield file
+            finally:
+                state['open'] -= 1
+
+    monkeypatch.setattr(combine, 'open', tracking_open, raising=False)
+    assert list(combine.merge_category(file_paths, 'use_cases', max_open=3)) == expected
+    assert [entry['votes'] for entry in expected] == sorted((entry['votes'] for entry in expected), reverse=True)
+    assert len(expected) == sum(len(range(30 - index, 0, -7)) for index in range(10))
+    # The files of a group, plus the temporary file they are merged into
+    assert state == {'open': 0, 'max': 4}
@@ -0,0 +1,84 @@
+import io
+
+import pytest
+
+from youtube_comment_downloader.batch import BatchDownloader
+from youtube_comment_downloader.comment import Comment, parse_count
+from youtube_comment_downloader.database import CommentDatabase
+from youtube_comment_downloader.incremental import track_comments
+from youtube_comment_downloader.reader import iter_comments
+from youtube_comment_downloader.writer import write_comments
+
+from .fake_youtube import FakeYoutube, fake_downloader
+
+URL = 'https://www.youtube.com/watch?v=fake'
+
+
+@pytest.mark.parametrize('text, language, count', [
+    ('', None, 0),
+    ('1 234', None, 1234),
+    ('1.234', None, 1234),
+    ('1,2 Tsd.', 'de', 1200),
+    ('3,4 Mio.', 'de', 3400000),
+    ('2,5 k', 'fr', 2500),
+    ('1,5 Md', 'fr', 1500000000),
+    ('12 mil', 'es', 12000),
+    ('1,2 mi', 'pt', 1200000),
+    ('1,2\xa0тыс.', 'ru', 1200),
+    ('1.2万', 'ja', 12000),
+    ('3억', 'ko', 300000000),
+    ('1,2 B', None, 1200000000),
+    ('1,2 B', 'tr', 1200),
+    ('4 Mn', 'tr', 4000000),
+    ('1,2 rb', 'id', 1200),
+    ('7 N', 'vi', 7000),
+    (15, None, 15),
+    ('1.2X', None, None),
+])
+def test_that_localized_counts_are_parsed(text, language, count):
+    assert parse_count(text, language) == count
+
+
+def test_that_comments_can_be_yielded_as_records():
+    youtube = FakeYoutube(threads=5, replies={'thread1': 12})
+    comments = list(fake_downloader(youtube).get_comments_from_url(URL, sleep=0, time_parsed=False))
+    records = list(fake_downloader(youtube).get_comments_from_url(URL, sleep=0, time_parsed=False, records=True))
+
+    assert [record.cid for record in records] == [comment['cid'] for comment in comments]
+    thread = records[1]
+    assert (thread.cid, thread.votes, thread.replies, thread.heart, thread.parent) == ('thread1', 7, 12, True, None)
+    assert [record.parent for record in records if record.reply] == ['thread1'] * 12
+    assert not hasattr(thread, '__dict__')
+
+    for record, comment in zip(records, comments):
+        assert record.to_dict() == dict(comment, votes=int(comment['votes']), replies=int(comment['replies'] or 0))
+        assert Comment.from_dict(record.to_dict()) == record
+
+
+def test_that_optional_fields_are_kept():
+    comment = {'cid': 'a', 'text': 'text', 'time': '1 day ago', 'author': '@a', 'channel': 'c', 'votes': '1.2K',
+               'replies': '', 'photo': '', 'heart': False, 'reply': False, 'time_parsed': 1.5, 'paid': '$5.00'}
+    record = Comment.from_dict(comment)
+    assert (record.votes, record.replies, record.time_parsed, record.paid) == (1200, 0, 1.5, '$5.00')
+    assert record.to_dict() == dict(comment, votes=1200, replies=0)
+
+
+def test_that_records_can_be_written_and_stored(tmp_path):
+    youtube = FakeYoutube(threads=3, replies=2)
+    downloader = fake_downloader(youtube)
+    expected = [Comment.from_dict(comment) for comment in downloader.get_comments_from_url(URL, sleep=0)]
+
+    with CommentDatabase(str(tmp_path / 'comments.sqlite')) as database:
+        comments = database.track_comments(downloader.get_comments_from_url(URL, sleep=0, records=True), 'fake')
+        output = io.StringIO()
+        assert write_comments(output, comments, pretty=True) == 9
+        assert database.get_comment('thread1.reply0')['parent'] == 'thread1'
+    assert [Comment.from_dict(comment) for comment in iter_comments(io.StringIO(output.getvalue()))] == expected
+
+    # BatchDownloader passes records on to the downloader as well
+    batch = BatchDownloader(downloader_factory=lambda **kwargs: fake_downloader(youtube, **kwargs))
+    results = batch.download_all(['fake'], str(tmp_path / 'batch'), records=True)
+    assert results == {'fake': 9}
+
+    with pytest.raises(TypeError):
+        list(track_comments(downloader.get_comments_from_url(URL, sleep=0, records=True), {}))
@@ -0,0 +1,57 @@
+import time
+
+from .fake_youtube import FakeYoutube, fake_downloader
+
+URL = 'https://www.youtube.com/watch?v=fake'
+
+
+def cids(downloader, **kwargs):
+    return [comment['cid'] for comment in downloader.get_comments_from_url(URL, sleep=0, **kwargs)]
+
+
+def test_that_concurrent_fetching_preserves_the_sequential_order():
+    sequential = cids(fake_downloader(FakeYoutube(threads=9, replies=7, page_size=3)))
+    concurrent = cids(fake_downloader(FakeYoutube(threads=9, replies=7, page_size=3)), concurrency=4)
+
+    assert len(sequential) == 9 * 8
+    assert concurrent == sequential
+
+
+def test_that_number_of_requests_in_flight_is_bounded():
+    youtube = FakeYoutube(threads=12, replies=2, page_size=4, delay=0.01)
+    cids(fake_downloader(youtube), concurrency=3)
+
+    assert 1 < youtube.max_active <= 3
+
+
+def test_that_closing_the_generator_stops_fetching():
+    youtube = FakeYoutube(threads=40, replies=2, page_size=4)
+    generator = fake_downloader(youtube).get_comments_from_url(URL, sleep=0, concurrency=3)
+    next(generator)
+    generator.close()
+    requests = len(youtube.requests)
+
+    assert requests < 10
+    assert len(youtube.requests) == requests
+
+
+class TimedYoutube(FakeYoutube):
+
+    def __init__(self, **kwargs):
+        super(TimedYoutube, self).__init__(**kwargs)
+        self.times = []
+
+    def request(self, method, url, **kwargs):
+        if method == 'POST':
+            with self.lock:
+                self.times.append(time.monotonic())
+        return super(TimedYoutube, self).request(method, url, **kwargs)
+
+
+def test_that_prefetching_keeps_the_requests_paced():
+    youtube = TimedYoutube(threads=6, replies=2, page_size=3)
+    comments = list(fake_downloader(youtube).get_comments_from_url(URL, sleep=0.05, concurrency=4))
+
+    assert len(comments) == 18
+    gaps = [later - earlier for earlier, later in zip(youtube.times, youtube.times[1:])]
+    assert len(gaps) == 7 and min(gaps) > 0.04
@@ -0,0 +1,64 @@
+import json
+
+from youtube_comment_downloader.database import CommentDatabase
+from youtube_comment_downloader.downloader import get_youtube_id
+
+from .fake_youtube import FakeYoutube, run_main
+
+
+def comment(cid, channel='channel', votes='0', time_parsed=None):
+    return {'cid': cid, 'text': 'Text of ' + cid, 'time': '1 day ago', 'author': '@author', 'channel': channel,
+            'votes': votes, 'replies': '', 'photo': '', 'heart': False, 'reply': '.' in cid, 'time_parsed': time_parsed}
+
+
+def test_that_video_ids_are_extracted_from_urls():
+    assert get_youtube_id('https://www.youtube.com/watch?v=ScMzIvxBSi4&t=10') == 'ScMzIvxBSi4'
+    assert get_youtube_id('https://www.youtube.com/shorts/ScMzIvxBSi4') == 'ScMzIvxBSi4'
+    assert get_youtube_id('https://youtu.be/ScMzIvxBSi4') == 'ScMzIvxBSi4'
+
+
+def test_that_comments_are_upserted_and_can_be_queried(tmp_path):
+    filename = str(tmp_path / 'comments.sqlite')
+    with CommentDatabase(filename, batch_size=2) as database:
+        comments = [comment('a', votes='1.5K', time_parsed=100), comment('a.1', votes='3', time_parsed=200),
+                    comment('b', channel='other', votes='12', time_parsed=300)]
+        assert list(database.track_comments(iter(comments), 'video1')) == comments
+        database.add(comment('c', votes='7'), 'video2', fetch_time=1000)
+
+    with CommentDatabase(filename) as database:
+        database.add(comment('a', votes='2K', time_parsed=100), 'video1')
+        assert database.count() == 4
+        assert database.count('video1') == 3
+        assert database.get_video_ids() == ['video1', 'video2']
+        assert database.get_comment('a')['votes'] == 2000
+        assert database.get_comment('c') == dict(comment('c', votes=7), video_id='video2', parent=None, replies=0,
+                                                 paid=None, fetch_time=1000)
+        assert [c['cid'] for c in database.get_replies('a')] == ['a.1']
+        assert [c['cid'] for c in database.top_comments(3)] == ['a', 'b', 'c']
+        assert [c['cid'] for c in database.find_comments(channel='channel', since=150)] == ['a.1']
+        assert [c['cid'] for c in database.find_comments(video_id='video1', order_by='time', limit=2)] == ['b', 'a.1']
+
+
+def test_that_the_cli_writes_to_the_database(monkeypatch, tmp_path):
+    filename, output = str(tmp_path / 'comments.sqlite'), str(tmp_path / 'comments.json')
+    youtube = FakeYoutube(threads=5, replies=2)
+    assert run_main(monkeypatch, youtube, '--output-db', filename) == 0
+    assert run_main(monkeypatch, youtube, '--output-db', filename, '-o', output) == 0
+
+    with open(output, encoding='utf8') as fp:
+        cids = sorted(json.loads(line)['cid'] for line in fp)
+    with CommentDatabase(filename) as database:
+        assert sorted(c['cid'] for c in database.find_comments(video_id='fake')) == cids
+        assert len(cids) == 15
+
+
+def test_that_batch_downloads_share_the_database(monkeypatch, tmp_path):
+    filename, batch = str(tmp_path / 'comments.sqlite'), tmp_path / 'ids.txt'
+    batch.write_text('one\ntwo\nthree\n')
+    assert run_main(monkeypatch, FakeYoutube(threads=3, replies=1), '--batch', str(batch),
+                    '--output-db', filename) == 0
+    with CommentDatabase(filename) as database:
+        # Every fake video has the same comment IDs, so the rows are updated rather than duplicated
+        assert database.count() == 6
+        # Which video a row ends up with depends on the order in which the workers finish
+        assert set(database.get_video_ids()) <= {'one', 'two', 'three'}
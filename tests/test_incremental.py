@@ -0,0 +1,45 @@
+import json
+
+from youtube_comment_downloader.incremental import load_known_comments
+
+from .fake_youtube import FakeYoutube, run_main
+
+THREADS = ['thread%d' % index for index in range(9, -1, -1)]
+
+
+def read_cids(filename):
+    with open(filename, encoding='utf8') as fp:
+        return [json.loads(line)['cid'] for line in fp]
+
+
+def test_that_only_new_and_changed_comments_are_downloaded(monkeypatch, tmp_path):
+    day1, day2, day3 = (str(tmp_path / name) for name in ['day1.json', 'day2.json', 'day3.json'])
+    run_main(monkeypatch, FakeYoutube(threads=THREADS, replies={'thread5': 2}, page_size=3), '-o', day1)
+
+    youtube = FakeYoutube(threads=['thread11', 'thread10'] + THREADS, replies={'thread5': 2, 'thread8': 2},
+                          page_size=3)
+    assert run_main(monkeypatch, youtube, '-o', day2, '--incremental', day1) == 0
+
+    assert read_cids(day2) == ['thread11', 'thread10', 'thread8', 'thread8.reply0', 'thread8.reply1']
+    # Paging stopped at the second page, which only had known threads
+    assert youtube.requests[1:] == ['page:0', 'page:1', 'replies:thread8:0']
+
+    youtube = FakeYoutube(threads=['thread11', 'thread10'] + THREADS, replies={'thread5': 2, 'thread8': 2},
+                          page_size=3)
+    assert run_main(monkeypatch, youtube, '-o', day3, '--incremental', day2 + '.index') == 0
+    assert read_cids(day3) == []
+    assert youtube.requests[1:] == ['page:0']
+
+
+def test_that_known_comments_can_be_loaded_from_any_format(monkeypatch, tmp_path):
+    youtube = FakeYoutube(threads=3, replies=1)
+    ndjson, pretty = str(tmp_path / 'comments.json'), str(tmp_path / 'pretty.json')
+    run_main(monkeypatch, youtube, '-o', ndjson)
+    run_main(monkeypatch, youtube, '-o', pretty, '--pretty')
+    run_main(monkeypatch, youtube, '-o', str(tmp_path / 'delta.json'), '--incremental', ndjson)
+
+    expected = {'thread0': '1', 'thread0.reply0': '', 'thread1': '1', 'thread1.reply0': '',
+                'thread2': '1', 'thread2.reply0': ''}
+    assert load_known_comments(ndjson) == expected
+    assert load_known_comments(pretty) == expected
+    assert load_known_comments(str(tmp_path / 'delta.json.index')) == expected
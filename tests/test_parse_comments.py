@@ -0,0 +1,201 @@
+import importlib.util
+import json
+import os
+import threading
+import time
+from types import SimpleNamespace
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def load_script():
+    spec = importlib.util.spec_from_file_location('parse_comments', os.path.join(ROOT, 'parse-comments.py'))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+parse_comments = load_script()
+
+
+class FakeCompletions:
+    """
+    Local stand-in for the chat completions endpoint. Picks the comments with 'idea' in them as tutorial ideas.
+    Requests with more than `max_comments` comments run out of output tokens.
+    """
+
+    def __init__(self, delay=0, max_comments=None):
+        self.delay = delay
+        self.max_comments = max_comments
+        self.lock = threading.Lock()
+        self.calls = []
+        self.active = 0
+        self.max_active = 0
+
+    def create(self, model, messages, temperature, max_tokens):
+        with self.lock:
+            self.calls.append(messages)
+            self.active += 1
+            self.max_active = max(self.max_active, self.active)
+        try:
+            time.sleep(self.delay)
+            blocks = messages[1]['content'].split('\n\n')
+            if self.max_comments and len(blocks) > self.max_comments:
+                return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content='{"tutorial'),
+                                                                finish_reason='length')])
+            ideas = []
+            for block in blocks:
+                lines = block.split('\n')
+                if 'idea' in lines[1]:
+                    ideas.append({'content': lines[1], 'author': lines[0][len('Comment by '):-1],
+                                  'votes': int(lines[2][len('Votes: '):]), 'hearted': False, 'has_replies': False})
+            content = json.dumps(dict(parse_comments.EMPTY_RESULT, tutorial_ideas=ideas))
+            return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=content),
+                                                            finish_reason='stop')],
+                                   usage=SimpleNamespace(total_tokens=100))
+        finally:
+            with self.lock:
+                self.active -= 1
+
+
+def fake_client(**kwargs):
+    return SimpleNamespace(chat=SimpleNamespace(completions=FakeCompletions(**kwargs)))
+
+
+def write_video(directory, name, texts):
+    comments = [{'cid': str(i), 'text': text, 'author': '@user%d' % i, 'votes': str(i), 'heart': False,
+                 'replies': ''} for i, text in enumerate(texts)]
+    with open(os.path.join(directory, name), 'w', encoding='utf8') as fp:
+        json.dump({'comments': comments}, fp)
+
+
+def test_that_files_are_processed_concurrently(tmp_path):
+    input_dir, output_dir = tmp_path / 'comments', tmp_path / 'output'
+    input_dir.mkdir()
+    for index in range(8):
+        write_video(str(input_dir), 'video%d.json' % index, ['A video idea about testing %d' % index, 'First!'] +
+                    ['Another idea for a tutorial'] * (index % 2))
+    write_video(str(input_dir), 'boring.json', ['Nice video', 'First!'])
+
+    client = fake_client(delay=0.05)
+    pipeline = parse_comments.CommentPipeline(client, 'prompt', {'workers': 4, 'cache_directory': None})
+    results = pipeline.process_directory(str(input_dir), str(output_dir))
+
+    assert len(client.chat.completions.calls) == 9
+    assert client.chat.completions.max_active > 1
+    assert results['boring.json'] is None
+    with open(results['video1.json'], encoding='utf8') as fp:
+        ideas = json.load(fp)['tutorial_ideas']
+    assert [idea['votes'] for idea in ideas] == [2, 0]
+    assert sorted(os.listdir(str(output_dir))) == ['processed_video%d.json' % index for index in range(8)]
+
+
+def test_that_the_limiter_waits_for_tokens_to_become_available():
+    limiter = parse_comments.MinuteRateLimiter(requests_per_minute=10, tokens_per_minute=100)
+    first = limiter.acquire(60)
+    acquired = threading.Event()
+    thread = threading.Thread(target=lambda: limiter.acquire(60) and acquired.set())
+    thread.start()
+    assert not acquired.wait(0.1)
+
+    # The first request turned out to use fewer tokens than estimated
+    limiter.update(first, 10)
+    assert acquired.wait(1)
+    thread.join()
+
+
+def test_that_the_limiter_limits_requests_per_minute(monkeypatch):
+    limiter = parse_comments.MinuteRateLimiter(requests_per_minute=2, tokens_per_minute=1000)
+    now = [0]
+    monkeypatch.setattr(parse_comments.time, 'monotonic', lambda: now[0])
+
+    def wait(timeout):
+        now[0] += timeout
+    monkeypatch.setattr(limiter.condition, 'wait', wait)
+
+    for _ in range(5):
+        limiter.acquire(1)
+    assert now[0] == pytest.approx(120)
+
+
+def test_that_comments_are_chunked_by_tokens():
+    comments = [{'text': 'x' * (40 * (i % 3 + 1)), 'author': '@user', 'votes': '0', 'heart': False, 'replies': False}
+                for i in range(20)]
+    chunks = parse_comments.chunk_comments(comments, 100)
+    assert [comment for chunk in chunks for comment in chunk] == comments
+    for chunk in chunks:
+        assert parse_comments.estimate_tokens(parse_comments.format_comments(chunk)) <= 100
+    assert parse_comments.chunk_comments([], 100) == []
+
+
+def test_that_large_files_are_split_and_merged(tmp_path):
+    input_dir, output_dir = tmp_path / 'comments', tmp_path / 'output'
+    input_dir.mkdir()
+    write_video(str(input_dir), 'large.json', ['Tutorial idea number %d' % i if i % 3 == 0 else 'Cool video %d' % i
+                                               for i in range(30)])
+
+    client = fake_client(max_comments=4)
+    pipeline = parse_comments.CommentPipeline(client, 'prompt', {'chunk_tokens': 200, 'cache_directory': None})
+    results = pipeline.process_directory(str(input_dir), str(output_dir))
+    pipeline.close()
+
+    with open(results['large.json'], encoding='utf8') as fp:
+        result = json.load(fp)
+    assert parse_comments.validate_json_structure(result)
+    assert [idea['votes'] for idea in result['tutorial_ideas']] == list(range(27, -1, -3))
+    # Some chunks were too large for a single response and had to be split again
+    calls = client.chat.completions.calls
+    assert max(len(messages[1]['content'].split('\n\n')) for messages in calls) > 4
+
+
+def test_that_cached_results_skip_the_api(tmp_path):
+    input_dir, output_dir, cache_dir = tmp_path / 'comments', tmp_path / 'output', str(tmp_path / 'cache')
+    input_dir.mkdir()
+    for index in range(3):
+        write_video(str(input_dir), 'video%d.json' % index, ['Tutorial idea for video %d' % index])
+
+    def run(prompt='prompt', **config):
+        client = fake_client()
+        pipeline = parse_comments.CommentPipeline(client, prompt, dict(config, cache_directory=cache_dir))
+        pipeline.process_directory(str(input_dir), str(output_dir))
+        pipeline.close()
+        return len(client.chat.completions.calls)
+
+    assert run() == 3
+    assert run() == 0
+    write_video(str(input_dir), 'video3.json', ['Tutorial idea for video 3'])
+    write_video(str(input_dir), 'video0.json', ['Tutorial idea for video 0, edited'])
+    assert run() == 2
+    # A different prompt or model gets its own cache entries
+    assert run(prompt='other prompt') == 4
+    assert run(model='other-model') == 4
+
+
+def test_that_the_cache_evicts_old_and_least_recently_used_entries(tmp_path):
+    cache = parse_comments.ResultCache(str(tmp_path), max_bytes=250, max_age=3600)
+    keys = [parse_comments.ResultCache.make_key(content=str(index)) for index in range(4)]
+    for index, key in enumerate(keys[:2]):
+        cache.put(key, 'x' * 100)
+        os.utime(cache._path(key), (1000 + index, time.time() - 100 + index))
+    assert cache.get(keys[0]) == 'x' * 100
+
+    # keys[1] was used least recently
+    cache.put(keys[2], 'x' * 100)
+    assert cache.get(keys[1]) is None
+    assert cache.get(keys[0]) is not None and cache.get(keys[2]) is not None
+
+    os.utime(cache._path(keys[0]), (0, time.time() - 7200))
+    assert cache.get(keys[0]) is None
+    assert cache.size == 100
+
+
+def test_that_rewriting_an_entry_does_not_grow_the_cache(tmp_path):
+    cache = parse_comments.ResultCache(str(tmp_path), max_bytes=250, max_age=3600)
+    key, other = (parse_comments.ResultCache.make_key(content=content) for content in ('a', 'b'))
+    cache.put(other, 'x' * 100)
+    for size in (100, 100, 120, 80):
+        cache.put(key, 'x' * size)
+    assert cache.size == 180
+    assert cache.get(other) == 'x' * 100
@@ -0,0 +1,54 @@
+import io
+import json
+
+import pytest
+
+from youtube_comment_downloader.incremental import load_known_comments, save_index
+from youtube_comment_downloader.reader import CommentStream, iter_comments, read_comments
+
+from .fake_youtube import FakeYoutube, run_main
+
+
+@pytest.mark.parametrize('pretty', [False, True])
+def test_that_downloaded_comments_are_read_back(monkeypatch, tmp_path, pretty):
+    youtube = FakeYoutube(threads=6, replies={'thread2': 3})
+    output = str(tmp_path / 'comments.json')
+    assert run_main(monkeypatch, youtube, '-o', output, *(['--pretty'] if pretty else [])) == 0
+
+    with open(output, encoding='utf8') as fp:
+        expected = json.load(fp)['comments'] if pretty else [json.loads(line) for line in fp]
+    assert list(read_comments(output)) == expected
+    assert list(read_comments(output, fields=('cid', 'votes', 'paid'))) == \
+        [{'cid': comment['cid'], 'votes': comment['votes']} for comment in expected]
+
+
+def test_that_comments_are_streamed():
+    comments = [{'cid': str(index), 'text': 'é"  ' * index, 'votes': 10 ** index} for index in range(30)]
+    text = json.dumps({'comments': comments, 'other': [1, {'a': 2}]}, indent=4, ensure_ascii=False)
+
+    stream = CommentStream(io.StringIO(text), chunk_size=16)
+    for comment, expected in zip(stream, comments):
+        assert comment == expected
+        # Only the comment that is being decoded is kept in the buffer
+        assert len(stream.buffer) < 16 + len(json.dumps(expected, indent=4, ensure_ascii=False)) * 2
+    assert list(iter_comments(io.StringIO(json.dumps({'comments': comments})))) == comments
+    assert list(iter_comments(io.StringIO('{\n    "comments": []\n}'))) == []
+    assert list(iter_comments(io.StringIO(''))) == []
+
+    with pytest.raises(ValueError):
+        list(iter_comments(io.StringIO('{"comments": [{"cid": "a"}, {"cid"')))
+
+
+def test_that_known_comments_are_loaded_from_any_format(tmp_path):
+    comments = [{'cid': 'a', 'replies': '2'}, {'cid': 'b', 'replies': ''}]
+    known = {'a': '2', 'b': ''}
+    files = {'lines.json': '\n'.join(json.dumps(comment) for comment in comments) + '\n',
+             'pretty.json': json.dumps({'comments': comments}, indent=4),
+             'indented_index.json': json.dumps(known, indent=4),
+             'empty.json': ''}
+    for name, text in files.items():
+        (tmp_path / name).write_text(text, encoding='utf8')
+    save_index(str(tmp_path / 'index.json'), known)
+
+    for name in list(files) + ['index.json']:
+        assert load_known_comments(str(tmp_path / name)) == ({} if name == 'empty.json' else known)
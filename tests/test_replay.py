@@ -0,0 +1,34 @@
+import pytest
+
+from youtube_comment_downloader.downloader import YoutubeCommentDownloader
+from youtube_comment_downloader.replay import ReplaySession, record_comments
+
+from .fake_youtube import FakeYoutube, fake_downloader
+
+URL = 'https://www.youtube.com/watch?v=fake'
+
+
+@pytest.mark.parametrize('extension', ['json', 'json.gz'])
+def test_that_replayed_downloads_match_the_recorded_download(tmp_path, monkeypatch, extension):
+    monkeypatch.setattr('time.sleep', lambda seconds: None)
+    filename = str(tmp_path / ('fake.' + extension))
+    youtube = FakeYoutube(threads=7, replies={'thread2': 6, 'thread5': 1}, page_size=3)
+    downloader = fake_downloader(youtube)
+    assert record_comments('fake', filename, downloader, time_parsed=False) == 14
+    assert downloader.session is youtube
+
+    expected = list(fake_downloader(youtube).get_comments_from_url(URL, time_parsed=False))
+    replay = YoutubeCommentDownloader(session=ReplaySession.load(filename))
+    assert list(replay.get_comments_from_url(URL, time_parsed=False)) == expected
+    replay = YoutubeCommentDownloader(session=ReplaySession.load(filename))
+    assert list(replay.get_comments_from_url(URL, time_parsed=False, concurrency=4)) == expected
+
+
+def test_that_requests_that_were_not_recorded_fail(tmp_path, monkeypatch):
+    monkeypatch.setattr('time.sleep', lambda seconds: None)
+    filename = str(tmp_path / 'fake.json')
+    record_comments('fake', filename, fake_downloader(FakeYoutube(threads=2, replies=0)))
+
+    replay = YoutubeCommentDownloader(session=ReplaySession.load(filename))
+    with pytest.raises(KeyError):
+        list(replay.get_comments('other'))
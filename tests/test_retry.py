@@ -0,0 +1,105 @@
+import pytest
+
+from youtube_comment_downloader.downloader import RequestError
+from youtube_comment_downloader.ratelimit import RateLimiter
+from youtube_comment_downloader.retry import RetryPolicy, parse_retry_after
+
+from .fake_youtube import FakeResponse, FakeYoutube, fake_downloader
+
+URL = 'https://www.youtube.com/watch?v=fake'
+
+
+class FlakyYoutube(FakeYoutube):
+    """
+    Returns the given (status code, headers) responses for the first continuation requests.
+    """
+
+    def __init__(self, failures, **kwargs):
+        super(FlakyYoutube, self).__init__(**kwargs)
+        self.failures = list(failures)
+
+    def request(self, method, url, **kwargs):
+        if method == 'POST' and self.failures:
+            status_code, headers = self.failures.pop(0)
+            self.requests.append(status_code)
+            return FakeResponse(url, status_code=status_code, headers=headers)
+        return super(FlakyYoutube, self).request(method, url, **kwargs)
+
+
+@pytest.fixture
+def sleeps(monkeypatch):
+    sleeps = []
+    monkeypatch.setattr('time.sleep', sleeps.append)
+    return sleeps
+
+
+def test_that_backoff_grows_exponentially_with_jitter():
+    policy = RetryPolicy(retries=4, backoff=1, max_backoff=5, jitter=0.5)
+    for attempt, maximum in enumerate([1, 2, 4, 5]):
+        assert maximum / 2 <= policy.get_delay(attempt, 503) <= maximum
+    assert policy.get_delay(4, 503) is None
+    assert policy.get_delay(0, 403) is None
+    assert policy.get_delay(0, 429, retry_after=7) == 7
+
+
+def test_that_retry_after_can_be_seconds_or_a_date():
+    assert parse_retry_after('12') == 12
+    assert parse_retry_after('Wed, 21 Oct 2015 07:28:00 GMT') == 0
+    assert parse_retry_after('soon') is None
+    assert parse_retry_after(None) is None
+
+
+def test_that_throttling_and_server_errors_are_retried(sleeps):
+    youtube = FlakyYoutube([(429, {'Retry-After': '3'}), (500, {}), (503, {})], threads=2, replies=0)
+    downloader = fake_downloader(youtube, retry_policy=RetryPolicy(backoff=1, jitter=0))
+    assert [c['cid'] for c in downloader.get_comments_from_url(URL, sleep=0)] == ['thread0', 'thread1']
+    assert sleeps == [3, 2, 4]
+
+
+def test_that_rejected_requests_are_not_silently_ignored(sleeps):
+    youtube = FlakyYoutube([(403, {})], threads=2, replies=0)
+    with pytest.raises(RequestError) as e:
+        list(fake_downloader(youtube).get_comments_from_url(URL, sleep=0))
+    assert e.value.status_code == 403
+    assert sleeps == []
+
+
+def test_that_long_retry_after_values_are_not_waited_for(sleeps):
+    youtube = FlakyYoutube([(429, {'Retry-After': '86400'})], threads=2, replies=0)
+    with pytest.raises(RequestError) as e:
+        list(fake_downloader(youtube).get_comments_from_url(URL, sleep=0))
+    assert e.value.status_code == 429
+    assert 'wait 86400 seconds' in str(e.value)
+    assert sleeps == []
+
+
+def test_that_downloads_fail_once_retries_are_exhausted(sleeps):
+    youtube = FlakyYoutube([(502, {})] * 10, threads=2, replies=0)
+    with pytest.raises(RequestError):
+        list(fake_downloader(youtube, retry_policy=RetryPolicy(retries=2)).get_comments_from_url(URL, sleep=0))
+    assert youtube.requests[1:] == [502, 502, 502]
+
+
+def test_that_the_rate_limiter_adapts_to_throttling(sleeps):
+    limiter = RateLimiter(100, adaptive=True)
+    youtube = FlakyYoutube([(429, {})] * 3, threads=2, replies=0)
+    downloader = fake_downloader(youtube, rate_limiter=limiter, retry_policy=RetryPolicy(jitter=0))
+    list(downloader.get_comments_from_url(URL))
+    # Halved three times, then increased once for the successful request
+    assert limiter.get_rate('www.youtube.com') == 100 / 8.0 + 5
+    # The other sleeps are the rate limiter spacing out requests, there is no fixed sleep between pages
+    assert [delay for delay in sleeps if delay >= 1] == [2, 4, 8]
+    assert .1 not in sleeps
+
+
+def test_that_retry_after_pauses_all_requests_to_the_host():
+    limiter = RateLimiter(1000, burst=10)
+    limiter.throttle('example.com', retry_after=2)
+    assert 1.9 < limiter.reserve('example.com') <= 2.001
+    assert limiter.reserve('other.com') == 0
+
+
+def test_that_retry_after_pauses_the_host_for_a_limited_time():
+    limiter = RateLimiter(1000, burst=10, max_retry_after=5)
+    limiter.throttle('example.com', retry_after=86400)
+    assert 4.9 < limiter.reserve('example.com') <= 5.001
@@ -0,0 +1,125 @@
+import json
+import random
+
+import pytest
+
+from youtube_comment_downloader.scheduler import BREADTH_FIRST, ContinuationScheduler
+
+from .fake_youtube import FakeYoutube, fake_downloader
+
+URL = 'https://www.youtube.com/watch?v=fake'
+
+
+class ListScheduler:
+    """
+    The plain list that was used before ContinuationScheduler, which the depth-first order should match.
+    """
+
+    def __init__(self, continuations):
+        self.continuations = list(continuations)
+
+    def add_pages(self, endpoints):
+        self.continuations[:0] = endpoints
+
+    add_threads = add_pages
+
+    def add_more_replies(self, endpoint):
+        self.continuations.append(endpoint)
+
+    def pop(self):
+        return self.continuations.pop()
+
+
+class TrackingScheduler(ContinuationScheduler):
+
+    max_seen = 0
+
+    def pop(self):
+        TrackingScheduler.max_seen = max(TrackingScheduler.max_seen, len(self.replies))
+        return super(TrackingScheduler, self).pop()
+
+
+def download(youtube, **kwargs):
+    downloader = fake_downloader(youtube)
+    return [comment['cid'] for comment in downloader.get_comments_from_url(URL, sleep=0, **kwargs)]
+
+
+def test_that_the_default_order_is_unchanged():
+    rng = random.Random(1)
+    scheduler, expected = ContinuationScheduler(['start']), ListScheduler(['start'])
+    for step in range(2000):
+        action = rng.choice(['add_pages', 'add_threads', 'add_more_replies', 'pop'])
+        if action == 'pop':
+            if expected.continuations:
+                assert scheduler.pop() == expected.pop()
+            continue
+        endpoints = ['%d.%d' % (step, index) for index in range(rng.randint(0, 2))]
+        if action == 'add_more_replies':
+            scheduler.add_more_replies(str(step))
+            expected.add_more_replies(str(step))
+        else:
+            getattr(scheduler, action)(endpoints)
+            getattr(expected, action)(endpoints)
+        assert list(scheduler) == expected.continuations
+    while expected.continuations:
+        assert scheduler.pop() == expected.pop()
+    assert not scheduler
+
+
+@pytest.mark.parametrize('max_pending', [None, 1, 3])
+def test_that_iterating_matches_pop(max_pending):
+    scheduler = ContinuationScheduler(order=BREADTH_FIRST, max_pending=max_pending)
+    scheduler.add_threads(['thread0', 'thread1'])
+    scheduler.add_pages(['page1'])
+    scheduler.add_threads(['thread2', 'thread3'])
+    scheduler.add_pages(['page2'])
+    scheduler.add_more_replies('thread4.more')
+
+    expected = list(reversed(scheduler))
+    assert list(scheduler) == expected[::-1]
+    assert [scheduler.pop() for _ in range(len(scheduler))] == expected
+    assert expected[0] == 'thread4.more'
+
+
+def test_that_breadth_first_downloads_the_threads_first():
+    youtube = FakeYoutube(threads=10, replies=5, page_size=2)
+    comments = download(youtube, order=BREADTH_FIRST, max_pending=None)
+    assert sorted(comments) == sorted(download(youtube))
+
+    threads = [cid for cid in comments if '.' not in cid]
+    assert comments[:len(threads)] == threads
+    # The replies of a thread are never interrupted by other comments
+    replies = comments[len(threads):]
+    assert [cid.split('.')[0] for cid in replies] == [cid for cid in threads for _ in range(5)]
+
+
+def test_that_the_number_of_pending_threads_is_bounded(monkeypatch):
+    monkeypatch.setattr('youtube_comment_downloader.downloader.ContinuationScheduler', TrackingScheduler)
+    monkeypatch.setattr(TrackingScheduler, 'max_seen', 0)
+    youtube = FakeYoutube(threads=40, replies=3, page_size=4)
+    comments = download(youtube, order=BREADTH_FIRST, max_pending=6)
+    assert len(comments) == 160
+    # Once max_pending threads are waiting, at most one more page of them is added
+    assert 6 <= TrackingScheduler.max_seen <= 6 + 4
+
+
+def test_that_unknown_orders_are_rejected():
+    with pytest.raises(ValueError):
+        ContinuationScheduler(order='random')
+
+
+def test_that_the_state_can_be_restored():
+    scheduler = ContinuationScheduler(['page0'], order=BREADTH_FIRST, max_pending=2)
+    scheduler.pop()
+    for thread in ('thread0', 'thread1', 'thread2'):
+        scheduler.add_threads([thread])
+    scheduler.add_pages(['page1'])
+    assert scheduler.pop() == 'thread0'
+    scheduler.add_more_replies('thread0.more')
+
+    restored = ContinuationScheduler.from_state(json.loads(json.dumps(scheduler.get_state())))
+    assert (restored.order, restored.max_pending) == (BREADTH_FIRST, 2)
+    assert list(reversed(restored)) == list(reversed(scheduler)) == ['thread0.more', 'thread1', 'page1', 'thread2']
+
+    # Checkpoints written by earlier versions contain a plain list
+    assert list(ContinuationScheduler.from_state(['page1', 'thread0'])) == ['page1', 'thread0']
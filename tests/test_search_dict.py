@@ -1,4 +1,9 @@
-from downloader import search_dict
+from youtube_comment_downloader.downloader import PAGE_KEYS, YoutubeCommentDownloader
+
+from .fake_youtube import FakeYoutube
+
+search_dict = YoutubeCommentDownloader.search_dict
+search_dict_multi = YoutubeCommentDownloader.search_dict_multi
 
 
 def test_that_nothing_is_yielded_from_empty_dict():
@@ -32,3 +37,29 @@ def test_that_expected_value_is_yielded_when_nesting_dictionaries():
 def test_benchmark_search(benchmark):
     test_dict = {index: list(range(10)) for index in range(1, 30)}
     benchmark(lambda: list(search_dict(test_dict, "test")))
+
+
+def test_that_multi_search_returns_an_empty_list_for_missing_keys():
+    assert search_dict_multi({"a": [1, 2]}, ["test", "other"]) == {"test": [], "other": []}
+
+
+def test_that_multi_search_finds_keys_nested_inside_other_matches():
+    partial = {"outer": {"inner": "expected", "outer": "nested"}, "inner": "expected"}
+    assert search_dict_multi(partial, ["outer", "inner"]) == {
+        "outer": [{"inner": "expected", "outer": "nested"}],
+        "inner": ["expected", "expected"],
+    }
+
+
+def test_that_multi_search_matches_search_dict_on_continuation_responses():
+    youtube = FakeYoutube(threads=5, replies=6, page_size=4)
+    responses = [youtube.top_level_page(0), youtube.top_level_page(1), youtube.reply_page("thread1", 1)]
+    for response in responses:
+        index = search_dict_multi(response, PAGE_KEYS)
+        for key in PAGE_KEYS:
+            assert index[key] == list(search_dict(response, key))
+
+
+def test_benchmark_search_multi(benchmark):
+    response = FakeYoutube(threads=20, replies=0, page_size=20).top_level_page(0)
+    benchmark(lambda: search_dict_multi(response, PAGE_KEYS))
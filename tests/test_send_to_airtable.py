@@ -0,0 +1,175 @@
+import importlib.util
+import os
+
+import pytest
+
+from .fake_youtube import FakeResponse
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def load_script():
+    path = os.path.join(ROOT, 'comments', 'output', 'send-to-airtable.py')
+    spec = importlib.util.spec_from_file_location('send_to_airtable', path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+send_to_airtable = load_script()
+
+
+class FakeAirtable:
+    """
+    Local stand-in for the Airtable records API. `failures` is a list of status codes to return for the first
+    requests, and records with 'invalid' as content are rejected.
+    """
+
+    def __init__(self, failures=(), retry_after='2'):
+        self.headers = {}
+        self.retry_after = retry_after
+        self.failures = list(failures)
+        self.requests = []
+        self.records = {}
+
+    def request(self, method, url, json=None, timeout=None):
+        self.requests.append((method, len(json['records'])))
+        if self.failures:
+            status_code = self.failures.pop(0)
+            headers = {'Retry-After': self.retry_after} if self.retry_after else {}
+            return FakeResponse(url, status_code=status_code, text='error', headers=headers)
+        if len(json['records']) > send_to_airtable.MAX_BATCH_SIZE:
+            return FakeResponse(url, status_code=422, text='too many records')
+        if any(record['fields'].get('Content') == 'invalid' for record in json['records']):
+            return FakeResponse(url, status_code=422, text='invalid record')
+        merge_on = json.get('performUpsert', {}).get('fieldsToMergeOn')
+        results = []
+        for record in json['records']:
+            record_id = record.get('id')
+            if merge_on:
+                record_id = next((existing_id for existing_id, fields in self.records.items()
+                                  if all(fields.get(name) == record['fields'][name] for name in merge_on)), None)
+            record_id = record_id or 'rec%d' % len(self.records)
+            self.records[record_id] = dict(self.records.get(record_id, {}), **record['fields'])
+            results.append({'id': record_id, 'fields': self.records[record_id]})
+        return FakeResponse(url, data={'records': results})
+
+
+@pytest.fixture
+def sleeps(monkeypatch):
+    sleeps = []
+    monkeypatch.setattr(send_to_airtable.time, 'sleep', sleeps.append)
+    return sleeps
+
+
+def make_uploader(airtable, **kwargs):
+    return send_to_airtable.AirtableUploader('base', 'table', 'key', session=airtable, **kwargs)
+
+
+def test_that_records_are_uploaded_in_batches(sleeps):
+    airtable = FakeAirtable()
+    records = [{'Content': 'comment %d' % index} for index in range(25)]
+    results, failures = make_uploader(airtable).create_records(records)
+    assert failures == []
+    assert airtable.requests == [('POST', 10), ('POST', 10), ('POST', 5)]
+    assert [result['fields'] for result in results] == records
+    assert airtable.headers['Authorization'] == 'Bearer key'
+
+
+def test_that_requests_are_paced(monkeypatch, sleeps):
+    monkeypatch.setattr(send_to_airtable.time, 'monotonic', lambda: 100.0)
+    make_uploader(FakeAirtable(), requests_per_second=5).create_records([{'Content': 'x'}] * 30)
+    assert sleeps == pytest.approx([0.2, 0.4])
+
+
+def test_that_throttling_and_server_errors_are_retried(sleeps):
+    airtable = FakeAirtable(failures=[429, 503])
+    results, failures = make_uploader(airtable, backoff=1).create_records([{'Content': 'comment'}])
+    assert failures == [] and results[0]['id'] == 'rec0'
+    assert len(airtable.requests) == 3
+    # Retry-After, then backoff
+    assert sleeps[0] == pytest.approx(2, abs=0.1)
+    assert 1 <= sleeps[1] <= 2
+
+
+@pytest.mark.parametrize('retry_after, delay', [('Wed, 21 Oct 2015 07:28:00 GMT', 0), ('soon', 30), (None, 30)])
+def test_that_any_retry_after_header_is_handled(monkeypatch, sleeps, retry_after, delay):
+    monkeypatch.setattr(send_to_airtable.time, 'monotonic', lambda: 100.0)
+    airtable = FakeAirtable(failures=[429], retry_after=retry_after)
+    results, failures = make_uploader(airtable).create_records([{'Content': 'comment'}])
+    assert failures == [] and len(airtable.requests) == 2
+    # Dates in the past mean no extra delay, anything that cannot be parsed means the usual penalty
+    assert sleeps[0] == pytest.approx(max(delay, 0.2))
+
+
+def test_that_the_sync_state_is_kept_next_to_the_input_file(tmpdir):
+    input_file = str(tmpdir.join('combined_comments.json'))
+    assert send_to_airtable.get_sync_state_path(input_file) == str(tmpdir.join('airtable_sync_state.json'))
+
+
+def test_that_failed_batches_are_reported(sleeps):
+    airtable = FakeAirtable()
+    records = [{'Content': 'comment %d' % index} for index in range(15)]
+    records[12]['Content'] = 'invalid'
+    reported = []
+    results, failures = make_uploader(airtable).create_records(records, callback=lambda n, f: reported.append(f))
+    assert [failure.batch_number for failure in failures] == [2]
+    assert '422' in failures[0].error and len(failures[0].records) == 5
+    assert reported == [None, failures[0]]
+    assert results[10:] == [None] * 5 and all(results[:10])
+
+
+def make_record(content, votes=1):
+    return {'Category': 'Praise', 'Content': content, 'Author': 'author', 'Votes': votes, 'Hearted': False,
+            'Has_Replies': False, 'Last_Updated': '2024-01-01T00:00:00'}
+
+
+def test_that_only_new_and_changed_records_are_synced(sleeps):
+    airtable = FakeAirtable()
+    uploader = make_uploader(airtable)
+    state = {}
+    records = [make_record('comment %d' % index) for index in range(12)]
+    assert send_to_airtable.sync_records(uploader, records, state) == (12, [])
+    assert len(airtable.records) == 12 and len(state) == 12
+    assert all(request[0] == 'PATCH' for request in airtable.requests)
+
+    # Running again sends nothing, even if only the timestamp changed
+    airtable.requests = []
+    records = [dict(record, Last_Updated='2024-02-01T00:00:00') for record in records]
+    assert send_to_airtable.sync_records(uploader, records, state) == (0, [])
+    assert airtable.requests == []
+
+    # A changed record is updated in place
+    records[3]['Votes'] = 5
+    assert send_to_airtable.sync_records(uploader, records, state) == (1, [])
+    assert len(airtable.records) == 12
+    key = send_to_airtable.get_sync_key(records[3])
+    assert airtable.records[state[key]['id']]['Votes'] == 5
+
+
+def test_that_losing_the_sync_state_does_not_duplicate_records(tmpdir, sleeps):
+    airtable = FakeAirtable()
+    uploader = make_uploader(airtable)
+    filepath = str(tmpdir.join('state.json'))
+    records = [make_record('comment %d' % index) for index in range(5)] + [make_record('comment 0')]
+
+    state = send_to_airtable.load_sync_state(filepath)
+    assert send_to_airtable.sync_records(uploader, records, state) == (5, [])
+    send_to_airtable.save_sync_state(filepath, state)
+    assert send_to_airtable.load_sync_state(filepath) == state
+
+    assert send_to_airtable.sync_records(uploader, records, {}) == (5, [])
+    assert len(airtable.records) == 5
+
+
+def test_that_failed_batches_are_synced_next_time(sleeps):
+    airtable = FakeAirtable()
+    state = {}
+    records = [make_record('comment'), make_record('invalid')]
+    sent, failures = send_to_airtable.sync_records(make_uploader(airtable), records, state)
+    assert sent == 2 and len(failures) == 1
+    assert state == {}
+
+    records[1]['Content'] = 'fixed'
+    assert send_to_airtable.sync_records(make_uploader(airtable), records, state) == (2, [])
+    assert len(state) == 2
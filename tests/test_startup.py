@@ -0,0 +1,54 @@
+import os
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Modules that are only needed by some commands or options. The package imports them inside the functions that
+# use them rather than at the top of the module, to keep the startup time of the CLI low.
+HEAVY_MODULES = ('dateparser', 'requests', 'asyncio', 'sqlite3', 'http.cookiejar', 'pyarrow')
+
+# Prints the time it takes from the start of the interpreter until the first request is about to be made
+FIRST_REQUEST_SCRIPT = '''
+import sys, time
+start = time.perf_counter()
+from youtube_comment_downloader import main, downloader
+
+def request(self, method, url, **kwargs):
+    print(time.perf_counter() - start)
+    sys.exit(0)
+
+downloader.YoutubeCommentDownloader.request = request
+main(['--youtubeid', 'ScMzIvxBSi4', '--output', sys.argv[1]])
+'''
+
+
+def run_python(*args):
+    return subprocess.run([sys.executable] + list(args), cwd=ROOT, check=True, capture_output=True, text=True).stdout
+
+
+def test_that_heavy_dependencies_are_not_imported_at_startup():
+    modules = run_python('-c', 'import sys, youtube_comment_downloader; print(" ".join(sys.modules))').split()
+    for module in HEAVY_MODULES:
+        assert module not in modules
+
+
+def test_that_failing_argument_parsing_does_not_import_heavy_dependencies():
+    script = ('import sys, youtube_comment_downloader\n'
+              'try:\n'
+              '    youtube_comment_downloader.main([])\n'
+              'except SystemExit:\n'
+              '    print(" ".join(sys.modules))')
+    modules = run_python('-c', script).split()
+    for module in HEAVY_MODULES:
+        assert module not in modules
+
+
+def test_benchmark_import_time(benchmark):
+    benchmark.pedantic(run_python, args=('-c', 'import youtube_comment_downloader'), rounds=5)
+
+
+def test_benchmark_time_to_first_request(benchmark, tmp_path):
+    output = str(tmp_path / 'comments.json')
+    elapsed = benchmark.pedantic(run_python, args=('-c', FIRST_REQUEST_SCRIPT, output), rounds=5)
+    assert float(elapsed.split()[-1]) > 0
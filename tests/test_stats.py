@@ -0,0 +1,85 @@
+import json
+
+import pytest
+
+from youtube_comment_downloader.retry import RetryPolicy
+from youtube_comment_downloader.stats import Hooks, StatsCollector
+
+from .fake_youtube import FakeYoutube, fake_downloader, run_main
+from .test_retry import URL, FlakyYoutube
+
+
+class RecordingHooks(Hooks):
+
+    def __init__(self):
+        self.events = []
+
+    def on_request(self, method, url, status_code, seconds, size):
+        self.events.append(('request', method, status_code))
+
+    def on_retry(self, url, attempt, status_code, delay):
+        self.events.append(('retry', attempt, status_code, delay))
+
+    def on_page(self, timings, comments):
+        assert set(timings) == {'index', 'comments', 'time_parsed'}
+        self.events.append(('page', comments))
+
+    def on_comment(self, comment):
+        self.events.append(('comment', comment['cid']))
+
+
+@pytest.fixture
+def sleeps(monkeypatch):
+    sleeps = []
+    monkeypatch.setattr('time.sleep', sleeps.append)
+    return sleeps
+
+
+def test_that_hooks_are_called_for_every_event(sleeps):
+    youtube = FlakyYoutube([(503, {}), (429, {'Retry-After': '3'})], threads=2, replies={'thread1': 1})
+    hooks = RecordingHooks()
+    downloader = fake_downloader(youtube, retry_policy=RetryPolicy(backoff=1, jitter=0), hooks=hooks)
+    list(downloader.get_comments_from_url(URL, sleep=0))
+
+    assert hooks.events == [('request', 'GET', 200),
+                            ('request', 'POST', 503), ('retry', 0, 503, 1),
+                            ('request', 'POST', 429), ('retry', 1, 429, 3),
+                            ('request', 'POST', 200), ('page', 2), ('comment', 'thread0'), ('comment', 'thread1'),
+                            ('request', 'POST', 200), ('page', 1), ('comment', 'thread1.reply0')]
+
+
+def test_that_statistics_are_collected(sleeps):
+    youtube = FlakyYoutube([(500, {})], threads=10, replies=2)
+    stats = StatsCollector()
+    downloader = fake_downloader(youtube, retry_policy=RetryPolicy(backoff=1, jitter=0), hooks=stats)
+    count = sum(1 for _ in downloader.get_comments_from_url(URL, sleep=0))
+
+    summary = stats.summary()
+    assert summary['requests'] == len(youtube.requests)
+    assert summary['requests_by_status'] == {'200': len(youtube.requests) - 1, '500': 1}
+    assert summary['retries'] == 1 and summary['retry_delay_seconds'] == 1
+    assert summary['comments'] == count == 30
+    assert summary['bytes'] > 0 and summary['pages'] == len(youtube.requests) - 2
+    assert summary['stage_seconds']['time_parsed'] > 0
+
+    lines = stats.prometheus().splitlines()
+    assert 'youtube_comment_downloader_requests_total{status="500"} 1.0' in lines
+    assert 'youtube_comment_downloader_comments_total 30.0' in lines
+    assert 'youtube_comment_downloader_request_duration_seconds_count %r' % float(summary['requests']) in lines
+    assert 'youtube_comment_downloader_request_duration_seconds_bucket{le="+Inf"} %r' % float(summary['requests']) \
+        in lines
+    assert '# TYPE youtube_comment_downloader_stage_seconds_total counter' in lines
+
+
+def test_that_statistics_can_be_written_by_the_cli(monkeypatch, tmp_path):
+    youtube = FakeYoutube(threads=5, replies=1)
+    stats_file, prometheus_file = str(tmp_path / 'stats.json'), str(tmp_path / 'metrics.prom')
+    assert run_main(monkeypatch, youtube, '-o', str(tmp_path / 'comments.json'), '--stats', stats_file,
+                    '--prometheus', prometheus_file) == 0
+
+    with open(stats_file) as fp:
+        summary = json.load(fp)
+    # run_main replaces the request method, so only the pages and comments are counted here
+    assert summary['comments'] == 10 and summary['pages'] == len(youtube.requests) - 1
+    with open(prometheus_file) as fp:
+        assert 'youtube_comment_downloader_comments_total 10.0\n' in fp.read()
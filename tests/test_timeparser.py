@@ -0,0 +1,54 @@
+import datetime
+
+import dateparser
+import pytest
+
+from youtube_comment_downloader.timeparser import _parse_time, parse_relative_time, parse_time
+
+from .fake_youtube import FakeYoutube, fake_downloader
+
+NOW = datetime.datetime(2024, 3, 31, 12, 30, 15).timestamp()
+
+
+@pytest.mark.parametrize('text', [
+    '10 seconds ago', '1 minute ago', '5 hours ago', '3 days ago', '2 weeks ago', '1 month ago', '11 months ago',
+    '1 year ago', '2 years ago', 'vor 3 Tagen', 'vor 1 Monat', 'il y a 2 semaines', 'il y a 1 an', 'hace 1 año',
+    'há 3 meses', '2 giorni fa', '3 dagen geleden', '5 дней назад',
+])
+def test_that_relative_times_match_dateparser(text):
+    expected = dateparser.parse(text, settings={'RELATIVE_BASE': datetime.datetime.fromtimestamp(NOW)})
+    assert parse_relative_time(text, NOW) == expected.timestamp()
+
+
+def test_that_annotations_and_case_are_ignored():
+    assert parse_relative_time('1 Year ago (edited)', NOW) == parse_relative_time('1 year ago', NOW)
+
+
+def test_that_day_is_clamped_to_the_end_of_the_month():
+    expected = datetime.datetime(2024, 2, 29, 12, 30, 15).timestamp()
+    assert parse_relative_time('1 month ago', NOW) == expected
+
+
+def test_that_unknown_formats_are_not_parsed():
+    assert parse_relative_time('Streamed yesterday', NOW) is None
+    assert parse_relative_time('3 fortnights ago', NOW) is None
+
+
+def test_that_parse_time_falls_back_to_dateparser():
+    expected = datetime.datetime(2024, 1, 5).timestamp()
+    assert parse_time('January 5, 2024', NOW) == expected
+    assert parse_time('not a date at all', NOW) is None
+
+
+def test_that_parse_time_is_cached():
+    _parse_time.cache_clear()
+    parse_time('3 days ago', NOW)
+    parse_time('3 days ago (edited)', NOW + 0.5)
+    assert _parse_time.cache_info().hits == 1
+
+
+def test_that_time_parsed_can_be_disabled():
+    downloader = fake_downloader(FakeYoutube(threads=2, replies=1))
+    comments = list(downloader.get_comments_from_url('https://www.youtube.com/watch?v=fake', sleep=0,
+                                                     time_parsed=False))
+    assert comments and not any('time_parsed' in comment for comment in comments)
@@ -0,0 +1,37 @@
+import json
+
+from youtube_comment_downloader.downloader import (YT_CFG_ANCHOR_RE, YT_CFG_RE, YT_INITIAL_DATA_ANCHOR_RE,
+                                                   YT_INITIAL_DATA_RE, YoutubeCommentParser)
+
+from .fake_youtube import FakeYoutube
+
+YTCFG = {'INNERTUBE_API_KEY': 'key', 'INNERTUBE_CONTEXT': {'client': {'hl': 'en'}}}
+
+
+def make_page(ytcfg, data):
+    return ('<html><script>ytcfg.set("EXPERIMENT_FLAGS", {});ytcfg.set(' + json.dumps(ytcfg) + ');</script>'
+            '<script>var ytInitialData = ' + json.dumps(data) + ';var meta = {};</script></html>')
+
+
+def test_that_the_watch_page_is_parsed():
+    youtube = FakeYoutube()
+    ytcfg, data = YoutubeCommentParser().parse_watch_page(youtube.watch_page(), language='de')
+    assert ytcfg['INNERTUBE_CONTEXT']['client']['hl'] == 'de'
+    assert 'sortFilterSubMenuRenderer' in data['header']
+
+
+def test_that_json_values_are_not_cut_off():
+    # The lazy regular expressions stop at the first '};' or '});' followed by a line break, even inside strings
+    data = {'text': 'if (a) {b = {};\n};</script>', 'items': [{'x': '});'}] * 3}
+    ytcfg = dict(YTCFG, SNIPPET='f({});\n')
+    html = make_page(ytcfg, data)
+    assert YoutubeCommentParser().parse_watch_page(html) == (ytcfg, data)
+
+
+def test_that_the_regular_expressions_are_used_as_fallback():
+    html = 'ytcfg.set({broken); ytcfg.set ( {"a": 1} ) ;'
+    assert YoutubeCommentParser.extract_json(html, YT_CFG_ANCHOR_RE, YT_CFG_RE) == {'a': 1}
+    html = "window['ytInitialData'] = {\"a\": [1, 2]};\n"
+    assert YoutubeCommentParser.extract_json(html, YT_INITIAL_DATA_ANCHOR_RE, YT_INITIAL_DATA_RE) == {'a': [1, 2]}
+    assert YoutubeCommentParser.extract_json('<html></html>', YT_INITIAL_DATA_ANCHOR_RE, YT_INITIAL_DATA_RE) is None
+    assert YoutubeCommentParser().parse_watch_page('<html></html>') == (None, None)
@@ -0,0 +1,80 @@
+import io
+
+import pytest
+
+from youtube_comment_downloader.writer import INDENT, CommentWriter, to_json, write_comments
+
+COMMENTS = [
+    {'cid': 'a', 'text': 'Plain text', 'votes': '0', 'heart': False, 'reply': False, 'time_parsed': 1700000000.5},
+    {'cid': 'a.b', 'text': 'Ünïcödé, "quotes", \\ and\nnew\tlines \x00\x1f\x7f', 'votes': '1.2K', 'heart': True},
+    {'cid': 'c', 'text': 'Line separators and\x85next line', 'paid': '€1.00', 'time_parsed': None},
+    {'cid': 'd', 'text': 'Lone \ud800 surrogate', 'votes': 10 ** 20, 'float': float('nan')},
+    {'cid': 'e', 'nested': {'list': [1, 2], 'tuple': (3,)}},
+    {},
+]
+
+
+def reference(comments, pretty):
+    # The output format as it was before comments were buffered
+    if not pretty:
+        return ''.join(to_json(comment) + '\n' for comment in comments)
+    body = ',\n'.join(to_json(comment, indent=INDENT) for comment in comments)
+    return '{\n' + ' ' * INDENT + '"comments": [\n' + body + ('\n' if comments else '') + ' ' * INDENT + ']\n}'
+
+
+@pytest.mark.parametrize('pretty', [False, True])
+def test_that_output_is_identical_to_to_json(pretty):
+    for comments in [COMMENTS, COMMENTS[:1], []]:
+        fp = io.StringIO()
+        assert write_comments(fp, iter(comments), pretty=pretty) == len(comments)
+        assert fp.getvalue() == reference(comments, pretty)
+
+
+@pytest.mark.parametrize('pretty', [False, True])
+def test_that_appending_produces_the_same_output(pretty):
+    fp = io.StringIO()
+    writer = CommentWriter(fp, pretty=pretty)
+    for comment in COMMENTS[:2]:
+        writer.write(comment)
+    writer.flush()
+    write_comments(fp, iter(COMMENTS[2:]), pretty=pretty, count=writer.count, header=False, limit=4)
+    assert fp.getvalue() == reference(COMMENTS[:4], pretty)
+
+
+def test_that_buffered_comments_are_included_by_tell():
+    fp = io.StringIO()
+    writer = CommentWriter(fp, buffer_size=1000)
+    writer.write(COMMENTS[0])
+    assert fp.getvalue() == ''
+    assert writer.tell() == len(to_json(COMMENTS[0])) + 1
+
+
+def test_that_comments_before_an_error_are_written():
+    def generator():
+        yield COMMENTS[0]
+        raise RuntimeError('failed')
+
+    fp = io.StringIO()
+    with pytest.raises(RuntimeError):
+        write_comments(fp, generator())
+    assert fp.getvalue() == to_json(COMMENTS[0]) + '\n'
+
+
+def test_that_progress_is_throttled(monkeypatch):
+    now = [0]
+    monkeypatch.setattr('time.monotonic', lambda: now[0])
+    counts = []
+
+    def generator():
+        for index in range(10):
+            now[0] += .25
+            yield {'cid': str(index)}
+
+    write_comments(io.StringIO(), generator(), callback=counts.append, interval=1)
+    assert counts == [4, 8, 10]
+
+
+@pytest.mark.parametrize('pretty', [False, True])
+def test_benchmark_writer(benchmark, pretty):
+    comments = [dict(COMMENTS[0], cid=str(index), text='Comment number %d ' % index * 10) for index in range(10000)]
+    benchmark(lambda: write_comments(io.StringIO(), iter(comments), pretty=pretty))
@@ -1,21 +1,34 @@
 import argparse
 import io
-import json
+import itertools
 import os
 import sys
 import time
 
-from .downloader import YoutubeCommentDownloader, SORT_BY_POPULAR, SORT_BY_RECENT
-
-INDENT = 4
-
-
-def to_json(comment, indent=None):
-    comment_str = json.dumps(comment, ensure_ascii=False, indent=indent)
-    if indent is None:
-        return comment_str
-    padding = ' ' * (2 * indent) if indent else ''
-    return ''.join(padding + line for line in comment_str.splitlines(True))
+from .batch import BatchDownloader, download_batch, read_youtube_ids
+from .cache import BootstrapCache
+from .checkpoint import Checkpoint
+from .columnar import ColumnarWriter, write_columnar
+from .comment import Comment, parse_count
+from .database import CommentDatabase
+from .downloader import (RequestError, YoutubeCommentDownloader, YoutubeCommentParser, SORT_BY_POPULAR,
+                         SORT_BY_RECENT, YOUTUBE_VIDEO_URL, get_youtube_id)
+from .incremental import load_known_comments, save_index, track_comments
+from .ratelimit import RateLimiter
+from .reader import iter_comments, read_comments
+from .replay import RecordingSession, ReplaySession, record_comments
+from .retry import RetryPolicy
+from .scheduler import BREADTH_FIRST, DEPTH_FIRST, ContinuationScheduler
+from .stats import Hooks, StatsCollector
+from .writer import INDENT, CommentWriter, to_json, write_comments
+
+
+def __getattr__(name):
+    # The async downloader is only imported when it is used, since importing asyncio slows down the startup of the CLI
+    if name == 'AsyncYoutubeCommentDownloader':
+        from .async_downloader import AsyncYoutubeCommentDownloader
+        return AsyncYoutubeCommentDownloader
+    raise AttributeError('module %r has no attribute %r' % (__name__, name))
 
 
 def main(argv = None):
@@ -23,13 +36,31 @@ def main(argv = None):
     parser.add_argument('--help', '-h', action='help', default=argparse.SUPPRESS, help='Show this help message and exit')
     parser.add_argument('--youtubeid', '-y', help='ID of Youtube video for which to download the comments')
     parser.add_argument('--url', '-u', help='Youtube URL for which to download the comments')
-    parser.add_argument('--output', '-o', help='Output filename (output format is line delimited JSON)')
+    parser.add_argument('--batch', '-b', help='File with one Youtube ID per line for which to download the comments')
+    parser.add_argument('--output', '-o', help='Output filename (output format is line delimited JSON), or output directory when using --batch')
+    parser.add_argument('--output-db', help='SQLite database to which the comments are added (instead of or in addition to --output)')
     parser.add_argument('--pretty', '-p', action='store_true', help='Change the output format to indented JSON')
+    parser.add_argument('--format', '-f', choices=['json', 'parquet', 'arrow'], default='json',
+                        help='Output format: JSON (see --pretty), Parquet or Arrow IPC. The latter two require pyarrow. Defaults to json')
     parser.add_argument('--limit', '-l', type=int, help='Limit the number of comments')
     parser.add_argument('--language', '-a', type=str, default=None, help='Language for Youtube generated text (e.g. en)')
     parser.add_argument('--sort', '-s', type=int, default=SORT_BY_RECENT,
                         help='Whether to download popular (0) or recent comments (1). Defaults to 1')
-
+    parser.add_argument('--workers', '-w', type=int, default=4, help='Number of videos to download at once when using --batch. Defaults to 4')
+    parser.add_argument('--concurrency', '-c', type=int, default=1, help='Number of comment pages (e.g. reply threads) to fetch at once for a single video. Defaults to 1')
+    parser.add_argument('--order', choices=[DEPTH_FIRST, BREADTH_FIRST], default=DEPTH_FIRST, help='Whether to download the replies of every thread before the next page of threads (depth-first), or the threads first (breadth-first). Defaults to depth-first')
+    parser.add_argument('--max-pending', type=int, default=1000, help='Maximum number of reply threads that are queued when using --order breadth-first. Defaults to 1000')
+    parser.add_argument('--rate', '-r', type=float, default=None, help='Maximum number of requests per second per host. The rate is lowered automatically when Youtube starts throttling')
+    parser.add_argument('--checkpoint', action='store_true', help='Keep track of the progress in <output>.checkpoint, so that a failed download can be resumed')
+    parser.add_argument('--resume', action='store_true', help='Resume a failed download from <output>.checkpoint and append to the output')
+    parser.add_argument('--incremental', '-i', help='Earlier output or index file. Only new comments (or comments with new replies) are downloaded, and an updated index is written to <output>.index')
+    parser.add_argument('--cache', help='Directory in which the configuration from the watch page and the consent cookies are cached, so that revisiting a video skips loading the watch page')
+    parser.add_argument('--cache-ttl', type=float, default=3600, help='Number of seconds for which cached watch page configurations are used. Defaults to 3600')
+    parser.add_argument('--stats', help='Write a JSON summary of the requests, retries and time spent per stage to this file')
+    parser.add_argument('--prometheus', help='Write the same statistics as Prometheus counters (text format) to this file')
+    parser.add_argument('--no-time-parsed', dest='time_parsed', action='store_false', help='Do not add the parsed timestamp (time_parsed) to the comments')
+
+    stats = None
     try:
         args = parser.parse_args() if argv is None else parser.parse_args(argv)
 
@@ -39,46 +70,127 @@ def main(argv = None):
         limit = args.limit
         pretty = args.pretty
 
-        if (not youtube_id and not youtube_url) or not output:
+        if (not youtube_id and not youtube_url and not args.batch) or not (output or args.output_db):
             parser.print_usage()
-            raise ValueError('you need to specify a Youtube ID/URL and an output filename')
+            raise ValueError('you need to specify a Youtube ID/URL/batch file and an output filename or database')
+
+        if args.batch and (args.checkpoint or args.resume or args.incremental):
+            raise ValueError('--checkpoint, --resume and --incremental cannot be used with --batch')
+
+        if not output and (args.checkpoint or args.resume or args.incremental):
+            raise ValueError('--checkpoint, --resume and --incremental can only be used with --output')
 
-        if os.sep in output:
+        if args.format != 'json' and (pretty or args.checkpoint or args.resume):
+            raise ValueError('--pretty, --checkpoint and --resume can only be used with --format json')
+
+        stats = StatsCollector() if args.stats or args.prometheus else None
+        if args.batch:
+            return download_batch_main(args, stats)
+
+        if output and os.sep in output:
             outdir = os.path.dirname(output)
             if not os.path.exists(outdir):
                 os.makedirs(outdir)
 
-        print('Downloading Youtube comments for', youtube_id or youtube_url)
-        downloader = YoutubeCommentDownloader()
-        generator = (
-            downloader.get_comments(youtube_id, args.sort, args.language)
-            if youtube_id
-            else downloader.get_comments_from_url(youtube_url, args.sort, args.language)
-        )
-
-        count = 1
-        with io.open(output, 'w', encoding='utf8') as fp:
+        youtube_url = youtube_url or YOUTUBE_VIDEO_URL.format(youtube_id=youtube_id)
+        checkpoint = None
+        if args.resume:
+            checkpoint_file = output + '.checkpoint'
+            checkpoint = Checkpoint.load(checkpoint_file)
+            if checkpoint.info != {'url': youtube_url, 'pretty': pretty}:
+                raise ValueError('the checkpoint in %s belongs to a different download' % checkpoint_file)
+            print('Resuming download of Youtube comments for', youtube_id or youtube_url)
+        else:
+            if args.checkpoint:
+                checkpoint = Checkpoint(output + '.checkpoint', url=youtube_url, pretty=pretty)
+            print('Downloading Youtube comments for', youtube_id or youtube_url)
+
+        known = load_known_comments(args.incremental) if args.incremental else None
+
+        downloader = YoutubeCommentDownloader(rate_limiter=RateLimiter(args.rate, adaptive=True) if args.rate else None,
+                                              cache=BootstrapCache(args.cache, args.cache_ttl) if args.cache else None,
+                                              hooks=stats)
+        generator = downloader.get_comments_from_url(youtube_url, args.sort, args.language, concurrency=args.concurrency,
+                                                     time_parsed=args.time_parsed, checkpoint=checkpoint, known=known,
+                                                     order=args.order, max_pending=args.max_pending)
+        if known is not None:
+            index = dict(known)
+            generator = track_comments(generator, index)
+        database = CommentDatabase(args.output_db) if args.output_db else None
+        if database:
+            generator = database.track_comments(generator, youtube_id or get_youtube_id(youtube_url))
+
+        def progress(count):
             sys.stdout.write('Downloaded %d comment(s)\r' % count)
             sys.stdout.flush()
-            start_time = time.time()
-
-            if pretty:
-                fp.write('{\n' + ' ' * INDENT + '"comments": [\n')
-
-            comment = next(generator, None)
-            while comment:
-                comment_str = to_json(comment, indent=INDENT if pretty else None)
-                comment = None if limit and count >= limit else next(generator, None)  # Note that this is the next comment
-                comment_str = comment_str + ',' if pretty and comment is not None else comment_str
-                print(comment_str.decode('utf-8') if isinstance(comment_str, bytes) else comment_str, file=fp)
-                sys.stdout.write('Downloaded %d comment(s)\r' % count)
-                sys.stdout.flush()
-                count += 1
-
-            if pretty:
-                fp.write(' ' * INDENT +']\n}')
+
+        start_time = time.time()
+        if not output:
+            count = 0
+            for count, _ in enumerate(itertools.islice(generator, limit), 1):
+                if count % 1000 == 0:
+                    progress(count)
+            progress(count)
+        elif args.format != 'json':
+            progress(0)
+            write_columnar(output, generator, args.format, limit=limit, callback=progress)
+        else:
+            with io.open(output, 'r+' if args.resume else 'w', encoding='utf8') as fp:
+                count = 0
+                if args.resume:
+                    # Drop everything that was written after the last checkpoint
+                    fp.seek(checkpoint.offset)
+                    fp.truncate()
+                    count = checkpoint.count
+
+                progress(count)
+                write_comments(fp, generator, pretty=pretty, limit=limit, callback=progress, count=count,
+                               header=not args.resume, checkpoint=checkpoint)
+        if database:
+            database.close()
+        if checkpoint:
+            checkpoint.remove()
+        if known is not None:
+            save_index(output + '.index', index)
         print('\n[{:.2f} seconds] Done!'.format(time.time() - start_time))
 
     except Exception as e:
         print('Error:', str(e))
         sys.exit(1)
+    finally:
+        # Statistics are written for failed downloads as well
+        if stats:
+            if args.stats:
+                stats.write_summary(args.stats)
+            if args.prometheus:
+                stats.write_prometheus(args.prometheus)
+
+
+def download_batch_main(args, stats=None):
+    youtube_ids = read_youtube_ids(args.batch)
+    print('Downloading Youtube comments for %d video(s) using %d worker(s)' % (len(youtube_ids), args.workers))
+    start_time = time.time()
+
+    def progress(youtube_id, result):
+        if isinstance(result, Exception):
+            print('Failed to download comments for %s: %s' % (youtube_id, result))
+        else:
+            print('Downloaded %d comment(s) for %s' % (result, youtube_id))
+
+    batch = BatchDownloader(workers=args.workers, rate=args.rate,
+                            cache=BootstrapCache(args.cache, args.cache_ttl) if args.cache else None, hooks=stats)
+    database = CommentDatabase(args.output_db) if args.output_db else None
+    try:
+        results = batch.download_all(youtube_ids, args.output, pretty=args.pretty, limit=args.limit, callback=progress,
+                                     format=args.format, database=database, sort_by=args.sort,
+                                     language=args.language, concurrency=args.concurrency,
+                                     time_parsed=args.time_parsed, order=args.order,
+                                     max_pending=args.max_pending)
+    finally:
+        if database:
+            database.close()
+    failed = [youtube_id for youtube_id, result in results.items() if isinstance(result, Exception)]
+    print('[{:.2f} seconds] Done! {} of {} video(s) downloaded'.format(
+        time.time() - start_time, len(results) - len(failed), len(results)))
+    if failed:
+        sys.exit(1)
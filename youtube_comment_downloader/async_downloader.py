@@ -0,0 +1,197 @@
+import asyncio
+import itertools
+import time
+from urllib.parse import urlparse
+
+from .comment import Comment
+from .downloader import (PACER_HOST, YoutubeCommentParser, SORT_BY_RECENT, USER_AGENT, YOUTUBE_CONSENT_URL,
+                         YOUTUBE_VIDEO_URL)
+from .ratelimit import RateLimiter
+from .retry import RetryPolicy
+from .scheduler import DEPTH_FIRST, ContinuationScheduler
+from .stats import get_response_size
+
+
+class AsyncYoutubeCommentDownloader(YoutubeCommentParser):
+    """
+    Asyncio version of YoutubeCommentDownloader. Requests are made through a single httpx.AsyncClient, so that
+    connections are pooled between all videos that are downloaded at the same time. Requires httpx.
+    """
+
+    def __init__(self, rate_limiter=None, client=None, max_connections=100, retry_policy=None, cache=None,
+                 hooks=None):
+        import httpx
+        self.client = client or httpx.AsyncClient(limits=httpx.Limits(max_connections=max_connections),
+                                                  follow_redirects=True)
+        self.client.headers['User-Agent'] = USER_AGENT
+        self.client.cookies.set('CONSENT', 'YES+cb', domain='.youtube.com')
+        self.rate_limiter = rate_limiter
+        self.retry_policy = retry_policy or RetryPolicy()
+        self.cache = cache
+        self.hooks = hooks
+        if cache:
+            cache.load_cookies(self.client.cookies.jar)
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *args):
+        await self.close()
+
+    async def close(self):
+        await self.client.aclose()
+
+    async def request(self, method, url, **kwargs):
+        if self.rate_limiter:
+            delay = self.rate_limiter.reserve(urlparse(url).netloc)
+            if delay > 0:
+                await asyncio.sleep(delay)
+        if not self.hooks:
+            return await self.client.request(method, url, **kwargs)
+
+        start = time.perf_counter()
+        try:
+            response = await self.client.request(method, url, **kwargs)
+        except Exception:
+            self.hooks.on_request(method, url, None, time.perf_counter() - start, None)
+            raise
+        self.hooks.on_request(method, url, response.status_code, time.perf_counter() - start,
+                              get_response_size(response))
+        return response
+
+    async def ajax_request(self, endpoint, ytcfg, timeout=60):
+        import httpx
+        url, params, data = self.build_ajax_request(endpoint, ytcfg)
+
+        for attempt in itertools.count():
+            try:
+                response = await self.request('POST', url, params=params, json=data, timeout=timeout)
+            except (httpx.TimeoutException, httpx.NetworkError):
+                response = None
+            if response is not None and response.status_code == 200:
+                if self.rate_limiter:
+                    self.rate_limiter.success(urlparse(url).netloc)
+                if not self.hooks:
+                    return response.json()
+                start = time.perf_counter()
+                data = response.json()
+                self.hooks.on_decode(time.perf_counter() - start)
+                return data
+            await asyncio.sleep(self.get_retry_delay(attempt, url, response))
+
+    async def paced_ajax_request(self, endpoint, ytcfg, timeout=60, pacer=None):
+        if pacer:
+            delay = pacer.reserve(PACER_HOST)
+            if delay > 0:
+                await asyncio.sleep(delay)
+        return await self.ajax_request(endpoint, ytcfg, timeout=timeout)
+
+    def get_comments(self, youtube_id, *args, **kwargs):
+        return self.get_comments_from_url(YOUTUBE_VIDEO_URL.format(youtube_id=youtube_id), *args, **kwargs)
+
+    async def get_comments_from_url(self, youtube_url, sort_by=SORT_BY_RECENT, language=None, sleep=None,
+                                    concurrency=1, time_parsed=True, checkpoint=None, known=None, records=False,
+                                    order=DEPTH_FIRST, max_pending=1000, timeout=60):
+        """
+        Yields the comments of a Youtube video, in the same order as YoutubeCommentDownloader does. The timeout
+        applies to every individual request. As with YoutubeCommentDownloader, `sleep` defaults to 0.1 seconds
+        between pages, or none at all if a rate limiter is used. Cancelling the task that iterates over the comments
+        stops the download. With concurrency > 1, up to that many pending continuations are fetched ahead of time
+        in background tasks, and requests are started at least `sleep` seconds apart. The arguments are the same as
+        for YoutubeCommentDownloader (in the same order), plus the timeout at the end. A BootstrapCache is used in
+        the same way as well.
+        """
+        cached = None
+        if checkpoint and checkpoint.continuations is not None:
+            ytcfg = checkpoint.ytcfg
+            continuations = ContinuationScheduler.from_state(checkpoint.continuations, max_pending)
+        else:
+            cached = self.cache.get(youtube_url, sort_by, language) if self.cache else None
+            ytcfg, endpoint = cached or await self.bootstrap(youtube_url, sort_by, language, timeout)
+            if not endpoint:
+                return
+            continuations = ContinuationScheduler([endpoint], order, max_pending)
+
+        if sleep is None:
+            sleep = 0 if self.rate_limiter else .1
+
+        prefetched = {}
+        count = checkpoint.count if checkpoint else 0
+        pacer = RateLimiter(1.0 / sleep) if concurrency > 1 and sleep else None
+        yielded = False
+        try:
+            while continuations:
+                if checkpoint:
+                    # All comments we have yielded so far have been consumed
+                    checkpoint.update(ytcfg, continuations.get_state(), count)
+
+                continuation = continuations.pop()
+                task = prefetched.pop(id(continuation), None)
+                if task:
+                    response = await task
+                else:
+                    response = await self.paced_ajax_request(continuation, ytcfg, timeout, pacer)
+
+                if not response:
+                    break
+
+                comments = self.process_page(response, continuations, time_parsed, known)
+                if concurrency > 1:
+                    for pending in self.get_prefetch_candidates(continuations, prefetched, concurrency):
+                        prefetched[id(pending)] = asyncio.ensure_future(
+                            self.paced_ajax_request(pending, ytcfg, timeout, pacer))
+
+                for comment in comments:
+                    yielded = True
+                    count += 1
+                    yield Comment.from_dict(comment, language) if records else comment
+                if concurrency == 1 and sleep:
+                    await asyncio.sleep(sleep)
+        except RuntimeError as e:
+            if not cached or yielded or not self.is_rejection(e):
+                raise
+            # The cached continuation was rejected, so load the watch page after all
+            self.cache.invalidate(youtube_url, sort_by, language)
+            if checkpoint:
+                checkpoint.continuations = None
+            async for comment in self.get_comments_from_url(youtube_url, sort_by, language, sleep, concurrency,
+                                                            time_parsed, checkpoint, known, records, order,
+                                                            max_pending, timeout):
+                yield comment
+        finally:
+            for task in prefetched.values():
+                task.cancel()
+
+    async def bootstrap(self, youtube_url, sort_by=SORT_BY_RECENT, language=None, timeout=60):
+        """
+        Loads the watch page and returns the InnerTube configuration, together with the endpoint for the first page
+        of comments. The endpoint is None if the video has no comments.
+        """
+        response = await self.request('GET', youtube_url, timeout=timeout)
+
+        if 'consent' in str(response.url):
+            # We may get redirected to a separate page for cookie consent. If this happens we agree automatically.
+            params = self.get_consent_params(response.text, youtube_url)
+            response = await self.request('POST', YOUTUBE_CONSENT_URL, params=params, timeout=timeout)
+
+        ytcfg, data = self.parse_watch_page(response.text, language)
+        if not ytcfg:
+            return None, None  # Unable to extract configuration
+
+        if not self.has_comments(data):
+            # Comments disabled?
+            return ytcfg, None
+
+        sort_menu = self.get_sort_menu(data)
+        if not sort_menu:
+            # No sort menu. Maybe this is a request for community posts?
+            endpoint = self.get_section_endpoint(data)
+            # Retry..
+            data = await self.ajax_request(endpoint, ytcfg, timeout=timeout) if endpoint else {}
+            sort_menu = self.get_sort_menu(data)
+        endpoint = self.get_sort_endpoint(sort_menu, sort_by)
+
+        if self.cache:
+            self.cache.put(youtube_url, sort_by, language, ytcfg, endpoint)
+            self.cache.save_cookies(self.client.cookies.jar)
+        return ytcfg, endpoint
@@ -0,0 +1,84 @@
+import io
+import itertools
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from .columnar import write_columnar
+from .downloader import YoutubeCommentDownloader
+from .ratelimit import RateLimiter
+from .writer import write_comments
+
+
+def read_youtube_ids(filename):
+    with io.open(filename, 'r', encoding='utf8') as fp:
+        return [line.strip() for line in fp if line.strip()]
+
+
+class BatchDownloader:
+    """
+    Downloads the comments for many videos at once using a pool of worker threads. Every worker keeps its own
+    YoutubeCommentDownloader (and thus its own session), while the rate limiter is shared by all of them. The rate
+    limiter is adaptive, so if Youtube starts throttling one worker, all workers slow down. The optional
+    BootstrapCache and instrumentation hooks are shared as well.
+    """
+
+    def __init__(self, workers=4, rate=None, downloader_factory=YoutubeCommentDownloader, cache=None, hooks=None):
+        self.workers = workers
+        self.rate_limiter = RateLimiter(rate, adaptive=True) if rate else None
+        self.downloader_factory = downloader_factory
+        self.cache = cache
+        self.hooks = hooks
+        self.local = threading.local()
+
+    def get_downloader(self):
+        if not hasattr(self.local, 'downloader'):
+            kwargs = {name: value for name, value in (('cache', self.cache), ('hooks', self.hooks)) if value}
+            self.local.downloader = self.downloader_factory(rate_limiter=self.rate_limiter, **kwargs)
+        return self.local.downloader
+
+    def download(self, youtube_id, output, pretty=False, limit=None, format='json', database=None, **kwargs):
+        generator = self.get_downloader().get_comments(youtube_id, **kwargs)
+        if database:
+            generator = database.track_comments(generator, youtube_id)
+        if not output:
+            return sum(1 for _ in itertools.islice(generator, limit))
+        if format != 'json':
+            return write_columnar(output, generator, format, limit=limit)
+        with io.open(output, 'w', encoding='utf8') as fp:
+            return write_comments(fp, generator, pretty=pretty, limit=limit)
+
+    def download_all(self, youtube_ids, output_dir, pretty=False, limit=None, callback=None, format='json',
+                     database=None, **kwargs):
+        """
+        Download the comments for every Youtube ID to <output_dir>/<youtube_id>.json (or .parquet/.arrow, depending
+        on the format) and/or the given CommentDatabase. Returns a dictionary
+        that maps each Youtube ID to either the number of comments written or the exception that was raised.
+        The optional callback is called with the Youtube ID and its result as soon as a video is done. Any other
+        keyword arguments (e.g. sort_by or language) are passed on to YoutubeCommentDownloader.get_comments.
+        """
+        if output_dir and not os.path.exists(output_dir):
+            os.makedirs(output_dir)
+
+        results = {}
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            futures = {executor.submit(self.download, youtube_id,
+                                       os.path.join(output_dir, youtube_id + '.' + format) if output_dir else None,
+                                       pretty, limit, format, database, **kwargs): youtube_id
+                       for youtube_id in dict.fromkeys(youtube_ids)}
+            for future in as_completed(futures):
+                youtube_id = futures[future]
+                try:
+                    results[youtube_id] = future.result()
+                except Exception as e:
+                    results[youtube_id] = e
+                if callback:
+                    callback(youtube_id, results[youtube_id])
+        return results
+
+
+def download_batch(youtube_ids, output_dir, pretty=False, limit=None, workers=4, rate=None, callback=None,
+                   format='json', database=None, cache=None, hooks=None, **kwargs):
+    batch = BatchDownloader(workers=workers, rate=rate, cache=cache, hooks=hooks)
+    return batch.download_all(youtube_ids, output_dir, pretty=pretty, limit=limit, callback=callback, format=format,
+                              database=database, **kwargs)
@@ -0,0 +1,86 @@
+import hashlib
+import io
+import json
+import os
+import threading
+import time
+
+from .downloader import get_youtube_id
+
+COOKIES_FILENAME = 'cookies.txt'
+
+
+class BootstrapCache:
+    """
+    Caches what the downloaders get from the watch page, so that it does not have to be downloaded again when the same
+    video is visited within `ttl` seconds. Entries are keyed by video ID, sort order and language, and store the
+    InnerTube API key and context together with the continuation for the first page of comments. The downloaders
+    invalidate an entry when Youtube rejects its continuation.
+
+    The session cookies (e.g. the ones set by the consent page) are kept in the same directory, so that they
+    persist across runs. A single instance can be shared between threads.
+    """
+
+    def __init__(self, directory, ttl=3600):
+        self.directory = directory
+        self.ttl = ttl
+        self.lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+
+    def get_filename(self, youtube_url, sort_by, language):
+        key = json.dumps([get_youtube_id(youtube_url), sort_by, language])
+        return os.path.join(self.directory, hashlib.sha1(key.encode('utf8')).hexdigest() + '.json')
+
+    def get(self, youtube_url, sort_by, language):
+        """
+        Returns the cached (ytcfg, endpoint) for a video, or None if there is no entry or it has expired.
+        """
+        filename = self.get_filename(youtube_url, sort_by, language)
+        try:
+            with io.open(filename, 'r', encoding='utf8') as fp:
+                entry = json.load(fp)
+        except (OSError, ValueError):
+            return None
+        if time.time() - entry['time'] > self.ttl:
+            return None
+        return entry['ytcfg'], entry['endpoint']
+
+    def put(self, youtube_url, sort_by, language, ytcfg, endpoint):
+        # Only the parts of ytcfg that are needed for InnerTube requests are kept
+        entry = {'time': time.time(),
+                 'ytcfg': {key: ytcfg[key] for key in ('INNERTUBE_API_KEY', 'INNERTUBE_CONTEXT')},
+                 'endpoint': endpoint}
+        filename = self.get_filename(youtube_url, sort_by, language)
+        tmp_filename = '%s.%d.tmp' % (filename, threading.get_ident())
+        with io.open(tmp_filename, 'w', encoding='utf8') as fp:
+            json.dump(entry, fp, ensure_ascii=False)
+        os.replace(tmp_filename, filename)
+
+    def invalidate(self, youtube_url, sort_by, language):
+        try:
+            os.remove(self.get_filename(youtube_url, sort_by, language))
+        except OSError:
+            pass
+
+    def load_cookies(self, jar):
+        """
+        Adds the cookies saved by save_cookies to a cookie jar (e.g. the cookies of a requests.Session or an
+        httpx.Client).
+        """
+        from http.cookiejar import LWPCookieJar
+        saved = LWPCookieJar(os.path.join(self.directory, COOKIES_FILENAME))
+        with self.lock:
+            try:
+                saved.load(ignore_discard=True)
+            except (OSError, ValueError):
+                return
+        for cookie in saved:
+            jar.set_cookie(cookie)
+
+    def save_cookies(self, jar):
+        from http.cookiejar import LWPCookieJar
+        saved = LWPCookieJar(os.path.join(self.directory, COOKIES_FILENAME))
+        for cookie in jar:
+            saved.set_cookie(cookie)
+        with self.lock:
+            saved.save(ignore_discard=True)
@@ -0,0 +1,59 @@
+import io
+import json
+import os
+
+
+class Checkpoint:
+    """
+    Keeps track of how far a download has progressed, so that it can be resumed after a failure. The downloader
+    calls update() every time it is about to fetch the next page, at which point all comments of the earlier pages
+    have been written to `fp`. The checkpoint then records the InnerTube configuration, the pending continuations,
+    the number of comments written and the position in the output file.
+    """
+
+    def __init__(self, filename, fp=None, **info):
+        self.filename = filename
+        self.fp = fp
+        self.info = info
+        self.ytcfg = None
+        self.continuations = None
+        self.count = 0
+        self.offset = None
+
+    @classmethod
+    def load(cls, filename):
+        if not os.path.exists(filename):
+            raise ValueError('no checkpoint found at ' + filename)
+        with io.open(filename, 'r', encoding='utf8') as fp:
+            data = json.load(fp)
+        checkpoint = cls(filename, **data['info'])
+        checkpoint.ytcfg = data['ytcfg']
+        checkpoint.continuations = data['continuations']
+        checkpoint.count = data['count']
+        checkpoint.offset = data['offset']
+        return checkpoint
+
+    def update(self, ytcfg, continuations, count):
+        self.ytcfg = ytcfg
+        self.continuations = continuations
+        self.count = count
+        if self.fp:
+            self.fp.flush()
+            self.offset = self.fp.tell()
+        self.save()
+
+    def save(self):
+        data = {'info': self.info,
+                'ytcfg': self.ytcfg,
+                'continuations': self.continuations,
+                'count': self.count,
+                'offset': self.offset}
+        # Write to a temporary file first, so a crash never leaves a half written checkpoint behind
+        tmp_filename = self.filename + '.tmp'
+        with io.open(tmp_filename, 'w', encoding='utf8') as fp:
+            json.dump(data, fp, ensure_ascii=False)
+        os.replace(tmp_filename, self.filename)
+
+    def remove(self):
+        if os.path.exists(self.filename):
+            os.remove(self.filename)
@@ -0,0 +1,112 @@
+import time
+
+from .comment import as_dict, parse_count
+
+FORMATS = ('parquet', 'arrow')
+
+
+def get_schema():
+    import pyarrow as pa
+    return pa.schema([('cid', pa.string()),
+                      ('parent', pa.string()),
+                      ('text', pa.string()),
+                      ('time', pa.string()),
+                      ('time_parsed', pa.float64()),
+                      ('author', pa.string()),
+                      ('channel', pa.string()),
+                      ('votes', pa.int64()),
+                      ('replies', pa.int64()),
+                      ('photo', pa.string()),
+                      ('heart', pa.bool_()),
+                      ('reply', pa.bool_()),
+                      ('paid', pa.bool_()),
+                      ('paid_amount', pa.string())])
+
+
+def to_row(comment):
+    comment = as_dict(comment)
+    cid = comment['cid']
+    return {'cid': cid,
+            'parent': cid.split('.', 1)[0] if '.' in cid else None,
+            'text': comment['text'],
+            'time': comment['time'],
+            'time_parsed': comment.get('time_parsed'),
+            'author': comment['author'],
+            'channel': comment['channel'],
+            'votes': parse_count(comment['votes']),
+            'replies': parse_count(comment['replies']),
+            'photo': comment['photo'],
+            'heart': comment['heart'],
+            'reply': comment['reply'],
+            'paid': 'paid' in comment,
+            'paid_amount': comment.get('paid')}
+
+
+class ColumnarWriter:
+    """
+    Writes comments to a Parquet or Arrow IPC file with typed columns: counts are integers, time_parsed is a float and
+    the parent comment ID is derived from the comment ID. Comments are collected per column and written every
+    `row_group_size` comments, so memory usage does not grow with the number of comments. Requires pyarrow.
+    """
+
+    def __init__(self, filename, format='parquet', row_group_size=10000, compression='zstd'):
+        import pyarrow as pa
+
+        if format not in FORMATS:
+            raise ValueError('unknown format %s' % format)
+        self.schema = get_schema()
+        self.row_group_size = row_group_size
+        self.columns = {name: [] for name in self.schema.names}
+        self.count = 0
+
+        if format == 'parquet':
+            import pyarrow.parquet as pq
+            self.sink = None
+            self.writer = pq.ParquetWriter(filename, self.schema, compression=compression)
+        else:
+            self.sink = pa.OSFile(filename, 'wb')
+            options = pa.ipc.IpcWriteOptions(compression=compression)
+            self.writer = pa.ipc.new_file(self.sink, self.schema, options=options)
+
+    def write(self, comment):
+        for name, value in to_row(comment).items():
+            self.columns[name].append(value)
+        self.count += 1
+        if len(self.columns['cid']) >= self.row_group_size:
+            self.write_batch()
+
+    def write_batch(self):
+        import pyarrow as pa
+
+        if self.columns['cid']:
+            self.writer.write_batch(pa.RecordBatch.from_pydict(self.columns, schema=self.schema))
+            self.columns = {name: [] for name in self.schema.names}
+
+    def close(self):
+        self.write_batch()
+        self.writer.close()
+        if self.sink:
+            self.sink.close()
+
+
+def write_columnar(filename, generator, format='parquet', limit=None, callback=None, interval=.2, **kwargs):
+    """
+    Write the comments produced by `generator` to a Parquet or Arrow IPC file (see ColumnarWriter). The optional
+    callback is called with the number of comments written so far, at most once every `interval` seconds. Returns that
+    number. If the generator raises an exception, the comments up to that point are still written.
+    """
+    writer = ColumnarWriter(filename, format, **kwargs)
+    last_callback = time.monotonic()
+    try:
+        for comment in generator:
+            writer.write(comment)
+            if callback and time.monotonic() - last_callback >= interval:
+                last_callback = time.monotonic()
+                callback(writer.count)
+            if limit and writer.count >= limit:
+                break
+    finally:
+        writer.close()
+    if callback:
+        callback(writer.count)
+    return writer.count
@@ -0,0 +1,133 @@
+import re
+
+# Abbreviations Youtube uses for large counts (compared in lower case)
+COUNT_MULTIPLIERS = {
+    'k': 10 ** 3, 'm': 10 ** 6, 'b': 10 ** 9,
+    # German, French, Spanish, Portuguese, Italian, Dutch, Polish, Russian, Ukrainian
+    'tsd.': 10 ** 3, 'mio.': 10 ** 6, 'mrd.': 10 ** 9, 'md': 10 ** 9, 'mil': 10 ** 3, 'mi': 10 ** 6,
+    'bi': 10 ** 9, 'mln': 10 ** 6, 'mln.': 10 ** 6, 'mld': 10 ** 9, 'mld.': 10 ** 9, 'mrd': 10 ** 9,
+    'tys.': 10 ** 3, 'тыс.': 10 ** 3, 'млн': 10 ** 6, 'млрд': 10 ** 9, 'тис.': 10 ** 3,
+    # Japanese, Chinese, Korean
+    '千': 10 ** 3, '万': 10 ** 4, '萬': 10 ** 4, '億': 10 ** 8, '亿': 10 ** 8, '천': 10 ** 3, '만': 10 ** 4,
+    '억': 10 ** 8,
+    # Hindi
+    'हज़ार': 10 ** 3, 'लाख': 10 ** 5, 'क॰': 10 ** 7, 'करोड़': 10 ** 7,
+}
+
+# Languages in which an abbreviation means something else than in COUNT_MULTIPLIERS
+LANGUAGE_COUNT_MULTIPLIERS = {
+    'tr': {'b': 10 ** 3, 'mn': 10 ** 6, 'mr': 10 ** 9},
+    'id': {'rb': 10 ** 3, 'jt': 10 ** 6, 'm': 10 ** 9},
+    'vi': {'n': 10 ** 3, 'tr': 10 ** 6, 't': 10 ** 9},
+}
+
+COUNT_RE = re.compile(r'^([0-9.,\s\']*[0-9])\s*(\S*)$')
+
+
+def parse_count(text, language=None):
+    """
+    Converts a vote or reply count as shown by Youtube (e.g. '', '15', '1,234', '1.2K', '3M', '1,5 Tsd.' or '1.2万')
+    into a number. The language Youtube used (e.g. 'tr') is only needed for abbreviations that differ between
+    languages. Returns None if the text cannot be parsed.
+    """
+    if isinstance(text, int):
+        return text
+    text = text.strip()
+    if not text:
+        return 0
+    match = COUNT_RE.match(text)
+    if not match:
+        return None
+    number, suffix = match.groups()
+    number = re.sub(r'[\s\']', '', number)
+    suffix = suffix.lower()
+    multipliers = LANGUAGE_COUNT_MULTIPLIERS.get((language or '').split('-')[0].lower(), {})
+    multiplier = multipliers.get(suffix) or COUNT_MULTIPLIERS.get(suffix, 1 if not suffix else None)
+    if multiplier is None:
+        return None
+    if multiplier > 1:
+        # Abbreviated counts have at most a decimal separator
+        number = number.replace(',', '.')
+    else:
+        # Without a suffix, separators can only be thousands separators
+        number = number.replace(',', '').replace('.', '')
+    try:
+        return int(round(float(number) * multiplier))
+    except ValueError:
+        return None
+
+
+def as_dict(comment):
+    """
+    Returns a downloaded comment as a dictionary, converting Comment objects with to_dict(). The writers and the
+    database accept both.
+    """
+    return comment.to_dict() if isinstance(comment, Comment) else comment
+
+
+class Comment:
+    """
+    A comment with the same fields as the dictionaries yielded by the downloaders, but stored in slots and with
+    votes and replies as integers. time_parsed and paid are None for comments that do not have them. Use
+    Comment.from_dict() to convert a downloaded comment, and to_dict() to convert it back.
+    """
+
+    __slots__ = ('cid', 'text', 'time', 'author', 'channel', 'votes', 'replies', 'photo', 'heart', 'reply',
+                 'time_parsed', 'paid')
+
+    def __init__(self, cid, text, time, author, channel, votes, replies, photo, heart, reply, time_parsed=None,
+                 paid=None):
+        self.cid = cid
+        self.text = text
+        self.time = time
+        self.author = author
+        self.channel = channel
+        self.votes = votes
+        self.replies = replies
+        self.photo = photo
+        self.heart = heart
+        self.reply = reply
+        self.time_parsed = time_parsed
+        self.paid = paid
+
+    @classmethod
+    def from_dict(cls, comment, language=None):
+        # Counts that cannot be parsed are stored as 0, so that votes and replies can always be compared
+        return cls(comment['cid'], comment['text'], comment['time'], comment['author'], comment['channel'],
+                   parse_count(comment['votes'], language) or 0, parse_count(comment['replies'], language) or 0,
+                   comment['photo'], comment['heart'], comment['reply'], comment.get('time_parsed'),
+                   comment.get('paid'))
+
+    def to_dict(self):
+        """
+        Returns the comment as a dictionary with the same keys as the downloaded comments (votes and replies stay
+        integers).
+        """
+        comment = {'cid': self.cid,
+                   'text': self.text,
+                   'time': self.time,
+                   'author': self.author,
+                   'channel': self.channel,
+                   'votes': self.votes,
+                   'replies': self.replies,
+                   'photo': self.photo,
+                   'heart': self.heart,
+                   'reply': self.reply}
+        if self.time_parsed is not None:
+            comment['time_parsed'] = self.time_parsed
+        if self.paid is not None:
+            comment['paid'] = self.paid
+        return comment
+
+    @property
+    def parent(self):
+        """ID of the comment this is a reply to, or None"""
+        return self.cid.split('.', 1)[0] if self.reply else None
+
+    def __eq__(self, other):
+        if not isinstance(other, Comment):
+            return NotImplemented
+        return all(getattr(self, name) == getattr(other, name) for name in self.__slots__)
+
+    def __repr__(self):
+        return 'Comment(cid=%r, author=%r, votes=%d, replies=%d)' % (self.cid, self.author, self.votes, self.replies)
@@ -0,0 +1,166 @@
+import threading
+import time
+
+from .comment import as_dict, parse_count
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS comments (
+    cid TEXT PRIMARY KEY,
+    video_id TEXT NOT NULL,
+    parent TEXT,
+    text TEXT NOT NULL,
+    time TEXT NOT NULL,
+    time_parsed REAL,
+    author TEXT NOT NULL,
+    channel TEXT NOT NULL,
+    votes INTEGER,
+    replies INTEGER,
+    photo TEXT NOT NULL,
+    heart INTEGER NOT NULL,
+    reply INTEGER NOT NULL,
+    paid TEXT,
+    fetch_time REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS comments_channel ON comments (channel);
+CREATE INDEX IF NOT EXISTS comments_video_id ON comments (video_id);
+CREATE INDEX IF NOT EXISTS comments_time_parsed ON comments (time_parsed);
+'''
+
+COLUMNS = ('cid', 'video_id', 'parent', 'text', 'time', 'time_parsed', 'author', 'channel', 'votes', 'replies',
+           'photo', 'heart', 'reply', 'paid', 'fetch_time')
+
+UPSERT = 'INSERT INTO comments ({columns}) VALUES ({values}) ON CONFLICT (cid) DO UPDATE SET {updates}'.format(
+    columns=', '.join(COLUMNS),
+    values=', '.join('?' * len(COLUMNS)),
+    updates=', '.join('{0} = excluded.{0}'.format(column) for column in COLUMNS[1:]))
+
+ORDER_BY = {'votes': 'votes DESC', 'time': 'time_parsed DESC', 'fetch_time': 'fetch_time DESC'}
+
+
+def to_row(comment, video_id, fetch_time):
+    comment = as_dict(comment)
+    cid = comment['cid']
+    return (cid, video_id, cid.split('.', 1)[0] if '.' in cid else None, comment['text'], comment['time'],
+            comment.get('time_parsed'), comment['author'], comment['channel'], parse_count(comment['votes']),
+            parse_count(comment['replies']), comment['photo'], comment['heart'], comment['reply'], comment.get('paid'),
+            fetch_time)
+
+
+def from_row(row):
+    comment = dict(row)
+    comment['heart'] = bool(comment['heart'])
+    comment['reply'] = bool(comment['reply'])
+    return comment
+
+
+class CommentDatabase:
+    """
+    Stores comments in an SQLite database, one row per comment. Comments are inserted in batches of `batch_size`
+    within a single transaction. Downloading the same comment again updates its row. A single instance can be used
+    from multiple threads (e.g. by BatchDownloader).
+
+    Comments returned by the query methods are dictionaries with the same keys as the downloaded comments, plus
+    video_id, parent and fetch_time. votes and replies are integers.
+    """
+
+    def __init__(self, filename, batch_size=1000):
+        import sqlite3
+        self.connection = sqlite3.connect(filename, check_same_thread=False)
+        self.connection.row_factory = sqlite3.Row
+        self.connection.execute('PRAGMA journal_mode = WAL')
+        self.connection.executescript(SCHEMA)
+        self.batch_size = batch_size
+        self.lock = threading.Lock()
+        self.rows = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def add(self, comment, video_id, fetch_time=None):
+        with self.lock:
+            self.rows.append(to_row(comment, video_id, fetch_time or time.time()))
+            if len(self.rows) >= self.batch_size:
+                self.write_rows()
+
+    def write_rows(self):
+        # Should be called while holding the lock
+        if self.rows:
+            with self.connection:
+                self.connection.executemany(UPSERT, self.rows)
+            self.rows = []
+
+    def flush(self):
+        with self.lock:
+            self.write_rows()
+
+    def close(self):
+        self.flush()
+        self.connection.close()
+
+    def track_comments(self, generator, video_id):
+        """
+        Passes on the comments from the generator, while adding them to the database.
+        """
+        try:
+            for comment in generator:
+                self.add(comment, video_id)
+                yield comment
+        finally:
+            self.flush()
+
+    def query(self, sql, parameters=()):
+        with self.lock:
+            self.write_rows()
+            return [from_row(row) for row in self.connection.execute(sql, parameters)]
+
+    def get_comment(self, cid):
+        comments = self.query('SELECT * FROM comments WHERE cid = ?', (cid,))
+        return comments[0] if comments else None
+
+    def get_replies(self, cid):
+        return self.query('SELECT * FROM comments WHERE parent = ? ORDER BY time_parsed', (cid,))
+
+    def find_comments(self, video_id=None, channel=None, since=None, until=None, order_by=None, limit=None):
+        """
+        Returns the comments matching all of the given conditions. since and until are timestamps that are compared
+        with time_parsed. The comments can be ordered by 'votes', 'time' or 'fetch_time' (most/latest first).
+        """
+        conditions, parameters = [], []
+        for condition, value in (('video_id = ?', video_id), ('channel = ?', channel),
+                                 ('time_parsed >= ?', since), ('time_parsed < ?', until)):
+            if value is not None:
+                conditions.append(condition)
+                parameters.append(value)
+
+        sql = 'SELECT * FROM comments'
+        if conditions:
+            sql += ' WHERE ' + ' AND '.join(conditions)
+        if order_by:
+            if order_by not in ORDER_BY:
+                raise ValueError('cannot order by %s' % order_by)
+            sql += ' ORDER BY ' + ORDER_BY[order_by]
+        if limit:
+            sql += ' LIMIT ?'
+            parameters.append(limit)
+        return self.query(sql, parameters)
+
+    def top_comments(self, limit=10, video_id=None):
+        return self.find_comments(video_id=video_id, order_by='votes', limit=limit)
+
+    def count(self, video_id=None):
+        with self.lock:
+            self.write_rows()
+            if video_id is None:
+                cursor = self.connection.execute('SELECT COUNT(*) FROM comments')
+            else:
+                cursor = self.connection.execute('SELECT COUNT(*) FROM comments WHERE video_id = ?', (video_id,))
+            return cursor.fetchone()[0]
+
+    def get_video_ids(self):
+        with self.lock:
+            self.write_rows()
+            cursor = self.connection.execute('SELECT DISTINCT video_id FROM comments ORDER BY video_id')
+            return [row[0] for row in cursor]
@@ -1,11 +1,16 @@
-from __future__ import print_function
-
+import itertools
 import json
 import re
 import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import parse_qs, urlparse
 
-import dateparser
-import requests
+from .comment import Comment
+from .ratelimit import RateLimiter
+from .retry import RetryPolicy, THROTTLE_STATUS_CODES, parse_retry_after
+from .scheduler import DEPTH_FIRST, ContinuationScheduler
+from .stats import get_response_size
+from .timeparser import parse_time
 
 YOUTUBE_VIDEO_URL = 'https://www.youtube.com/watch?v={youtube_id}'
 YOUTUBE_CONSENT_URL = 'https://consent.youtube.com/save'
@@ -17,135 +22,286 @@ SORT_BY_RECENT = 1
 
 YT_CFG_RE = r'ytcfg\.set\s*\(\s*({.+?})\s*\)\s*;'
 YT_INITIAL_DATA_RE = r'(?:window\s*\[\s*["\']ytInitialData["\']\s*\]|ytInitialData)\s*=\s*({.+?})\s*;\s*(?:var\s+meta|</script|\n)'
+# Where the JSON values start. The values themselves are decoded with json.JSONDecoder.raw_decode, which stops at the
+# end of the value, so the regular expressions above are only needed as a fallback.
+YT_CFG_ANCHOR_RE = re.compile(r'ytcfg\.set\s*\(\s*(?={)')
+YT_INITIAL_DATA_ANCHOR_RE = re.compile(r'ytInitialData(?:["\']\s*\])?\s*=\s*(?={)')
 YT_HIDDEN_INPUT_RE = r'<input\s+type="hidden"\s+name="([A-Za-z0-9_]+)"\s+value="([A-Za-z0-9_\-\.]*)"\s*(?:required|)\s*>'
 
+JSON_DECODER = json.JSONDecoder()
 
-class YoutubeCommentDownloader:
+# Key of the RateLimiter that spaces out the requests of a single download when prefetching
+PACER_HOST = 'www.youtube.com'
 
-    def __init__(self):
-        self.session = requests.Session()
-        self.session.headers['User-Agent'] = USER_AGENT
-        self.session.cookies.set('CONSENT', 'YES+cb', domain='.youtube.com')
+COMMENT_SECTIONS = ('comments-section', 'engagement-panel-comments-section', 'shorts-engagement-panel-comments-section')
 
-    def ajax_request(self, endpoint, ytcfg, retries=5, sleep=20, timeout=60):
-        url = 'https://www.youtube.com' + endpoint['commandMetadata']['webCommandMetadata']['apiUrl']
+# Keys that are looked up in every continuation response
+PAGE_KEYS = ('externalErrorMessage', 'reloadContinuationItemsCommand', 'appendContinuationItemsAction',
+             'commentSurfaceEntityPayload', 'engagementToolbarStateEntityPayload', 'commentEntityPayload',
+             'commentViewModel')
 
-        data = {'context': ytcfg['INNERTUBE_CONTEXT'],
-                'continuation': endpoint['continuationCommand']['token']}
 
-        for _ in range(retries):
-            try:
-                response = self.session.post(url, params={'key': ytcfg['INNERTUBE_API_KEY']}, json=data, timeout=timeout)
-                if response.status_code == 200:
-                    return response.json()
-                if response.status_code in [403, 413]:
-                    return {}
-            except requests.exceptions.Timeout:
-                pass
-            time.sleep(sleep)
+def get_youtube_id(youtube_url):
+    """
+    Returns the ID of the video (watch?v=<id>, shorts/<id> or youtu.be/<id>) or post that a URL points to.
+    """
+    url = urlparse(youtube_url)
+    video_ids = parse_qs(url.query).get('v')
+    return video_ids[0] if video_ids else url.path.rstrip('/').rsplit('/', 1)[-1]
 
-    def get_comments(self, youtube_id, *args, **kwargs):
-        return self.get_comments_from_url(YOUTUBE_VIDEO_URL.format(youtube_id=youtube_id), *args, **kwargs)
 
-    def get_comments_from_url(self, youtube_url, sort_by=SORT_BY_RECENT, language=None, sleep=.1):
-        response = self.session.get(youtube_url)
+class RequestError(RuntimeError):
+    """
+    Raised when a request to Youtube failed and should not (or can no longer) be retried. status_code is None if no
+    response was received at all.
+    """
 
-        if 'consent' in str(response.url):
-            # We may get redirected to a separate page for cookie consent. If this happens we agree automatically.
-            params = dict(re.findall(YT_HIDDEN_INPUT_RE, response.text))
-            params.update({'continue': youtube_url, 'set_eom': False, 'set_ytc': True, 'set_apyt': True})
-            response = self.session.post(YOUTUBE_CONSENT_URL, params=params)
+    def __init__(self, message, status_code=None):
+        super(RequestError, self).__init__(message)
+        self.status_code = status_code
+
+
+class YoutubeCommentParser:
+    """
+    Turns the pages and responses returned by Youtube into comments, without doing any I/O itself. This is shared by
+    YoutubeCommentDownloader and AsyncYoutubeCommentDownloader.
+    """
+
+    # Instrumentation hooks (see stats.Hooks), if any
+    hooks = None
 
-        html = response.text
-        ytcfg = json.loads(self.regex_search(html, YT_CFG_RE, default=''))
+    @staticmethod
+    def get_consent_params(html, youtube_url):
+        params = dict(re.findall(YT_HIDDEN_INPUT_RE, html))
+        params.update({'continue': youtube_url, 'set_eom': False, 'set_ytc': True, 'set_apyt': True})
+        return params
+
+    def parse_watch_page(self, html, language=None):
+        ytcfg = self.extract_json(html, YT_CFG_ANCHOR_RE, YT_CFG_RE)
         if not ytcfg:
-            return  # Unable to extract configuration
+            return None, None  # Unable to extract configuration
         if language:
             ytcfg['INNERTUBE_CONTEXT']['client']['hl'] = language
 
-        data = json.loads(self.regex_search(html, YT_INITIAL_DATA_RE, default=''))
+        data = self.extract_json(html, YT_INITIAL_DATA_ANCHOR_RE, YT_INITIAL_DATA_RE)
+        return ytcfg, data or {}
+
+    @classmethod
+    def extract_json(cls, html, anchor, pattern):
+        """
+        Returns the first JSON object that directly follows a match of `anchor`, decoding exactly one value in a
+        single pass. If no such object can be decoded, the JSON captured by `pattern` is used instead. Returns None
+        if neither works.
+        """
+        for match in anchor.finditer(html):
+            try:
+                value, _ = JSON_DECODER.raw_decode(html, match.end())
+            except ValueError:
+                continue
+            if isinstance(value, dict):
+                return value
+        try:
+            return json.loads(cls.regex_search(html, pattern, default=''))
+        except ValueError:
+            return None
 
+    def has_comments(self, data):
         item_section = next(self.search_dict(data, 'itemSectionRenderer'), None)
         renderer = next(self.search_dict(item_section, 'continuationItemRenderer'), None) if item_section else None
-        if not renderer:
-            # Comments disabled?
-            return
+        return renderer is not None
 
-        sort_menu = next(self.search_dict(data, 'sortFilterSubMenuRenderer'), {}).get('subMenuItems', [])
-        if not sort_menu:
-            # No sort menu. Maybe this is a request for community posts?
-            section_list = next(self.search_dict(data, 'sectionListRenderer'), {})
-            continuations = list(self.search_dict(section_list, 'continuationEndpoint'))
-            # Retry..
-            data = self.ajax_request(continuations[0], ytcfg) if continuations else {}
-            sort_menu = next(self.search_dict(data, 'sortFilterSubMenuRenderer'), {}).get('subMenuItems', [])
+    def get_sort_menu(self, data):
+        return next(self.search_dict(data, 'sortFilterSubMenuRenderer'), {}).get('subMenuItems', [])
+
+    def get_section_endpoint(self, data):
+        section_list = next(self.search_dict(data, 'sectionListRenderer'), {})
+        return next(self.search_dict(section_list, 'continuationEndpoint'), None)
+
+    @staticmethod
+    def get_sort_endpoint(sort_menu, sort_by):
         if not sort_menu or sort_by >= len(sort_menu):
             raise RuntimeError('Failed to set sorting')
-        continuations = [sort_menu[sort_by]['serviceEndpoint']]
+        return sort_menu[sort_by]['serviceEndpoint']
 
-        while continuations:
-            continuation = continuations.pop()
-            response = self.ajax_request(continuation, ytcfg)
+    @staticmethod
+    def build_ajax_request(endpoint, ytcfg):
+        url = 'https://www.youtube.com' + endpoint['commandMetadata']['webCommandMetadata']['apiUrl']
+        params = {'key': ytcfg['INNERTUBE_API_KEY']}
+        data = {'context': ytcfg['INNERTUBE_CONTEXT'],
+                'continuation': endpoint['continuationCommand']['token']}
+        return url, params, data
 
-            if not response:
+    @staticmethod
+    def is_rejection(error):
+        """
+        Returns whether an error raised while fetching a page means that Youtube does not accept the continuation
+        (as opposed to e.g. being unreachable).
+        """
+        if isinstance(error, RequestError):
+            # Timeouts and throttling only mean that we should slow down, not that the continuation is stale
+            return error.status_code is not None and 400 <= error.status_code < 500 and \
+                error.status_code not in (408, 429)
+        return str(error).startswith('Error returned from server')
+
+    def get_retry_delay(self, attempt, url, response=None):
+        """
+        Called after a failed request (response is None if no response was received). Returns the number of seconds
+        to wait before trying again, or raises a RequestError if the retry policy gives up. Throttling responses are
+        passed on to the rate limiter, so other requests to the same host slow down as well.
+        """
+        status_code = response.status_code if response is not None else None
+        retry_after = parse_retry_after(response.headers.get('Retry-After')) if response is not None else None
+        if self.rate_limiter and status_code in THROTTLE_STATUS_CODES:
+            self.rate_limiter.throttle(urlparse(url).netloc, retry_after)
+
+        delay = self.retry_policy.get_delay(attempt, status_code, retry_after)
+        if delay is None:
+            if retry_after is not None and retry_after > self.retry_policy.max_retry_after:
+                raise RequestError('Server asked to wait %d seconds before retrying, which is longer than %d seconds'
+                                   % (retry_after, self.retry_policy.max_retry_after), status_code)
+            if status_code is None:
+                raise RequestError('No response from server after %d attempts' % (attempt + 1))
+            raise RequestError('Request failed with status code %d after %d attempts' % (status_code, attempt + 1),
+                               status_code)
+        if self.hooks:
+            self.hooks.on_retry(url, attempt, status_code, delay)
+        return delay
+
+    def parse_page(self, response, continuations, known=None):
+        """
+        Indexes a continuation response and adds the continuations it contains to `continuations` (a
+        ContinuationScheduler). The returned index can be passed to parse_comments.
+
+        If `known` (a dictionary mapping comment IDs to their reply counts) is given, the next page is only added
+        if this page contains at least one thread that is not known, and reply threads are only added if their
+        reply count has changed.
+        """
+        index = self.search_dict_multi(response, PAGE_KEYS)
+        error = next(iter(index['externalErrorMessage']), None)
+        if error:
+            raise RuntimeError('Error returned from server: ' + error)
+
+        if known is not None:
+            reply_counts = {payload['properties']['commentId']: payload['toolbar']['replyCount']
+                            for payload in index['commentEntityPayload']}
+
+        actions = itertools.chain(index['reloadContinuationItemsCommand'], index['appendContinuationItemsAction'])
+        for action in actions:
+            if known is not None and action['targetId'] in COMMENT_SECTIONS:
+                thread_ids = [self.get_thread_id(item) for item in action.get('continuationItems', [])]
+                has_new_threads = any(cid not in known for cid in thread_ids if cid) or not any(thread_ids)
+
+            for position, item in enumerate(action.get('continuationItems', [])):
+                if action['targetId'] in COMMENT_SECTIONS:
+                    if known is not None:
+                        cid = thread_ids[position]
+                        if cid and known.get(cid) == reply_counts.get(cid):
+                            # Known thread without new replies
+                            continue
+                        if not cid and 'continuationItemRenderer' in item and not has_new_threads:
+                            # Next page, while everything on this page is known already
+                            continue
+                    # Process continuations for comments and replies.
+                    endpoints = list(self.search_dict(item, 'continuationEndpoint'))
+                    if 'continuationItemRenderer' in item:
+                        continuations.add_pages(endpoints)
+                    else:
+                        continuations.add_threads(endpoints)
+                if action['targetId'].startswith('comment-replies-item') and 'continuationItemRenderer' in item:
+                    # Process the 'Show more replies' button
+                    continuations.add_more_replies(next(self.search_dict(item, 'buttonRenderer'))['command'])
+        return index
+
+    def process_page(self, response, continuations, time_parsed=True, known=None):
+        """
+        Handles a continuation response that has just been received: the continuations it contains are added to
+        `continuations` right away, and an iterator over its comments is returned. Comments that are in `known`
+        with the same reply count are left out. The instrumentation hooks are called for the page and its comments.
+        """
+        fetch_time = time.time()
+        start = time.perf_counter()
+        index = self.parse_page(response, continuations, known)
+        return self.iter_page_comments(index, fetch_time, time_parsed, known, time.perf_counter() - start)
+
+    def iter_page_comments(self, index, fetch_time, time_parsed=True, known=None, index_seconds=0.0):
+        timings = {'index': index_seconds, 'comments': 0.0, 'time_parsed': 0.0} if self.hooks else None
+        comments = self.parse_comments(index, fetch_time, time_parsed, timings)
+        if timings is not None:
+            # Build the comments up front, so that the time spent by the consumer is not counted
+            start = time.perf_counter()
+            comments = list(comments)
+            timings['comments'] = time.perf_counter() - start
+            self.hooks.on_page(timings, len(comments))
+
+        for comment in comments:
+            if known is not None and known.get(comment['cid']) == comment['replies']:
+                continue
+            if self.hooks:
+                self.hooks.on_comment(comment)
+            yield comment
+
+    @staticmethod
+    def get_prefetch_candidates(continuations, prefetched, concurrency):
+        """
+        Yields the pending continuations that are next in line and are not being fetched yet, for as long as fewer
+        than `concurrency` are in flight. `prefetched` maps the id() of the continuations being fetched to their
+        future, and is expected to grow as the candidates are submitted.
+        """
+        for pending in reversed(continuations):
+            if len(prefetched) >= concurrency:
                 break
+            if id(pending) not in prefetched:
+                yield pending
+
+    def get_thread_id(self, item):
+        if 'commentThreadRenderer' not in item:
+            return None
+        view_model = next(self.search_dict(item, 'commentViewModel'), {})
+        return view_model.get('commentViewModel', {}).get('commentId')
+
+    def parse_comments(self, index, fetch_time, time_parsed=True, timings=None):
+        surface_payloads = index['commentSurfaceEntityPayload']
+        payments = {payload['key']: next(self.search_dict(payload, 'simpleText'), '')
+                    for payload in surface_payloads if 'pdgCommentChip' in payload}
+        if payments:
+            # We need to map the payload keys to the comment IDs.
+            view_models = (vm['commentViewModel'] for vm in index['commentViewModel'])
+            surface_keys = {vm['commentSurfaceKey']: vm['commentId']
+                            for vm in view_models if 'commentSurfaceKey' in vm}
+            payments = {surface_keys[key]: payment for key, payment in payments.items() if key in surface_keys}
+
+        toolbar_payloads = index['engagementToolbarStateEntityPayload']
+        toolbar_states = {payload['key']: payload for payload in toolbar_payloads}
+        for comment in reversed(index['commentEntityPayload']):
+            properties = comment['properties']
+            cid = properties['commentId']
+            author = comment['author']
+            toolbar = comment['toolbar']
+            toolbar_state = toolbar_states[properties['toolbarStateKey']]
+            result = {'cid': cid,
+                      'text': properties['content']['content'],
+                      'time': properties['publishedTime'],
+                      'author': author['displayName'],
+                      'channel': author['channelId'],
+                      'votes': toolbar['likeCountNotliked'].strip() or "0",
+                      'replies': toolbar['replyCount'],
+                      'photo': author['avatarThumbnailUrl'],
+                      'heart': toolbar_state.get('heartState', '') == 'TOOLBAR_HEART_STATE_HEARTED',
+                      'reply': '.' in cid}
+
+            if timings is None:
+                timestamp = parse_time(result['time'], fetch_time) if time_parsed else None
+            else:
+                start = time.perf_counter()
+                timestamp = parse_time(result['time'], fetch_time) if time_parsed else None
+                timings['time_parsed'] += time.perf_counter() - start
+            if timestamp is not None:
+                result['time_parsed'] = timestamp
 
-            error = next(self.search_dict(response, 'externalErrorMessage'), None)
-            if error:
-                raise RuntimeError('Error returned from server: ' + error)
-
-            actions = list(self.search_dict(response, 'reloadContinuationItemsCommand')) + \
-                      list(self.search_dict(response, 'appendContinuationItemsAction'))
-            for action in actions:
-                for item in action.get('continuationItems', []):
-                    if action['targetId'] in ['comments-section',
-                                              'engagement-panel-comments-section',
-                                              'shorts-engagement-panel-comments-section']:
-                        # Process continuations for comments and replies.
-                        continuations[:0] = [ep for ep in self.search_dict(item, 'continuationEndpoint')]
-                    if action['targetId'].startswith('comment-replies-item') and 'continuationItemRenderer' in item:
-                        # Process the 'Show more replies' button
-                        continuations.append(next(self.search_dict(item, 'buttonRenderer'))['command'])
-
-            surface_payloads = self.search_dict(response, 'commentSurfaceEntityPayload')
-            payments = {payload['key']: next(self.search_dict(payload, 'simpleText'), '')
-                        for payload in surface_payloads if 'pdgCommentChip' in payload}
-            if payments:
-                # We need to map the payload keys to the comment IDs.
-                view_models = [vm['commentViewModel'] for vm in self.search_dict(response, 'commentViewModel')]
-                surface_keys = {vm['commentSurfaceKey']: vm['commentId']
-                                for vm in view_models if 'commentSurfaceKey' in vm}
-                payments = {surface_keys[key]: payment for key, payment in payments.items() if key in surface_keys}
-
-            toolbar_payloads = self.search_dict(response, 'engagementToolbarStateEntityPayload')
-            toolbar_states = {payload['key']: payload for payload in toolbar_payloads}
-            for comment in reversed(list(self.search_dict(response, 'commentEntityPayload'))):
-                properties = comment['properties']
-                cid = properties['commentId']
-                author = comment['author']
-                toolbar = comment['toolbar']
-                toolbar_state = toolbar_states[properties['toolbarStateKey']]
-                result = {'cid': cid,
-                          'text': properties['content']['content'],
-                          'time': properties['publishedTime'],
-                          'author': author['displayName'],
-                          'channel': author['channelId'],
-                          'votes': toolbar['likeCountNotliked'].strip() or "0",
-                          'replies': toolbar['replyCount'],
-                          'photo': author['avatarThumbnailUrl'],
-                          'heart': toolbar_state.get('heartState', '') == 'TOOLBAR_HEART_STATE_HEARTED',
-                          'reply': '.' in cid}
-
-                try:
-                    result['time_parsed'] = dateparser.parse(result['time'].split('(')[0].strip()).timestamp()
-                except AttributeError:
-                    pass
-
-                if cid in payments:
-                    result['paid'] = payments[cid]
-
-                yield result
-            time.sleep(sleep)
+            if cid in payments:
+                result['paid'] = payments[cid]
+
+            yield result
 
     @staticmethod
     def regex_search(text, pattern, group=1, default=None):
@@ -165,3 +321,214 @@ class YoutubeCommentDownloader:
                         stack.append(value)
             elif isinstance(current_item, list):
                 stack.extend(current_item)
+
+    @staticmethod
+    def search_dict_multi(partial, search_keys):
+        """
+        Searches for several keys at once, returning a dictionary that maps every key to the list of values
+        search_dict would yield for it (in the same order), while walking the tree only once.
+        """
+        index = {key: [] for key in search_keys}
+        # Values of matching keys are searched as well (for the other keys), so every stack entry keeps track of
+        # the keys that have already been matched by one of its ancestors.
+        stack = [(partial, ())]
+        while stack:
+            current_item, matched = stack.pop()
+            if isinstance(current_item, dict):
+                for key, value in current_item.items():
+                    if key in index and key not in matched:
+                        index[key].append(value)
+                        stack.append((value, matched + (key,)))
+                    elif isinstance(value, (dict, list)):
+                        stack.append((value, matched))
+            elif isinstance(current_item, list):
+                stack.extend((item, matched) for item in current_item)
+        return index
+
+
+class YoutubeCommentDownloader(YoutubeCommentParser):
+
+    def __init__(self, rate_limiter=None, retry_policy=None, session=None, cache=None, hooks=None):
+        # The session can be replaced by anything with the same request method, such as replay.ReplaySession
+        if session is None:
+            import requests
+            session = requests.Session()
+            session.headers['User-Agent'] = USER_AGENT
+            session.cookies.set('CONSENT', 'YES+cb', domain='.youtube.com')
+        self.session = session
+        self.rate_limiter = rate_limiter
+        self.retry_policy = retry_policy or RetryPolicy()
+        self.cache = cache
+        self.hooks = hooks
+        if cache and hasattr(session, 'cookies'):
+            cache.load_cookies(session.cookies)
+
+    def request(self, method, url, **kwargs):
+        if self.rate_limiter:
+            self.rate_limiter.wait(urlparse(url).netloc)
+        if not self.hooks:
+            return self.session.request(method, url, **kwargs)
+
+        start = time.perf_counter()
+        try:
+            response = self.session.request(method, url, **kwargs)
+        except Exception:
+            self.hooks.on_request(method, url, None, time.perf_counter() - start, None)
+            raise
+        self.hooks.on_request(method, url, response.status_code, time.perf_counter() - start,
+                              get_response_size(response))
+        return response
+
+    def ajax_request(self, endpoint, ytcfg, timeout=60):
+        import requests
+        url, params, data = self.build_ajax_request(endpoint, ytcfg)
+
+        for attempt in itertools.count():
+            try:
+                response = self.request('POST', url, params=params, json=data, timeout=timeout)
+            except (requests.exceptions.Timeout, requests.exceptions.ConnectionError):
+                response = None
+            if response is not None and response.status_code == 200:
+                if self.rate_limiter:
+                    self.rate_limiter.success(urlparse(url).netloc)
+                if not self.hooks:
+                    return response.json()
+                start = time.perf_counter()
+                data = response.json()
+                self.hooks.on_decode(time.perf_counter() - start)
+                return data
+            time.sleep(self.get_retry_delay(attempt, url, response))
+
+    def paced_ajax_request(self, endpoint, ytcfg, pacer=None):
+        if pacer:
+            pacer.wait(PACER_HOST)
+        return self.ajax_request(endpoint, ytcfg)
+
+    def get_comments(self, youtube_id, *args, **kwargs):
+        return self.get_comments_from_url(YOUTUBE_VIDEO_URL.format(youtube_id=youtube_id), *args, **kwargs)
+
+    def get_comments_from_url(self, youtube_url, sort_by=SORT_BY_RECENT, language=None, sleep=None, concurrency=1,
+                              time_parsed=True, checkpoint=None, known=None, records=False, order=DEPTH_FIRST,
+                              max_pending=1000):
+        """
+        Yields the comments of a Youtube video. With concurrency > 1, up to that many pending continuations (mostly
+        reply threads) are fetched ahead of time in background threads instead of sleeping between requests.
+        Comments are yielded in the same order either way. Without concurrency, the downloader sleeps `sleep` seconds
+        between pages, unless a rate limiter is used (which paces the requests instead). With concurrency, requests
+        are started at least `sleep` seconds apart. With time_parsed=False, comments do not get a
+        'time_parsed' field and dateparser is never loaded.
+
+        If a Checkpoint is given, it is updated before every page is fetched. If the checkpoint already contains
+        continuations, the download resumes from there instead of starting over.
+
+        If `known` (a dictionary mapping comment IDs to reply counts, see incremental.load_known_comments) is given,
+        only comments that are new or have a different reply count are yielded. Paging stops at the first page
+        without new threads, so this should be used with SORT_BY_RECENT.
+
+        With records=True, comments are yielded as Comment objects (with integer votes and replies) instead of
+        dictionaries, which takes several times less memory when many comments are kept around.
+
+        If the downloader has a BootstrapCache, the watch page is only loaded if the video is not in the cache. When
+        Youtube rejects the cached continuation, the entry is dropped and the watch page is loaded after all.
+
+        By default, the replies of every thread are downloaded before the next page of threads. With
+        order=BREADTH_FIRST, pages of threads are downloaded first, while up to `max_pending` reply threads are
+        queued (see ContinuationScheduler).
+        """
+        cached = None
+        if checkpoint and checkpoint.continuations is not None:
+            ytcfg = checkpoint.ytcfg
+            continuations = ContinuationScheduler.from_state(checkpoint.continuations, max_pending)
+        else:
+            cached = self.cache.get(youtube_url, sort_by, language) if self.cache else None
+            ytcfg, endpoint = cached or self.bootstrap(youtube_url, sort_by, language)
+            if not endpoint:
+                return
+            continuations = ContinuationScheduler([endpoint], order, max_pending)
+
+        if sleep is None:
+            sleep = 0 if self.rate_limiter else .1
+        executor = ThreadPoolExecutor(max_workers=concurrency) if concurrency > 1 else None
+        yielded = False
+        try:
+            for comment in self._get_comments_from_continuations(continuations, ytcfg, sleep, executor, concurrency,
+                                                                time_parsed, checkpoint, known):
+                yielded = True
+                yield Comment.from_dict(comment, language) if records else comment
+        except RuntimeError as e:
+            if not cached or yielded or not self.is_rejection(e):
+                raise
+            self.cache.invalidate(youtube_url, sort_by, language)
+            if checkpoint:
+                checkpoint.continuations = None
+            for comment in self.get_comments_from_url(youtube_url, sort_by, language, sleep, concurrency,
+                                                      time_parsed, checkpoint, known, records, order, max_pending):
+                yield comment
+        finally:
+            if executor:
+                executor.shutdown(wait=False, cancel_futures=True)
+
+    def bootstrap(self, youtube_url, sort_by=SORT_BY_RECENT, language=None):
+        """
+        Loads the watch page and returns the InnerTube configuration, together with the endpoint for the first page
+        of comments. The endpoint is None if the video has no comments.
+        """
+        response = self.request('GET', youtube_url)
+
+        if 'consent' in str(response.url):
+            # We may get redirected to a separate page for cookie consent. If this happens we agree automatically.
+            params = self.get_consent_params(response.text, youtube_url)
+            response = self.request('POST', YOUTUBE_CONSENT_URL, params=params)
+
+        ytcfg, data = self.parse_watch_page(response.text, language)
+        if not ytcfg:
+            return None, None  # Unable to extract configuration
+
+        if not self.has_comments(data):
+            # Comments disabled?
+            return ytcfg, None
+
+        sort_menu = self.get_sort_menu(data)
+        if not sort_menu:
+            # No sort menu. Maybe this is a request for community posts?
+            endpoint = self.get_section_endpoint(data)
+            # Retry..
+            data = self.ajax_request(endpoint, ytcfg) if endpoint else {}
+            sort_menu = self.get_sort_menu(data)
+        endpoint = self.get_sort_endpoint(sort_menu, sort_by)
+
+        if self.cache:
+            self.cache.put(youtube_url, sort_by, language, ytcfg, endpoint)
+            if hasattr(self.session, 'cookies'):
+                self.cache.save_cookies(self.session.cookies)
+        return ytcfg, endpoint
+
+    def _get_comments_from_continuations(self, continuations, ytcfg, sleep, executor=None, concurrency=1,
+                                         time_parsed=True, checkpoint=None, known=None):
+        prefetched = {}
+        count = checkpoint.count if checkpoint else 0
+        # Prefetching requests are paced as well, so that they do not all hit Youtube at once
+        pacer = RateLimiter(1.0 / sleep) if executor and sleep else None
+        while continuations:
+            if checkpoint:
+                # All comments we have yielded so far have been consumed
+                checkpoint.update(ytcfg, continuations.get_state(), count)
+
+            continuation = continuations.pop()
+            future = prefetched.pop(id(continuation), None)
+            response = future.result() if future else self.paced_ajax_request(continuation, ytcfg, pacer)
+
+            if not response:
+                break
+            comments = self.process_page(response, continuations, time_parsed, known)
+
+            if executor:
+                # Start fetching the continuations that are next in line, while the current page is being consumed.
+                for pending in self.get_prefetch_candidates(continuations, prefetched, concurrency):
+                    prefetched[id(pending)] = executor.submit(self.paced_ajax_request, pending, ytcfg, pacer)
+
+            for comment in comments:
+                count += 1
+                yield comment
+            if not executor and sleep:
+                time.sleep(sleep)
@@ -0,0 +1,46 @@
+import io
+import json
+import os
+
+from .comment import Comment
+from .reader import is_comments_object, iter_comments
+
+
+def load_known_comments(filename):
+    """
+    Returns a dictionary that maps the IDs of earlier downloaded comments to their reply counts. The file can either
+    be an index written by save_index, or the output of an earlier download (line delimited or indented JSON).
+    """
+    with io.open(filename, 'r', encoding='utf8') as fp:
+        if not is_comments_object(fp):
+            line = fp.readline()
+            if line.strip():
+                try:
+                    data = json.loads(line)
+                except ValueError:
+                    # An index that is spread over several lines
+                    fp.seek(0)
+                    return json.load(fp)
+                if 'cid' not in data:
+                    return data
+            fp.seek(0)
+        return {comment['cid']: comment['replies'] for comment in iter_comments(fp, ('cid', 'replies'))}
+
+
+def save_index(filename, known):
+    tmp_filename = filename + '.tmp'
+    with io.open(tmp_filename, 'w', encoding='utf8') as fp:
+        json.dump(known, fp, ensure_ascii=False)
+    os.replace(tmp_filename, filename)
+
+
+def track_comments(generator, known):
+    """
+    Passes on the comments from the generator, while adding them to `known`. Comment objects cannot be tracked,
+    since the index needs the reply counts exactly as Youtube shows them.
+    """
+    for comment in generator:
+        if isinstance(comment, Comment):
+            raise TypeError('incremental downloads need comments as dictionaries (records=False)')
+        known[comment['cid']] = comment['replies']
+        yield comment
@@ -0,0 +1,65 @@
+import threading
+import time
+
+
+class RateLimiter:
+    """
+    Token bucket that limits the number of requests per second to each host. Every host gets a bucket that holds up
+    to `burst` tokens and is refilled at `rate` tokens per second. A single instance can be shared between
+    downloaders running in different threads.
+
+    If `adaptive` is set, the rate of a host is halved (down to `min_rate`) every time the server signals that we
+    are going too fast, and slowly increased back to `rate` with every successful request.
+
+    A Retry-After passed to throttle() pauses the host for at most `max_retry_after` seconds.
+    """
+
+    def __init__(self, rate, burst=1, adaptive=False, min_rate=None, max_retry_after=300):
+        self.max_rate = rate
+        self.min_rate = min_rate or rate / 16.0
+        self.burst = burst
+        self.adaptive = adaptive
+        self.max_retry_after = max_retry_after
+        self.lock = threading.Lock()
+        self.buckets = {}
+
+    def get_bucket(self, host, now):
+        # Returns [tokens, time of last update, rate], with the tokens that were added since the last update
+        bucket = self.buckets.setdefault(host, [self.burst, now, self.max_rate])
+        bucket[0] = min(self.burst, bucket[0] + (now - bucket[1]) * bucket[2])
+        bucket[1] = now
+        return bucket
+
+    def get_rate(self, host):
+        with self.lock:
+            return self.buckets[host][2] if host in self.buckets else self.max_rate
+
+    def reserve(self, host):
+        # Takes a token for this host and returns the number of seconds until it may be used. The number of tokens
+        # can become negative, so that requests that are waiting are spaced out.
+        with self.lock:
+            bucket = self.get_bucket(host, time.monotonic())
+            bucket[0] -= 1
+            return -bucket[0] / bucket[2] if bucket[0] < 0 else 0
+
+    def wait(self, host):
+        delay = self.reserve(host)
+        if delay > 0:
+            time.sleep(delay)
+
+    def throttle(self, host, retry_after=None):
+        # The server told us to slow down. If it told us for how long, no requests are made to it until then.
+        with self.lock:
+            bucket = self.get_bucket(host, time.monotonic())
+            if self.adaptive:
+                bucket[2] = max(self.min_rate, bucket[2] / 2)
+            if retry_after:
+                retry_after = min(retry_after, self.max_retry_after)
+                bucket[0] = min(bucket[0], -retry_after * bucket[2])
+
+    def success(self, host):
+        if not self.adaptive:
+            return
+        with self.lock:
+            bucket = self.get_bucket(host, time.monotonic())
+            bucket[2] = min(self.max_rate, bucket[2] + self.max_rate / 20.0)
@@ -0,0 +1,132 @@
+import io
+import json
+import re
+
+CHUNK_SIZE = 1 << 16
+
+COMMENTS_OBJECT_RE = re.compile(r'\s*{\s*"comments"\s*:\s*\[')
+
+
+class CommentStream:
+    """
+    Reads the comments from a {"comments": [...]} object (as written with --pretty) one comment at a time. Only the
+    comment that is being decoded (plus at most `chunk_size` characters) is kept in memory. Other objects of the
+    form {"key": [value, ...], ...} can be read with items().
+    """
+
+    def __init__(self, fp, chunk_size=CHUNK_SIZE):
+        self.fp = fp
+        self.chunk_size = chunk_size
+        self.decoder = json.JSONDecoder()
+        self.buffer = ''
+        self.pos = 0
+
+    def read_more(self):
+        data = self.fp.read(self.chunk_size)
+        if not data:
+            return False
+        # Drop everything that has been consumed already
+        self.buffer = self.buffer[self.pos:] + data
+        self.pos = 0
+        return True
+
+    def peek(self):
+        """
+        Skips whitespace and returns the next character, without consuming it ('' at the end of the file).
+        """
+        while True:
+            while self.pos < len(self.buffer) and self.buffer[self.pos].isspace():
+                self.pos += 1
+            if self.pos < len(self.buffer):
+                return self.buffer[self.pos]
+            if not self.read_more():
+                return ''
+
+    def expect(self, chars):
+        char = self.peek()
+        if not char or char not in chars:
+            raise ValueError('expected one of %r at position %d but found %r' % (chars, self.pos, char))
+        self.pos += 1
+        return char
+
+    def decode(self):
+        self.peek()
+        while True:
+            try:
+                value, end = self.decoder.raw_decode(self.buffer, self.pos)
+            except ValueError:
+                if not self.read_more():
+                    raise
+                continue
+            # A number at the end of the buffer may continue in the next chunk
+            if end == len(self.buffer) and self.read_more():
+                continue
+            self.pos = end
+            return value
+
+    def __iter__(self):
+        for key, value in self.items():
+            if key == 'comments':
+                yield value
+
+    def items(self):
+        """
+        Yields (key, entry) for every entry of every array in the object. Values that are not arrays are yielded
+        as a whole.
+        """
+        self.expect('{')
+        if self.peek() == '}':
+            return
+        while True:
+            key = self.decode()
+            self.expect(':')
+            if self.peek() == '[':
+                self.expect('[')
+                if self.peek() == ']':
+                    self.pos += 1
+                else:
+                    while True:
+                        yield key, self.decode()
+                        if self.expect(',]') == ']':
+                            break
+            else:
+                yield key, self.decode()
+            if self.expect(',}') == '}':
+                return
+
+
+def is_comments_object(fp):
+    """
+    Returns whether the file contains a {"comments": [...]} object (e.g. written with --pretty) rather than line
+    delimited JSON, leaving the position unchanged.
+    """
+    position = fp.tell()
+    start = fp.read(256)
+    fp.seek(position)
+    return COMMENTS_OBJECT_RE.match(start) is not None
+
+
+def iter_comments(fp, fields=None):
+    """
+    Yields the comments from a file object with indented or line delimited JSON (as written by the command line
+    interface). If `fields` is given, only those keys are kept. Memory usage does not depend on the size of the file.
+    """
+    if is_comments_object(fp):
+        comments = iter(CommentStream(fp))
+    else:
+        comments = (json.loads(line) for line in fp if line.strip())
+    if fields is None:
+        for comment in comments:
+            yield comment
+    else:
+        for comment in comments:
+            yield {key: comment[key] for key in fields if key in comment}
+
+
+def read_comments(filename, fields=None):
+    """
+    Yields the comments from a file written by the command line interface, see iter_comments.
+    """
+    with io.open(filename, 'r', encoding='utf8') as fp:
+        for comment in iter_comments(fp, fields):
+            yield comment
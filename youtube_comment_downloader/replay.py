@@ -0,0 +1,107 @@
+import gzip
+import io
+import json
+
+from .downloader import YoutubeCommentDownloader
+
+
+def open_recording(filename, mode):
+    # Recordings ending in .gz are compressed, since continuation responses compress very well
+    if filename.endswith('.gz'):
+        return gzip.open(filename, mode + 't', encoding='utf8')
+    return io.open(filename, mode, encoding='utf8')
+
+
+def get_key(method, url, json=None):
+    # Continuation requests all go to the same URL, so they are told apart by their token
+    return method, url, json.get('continuation') if json else None
+
+
+class RecordedResponse:
+
+    def __init__(self, url, status_code, text, headers=None):
+        self.url = url
+        self.status_code = status_code
+        self.text = text
+        self.headers = headers or {}
+
+    def json(self):
+        return json.loads(self.text)
+
+
+class RecordingSession:
+    """
+    Wraps a session (e.g. the one of a YoutubeCommentDownloader) and keeps track of all requests and responses, so
+    that they can be saved and replayed later on with ReplaySession.
+    """
+
+    def __init__(self, session):
+        self.session = session
+        self.exchanges = []
+
+    def __getattr__(self, name):
+        # headers, cookies, etc.
+        return getattr(self.session, name)
+
+    def request(self, method, url, **kwargs):
+        response = self.session.request(method, url, **kwargs)
+        self.exchanges.append({'request': list(get_key(method, url, kwargs.get('json'))),
+                               'url': str(response.url),
+                               'status_code': response.status_code,
+                               'headers': dict(response.headers),
+                               'text': response.text})
+        return response
+
+    def save(self, filename):
+        with open_recording(filename, 'w') as fp:
+            json.dump(self.exchanges, fp, ensure_ascii=False)
+
+
+class ReplaySession:
+    """
+    Stand-in for requests.Session that answers requests with responses recorded by RecordingSession, without doing
+    any network I/O. If a request was recorded multiple times, the responses are returned in the recorded order (the
+    last one is repeated once they run out). Requests that were never recorded raise a KeyError.
+    """
+
+    def __init__(self, exchanges):
+        self.headers = {}
+        self.responses = {}
+        for exchange in exchanges:
+            response = RecordedResponse(exchange['url'], exchange['status_code'], exchange['text'],
+                                        exchange.get('headers'))
+            self.responses.setdefault(tuple(exchange['request']), []).append(response)
+        self.counts = {}
+
+    @classmethod
+    def load(cls, filename):
+        with open_recording(filename, 'r') as fp:
+            return cls(json.load(fp))
+
+    def rewind(self):
+        # Start replaying from the first recorded response again
+        self.counts = {}
+
+    def request(self, method, url, params=None, json=None, **kwargs):
+        key = get_key(method, url, json)
+        if key not in self.responses:
+            raise KeyError('No recorded response for %s %s' % (method, key[2] or url))
+        responses = self.responses[key]
+        index = self.counts.get(key, 0)
+        self.counts[key] = index + 1
+        return responses[min(index, len(responses) - 1)]
+
+
+def record_comments(youtube_id, filename, downloader=None, **kwargs):
+    """
+    Downloads the comments of a video and saves all responses to `filename`. The keyword arguments are passed on to
+    get_comments. Returns the number of comments.
+    """
+    downloader = downloader or YoutubeCommentDownloader()
+    session = downloader.session = RecordingSession(downloader.session)
+    try:
+        count = sum(1 for _ in downloader.get_comments(youtube_id, **kwargs))
+    finally:
+        downloader.session = session.session
+    session.save(filename)
+    return count
@@ -0,0 +1,55 @@
+import email.utils
+import random
+import time
+
+# Status codes that are worth retrying, and the subset that means we are making too many requests
+RETRY_STATUS_CODES = (408, 429, 500, 502, 503, 504)
+THROTTLE_STATUS_CODES = (429, 503)
+
+
+def parse_retry_after(value):
+    """
+    Converts a Retry-After header (either a number of seconds or an HTTP date) into a number of seconds.
+    """
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, email.utils.parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+class RetryPolicy:
+    """
+    Exponential backoff with jitter. The n-th retry waits backoff * 2^n seconds (at most max_backoff), of which a
+    random fraction (up to `jitter`) is left out, so that clients that failed at the same time do not retry at the same
+    time. A Retry-After header sent by the server takes precedence, unless it asks us to wait longer than
+    `max_retry_after` seconds, in which case we give up.
+    """
+
+    def __init__(self, retries=5, backoff=2, max_backoff=60, jitter=0.5, max_retry_after=300):
+        self.retries = retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.jitter = jitter
+        self.max_retry_after = max_retry_after
+
+    def should_retry(self, status_code):
+        # status_code is None if no response was received (e.g. a timeout)
+        return status_code is None or status_code in RETRY_STATUS_CODES
+
+    def get_delay(self, attempt, status_code=None, retry_after=None):
+        """
+        Returns the number of seconds to wait before making the next attempt, or None if we should give up.
+        Attempts are numbered from 0.
+        """
+        if attempt >= self.retries or not self.should_retry(status_code):
+            return None
+        if retry_after is not None:
+            return retry_after if retry_after <= self.max_retry_after else None
+        delay = min(self.max_backoff, self.backoff * 2 ** attempt)
+        return delay * (1 - self.jitter * random.random())
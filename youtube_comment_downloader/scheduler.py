@@ -0,0 +1,106 @@
+from collections import deque
+
+DEPTH_FIRST = 'depth-first'
+BREADTH_FIRST = 'breadth-first'
+ORDERS = (DEPTH_FIRST, BREADTH_FIRST)
+
+
+class ContinuationScheduler:
+    """
+    Decides which pending continuation is fetched next. Continuations for pages of threads and for reply threads
+    are added while a page is parsed, and pop() returns the next one to fetch.
+
+    In depth-first order (the default) the replies of every thread are downloaded before the next page of threads,
+    so comments come out in the order in which they appear on Youtube and at most one page worth of continuations is
+    pending at any time. In breadth-first order, pages of threads are downloaded first and reply threads are queued
+    until `max_pending` of them are waiting, at which point they are downloaded before the next page. The replies
+    of a thread are always downloaded without interruption.
+
+    Iterating over the scheduler yields the pending continuations in the opposite order of pop() (the same order
+    as the plain list that was used before). get_state() returns everything that is needed to continue in the
+    same order later on, e.g. when resuming from a checkpoint.
+    """
+
+    def __init__(self, continuations=(), order=DEPTH_FIRST, max_pending=1000):
+        if order not in ORDERS:
+            raise ValueError('unknown order %r, expected one of %s' % (order, ', '.join(ORDERS)))
+        self.order = order
+        self.max_pending = max_pending
+        # Both deques are popped from the right. In depth-first order, everything goes into `replies`.
+        self.replies = deque(continuations)
+        self.pages = deque()
+        self.continuing = False
+
+    @classmethod
+    def from_state(cls, state, max_pending=1000):
+        """
+        Restores a scheduler from the result of get_state(), with the order and max_pending it had. A plain list of
+        continuations (as stored in checkpoints by earlier versions) is continued in depth-first order.
+        """
+        if isinstance(state, list):
+            return cls(state, max_pending=max_pending)
+        scheduler = cls(state['replies'], state['order'], state['max_pending'])
+        scheduler.pages.extend(state['pages'])
+        scheduler.continuing = state['continuing']
+        return scheduler
+
+    def get_state(self):
+        """
+        Returns the order and the pending continuations as a JSON serializable dictionary.
+        """
+        return {'order': self.order,
+                'max_pending': self.max_pending,
+                'replies': list(self.replies),
+                'pages': list(self.pages),
+                'continuing': self.continuing}
+
+    def __len__(self):
+        return len(self.replies) + len(self.pages)
+
+    def __iter__(self):
+        return reversed(list(reversed(self)))
+
+    def __reversed__(self):
+        # Simulates pop() without modifying the deques, so the upcoming continuations can be prefetched
+        replies, pages = reversed(self.replies), reversed(self.pages)
+        reply_count, page_count = len(self.replies), len(self.pages)
+        continuing = self.continuing
+        while reply_count or page_count:
+            if self.take_page(reply_count, page_count, continuing):
+                page_count -= 1
+                yield next(pages)
+            else:
+                reply_count -= 1
+                yield next(replies)
+            continuing = False
+
+    def take_page(self, reply_count, page_count, continuing):
+        if not page_count or not reply_count:
+            return bool(page_count)
+        return not continuing and (self.max_pending is None or reply_count < self.max_pending)
+
+    def add_pages(self, endpoints):
+        """
+        Adds the continuations for the next page of threads.
+        """
+        pages = self.pages if self.order == BREADTH_FIRST else self.replies
+        pages.extendleft(reversed(endpoints))
+
+    def add_threads(self, endpoints):
+        """
+        Adds the continuations for the replies of a thread. Threads are downloaded in the order they were added.
+        """
+        self.replies.extendleft(reversed(endpoints))
+
+    def add_more_replies(self, endpoint):
+        """
+        Adds the continuation of the 'Show more replies' button of the reply thread that is being downloaded, which
+        is fetched next.
+        """
+        self.replies.append(endpoint)
+        self.continuing = True
+
+    def pop(self):
+        take_page = self.take_page(len(self.replies), len(self.pages), self.continuing)
+        self.continuing = False
+        return self.pages.pop() if take_page else self.replies.pop()
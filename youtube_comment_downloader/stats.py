@@ -0,0 +1,168 @@
+import io
+import json
+import os
+import threading
+import time
+
+# Upper bounds (in seconds) of the request latency histogram
+LATENCY_BUCKETS = (.05, .1, .25, .5, 1, 2.5, 5, 10, float('inf'))
+
+STAGES = ('decode', 'index', 'comments', 'time_parsed')
+
+
+def get_response_size(response):
+    content = getattr(response, 'content', None)
+    return len(content if content is not None else response.text)
+
+
+class Hooks:
+    """
+    Base class for instrumentation hooks, which can be passed to the downloaders. All methods do nothing, so
+    subclasses only need to implement the events they are interested in. Hooks may be called from several threads
+    at once (e.g. when using concurrency or BatchDownloader).
+    """
+
+    def on_request(self, method, url, status_code, seconds, size):
+        """
+        Called after every HTTP request. status_code and size are None if no response was received.
+        """
+
+    def on_decode(self, seconds):
+        """
+        Called after the JSON of an InnerTube response has been decoded.
+        """
+
+    def on_retry(self, url, attempt, status_code, delay):
+        """
+        Called when a failed request will be retried after `delay` seconds.
+        """
+
+    def on_page(self, timings, comments):
+        """
+        Called after a page of comments has been processed, with the number of comments on it and the seconds
+        spent indexing the response ('index'), building the comments ('comments') and parsing their time
+        ('time_parsed', which is part of 'comments').
+        """
+
+    def on_comment(self, comment):
+        """
+        Called for every comment that is yielded.
+        """
+
+
+class StatsCollector(Hooks):
+    """
+    Collects request, retry, page and comment statistics. summary() returns them as a dictionary (to find out whether
+    a download is network or CPU bound, compare network_seconds with the stage_seconds), and prometheus() returns
+    them as counters in the Prometheus text format.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.start_time = time.monotonic()
+        self.requests = {}
+        self.request_seconds = 0.0
+        self.max_request_seconds = 0.0
+        self.latency_buckets = [0] * len(LATENCY_BUCKETS)
+        self.bytes = 0
+        self.retries = {}
+        self.retry_seconds = 0.0
+        self.pages = 0
+        self.stage_seconds = dict.fromkeys(STAGES, 0.0)
+        self.comments = 0
+
+    def on_request(self, method, url, status_code, seconds, size):
+        with self.lock:
+            status = str(status_code) if status_code is not None else 'none'
+            self.requests[status] = self.requests.get(status, 0) + 1
+            self.request_seconds += seconds
+            self.max_request_seconds = max(self.max_request_seconds, seconds)
+            for index, bound in enumerate(LATENCY_BUCKETS):
+                if seconds <= bound:
+                    self.latency_buckets[index] += 1
+                    break
+            self.bytes += size or 0
+
+    def on_decode(self, seconds):
+        with self.lock:
+            self.stage_seconds['decode'] += seconds
+
+    def on_retry(self, url, attempt, status_code, delay):
+        with self.lock:
+            status = str(status_code) if status_code is not None else 'none'
+            self.retries[status] = self.retries.get(status, 0) + 1
+            self.retry_seconds += delay
+
+    def on_page(self, timings, comments):
+        with self.lock:
+            self.pages += 1
+            for stage, seconds in timings.items():
+                self.stage_seconds[stage] += seconds
+
+    def on_comment(self, comment):
+        with self.lock:
+            self.comments += 1
+
+    def summary(self):
+        with self.lock:
+            elapsed = time.monotonic() - self.start_time
+            count = sum(self.requests.values())
+            return {'elapsed_seconds': elapsed,
+                    'requests': count,
+                    'requests_by_status': dict(self.requests),
+                    'network_seconds': self.request_seconds,
+                    'mean_request_seconds': self.request_seconds / count if count else 0.0,
+                    'max_request_seconds': self.max_request_seconds,
+                    'bytes': self.bytes,
+                    'retries': sum(self.retries.values()),
+                    'retries_by_status': dict(self.retries),
+                    'retry_delay_seconds': self.retry_seconds,
+                    'pages': self.pages,
+                    'stage_seconds': dict(self.stage_seconds),
+                    'comments': self.comments,
+                    'comments_per_second': self.comments / elapsed if elapsed else 0.0}
+
+    def prometheus(self, prefix='youtube_comment_downloader'):
+        with self.lock:
+            lines = []
+
+            def metric(name, kind, help, samples):
+                lines.append('# HELP %s_%s %s' % (prefix, name, help))
+                lines.append('# TYPE %s_%s %s' % (prefix, name, kind))
+                for suffix, labels, value in samples:
+                    label_text = ','.join('%s="%s"' % label for label in labels)
+                    lines.append('%s_%s%s%s %s' % (prefix, name, suffix, '{%s}' % label_text if label_text else '',
+                                                    repr(float(value))))
+
+            metric('requests_total', 'counter', 'HTTP requests by status code',
+                   [('', [('status', status)], count) for status, count in sorted(self.requests.items())])
+            buckets, cumulative = [], 0
+            for bound, count in zip(LATENCY_BUCKETS, self.latency_buckets):
+                cumulative += count
+                buckets.append(('_bucket', [('le', '+Inf' if bound == float('inf') else repr(float(bound)))],
+                                cumulative))
+            metric('request_duration_seconds', 'histogram', 'HTTP request latency',
+                   buckets + [('_sum', [], self.request_seconds), ('_count', [], cumulative)])
+            metric('response_bytes_total', 'counter', 'Size of the HTTP responses', [('', [], self.bytes)])
+            metric('retries_total', 'counter', 'Retried requests by status code',
+                   [('', [('status', status)], count) for status, count in sorted(self.retries.items())])
+            metric('retry_delay_seconds_total', 'counter', 'Time spent waiting before retries',
+                   [('', [], self.retry_seconds)])
+            metric('pages_total', 'counter', 'Pages of comments processed', [('', [], self.pages)])
+            metric('stage_seconds_total', 'counter', 'Time spent processing responses by stage',
+                   [('', [('stage', stage)], seconds) for stage, seconds in self.stage_seconds.items()])
+            metric('comments_total', 'counter', 'Comments yielded', [('', [], self.comments)])
+            return '\n'.join(lines) + '\n'
+
+    def write(self, filename, text):
+        # Write to a temporary file first, so that readers (e.g. the node exporter) never see a partial file
+        tmp_filename = filename + '.tmp'
+        with io.open(tmp_filename, 'w', encoding='utf8') as fp:
+            fp.write(text)
+        os.replace(tmp_filename, filename)
+
+    def write_summary(self, filename):
+        self.write(filename, json.dumps(self.summary(), indent=4) + '\n')
+
+    def write_prometheus(self, filename):
+        self.write(filename, self.prometheus())
@@ -0,0 +1,94 @@
+import datetime
+import functools
+import re
+
+SECOND, MINUTE, HOUR, DAY, WEEK, MONTH, YEAR = range(7)
+
+# Unit words as they appear in the relative times that Youtube generates for the languages we support
+UNITS = {
+    # English
+    'second': SECOND, 'seconds': SECOND, 'minute': MINUTE, 'minutes': MINUTE, 'hour': HOUR, 'hours': HOUR,
+    'day': DAY, 'days': DAY, 'week': WEEK, 'weeks': WEEK, 'month': MONTH, 'months': MONTH, 'year': YEAR, 'years': YEAR,
+    # German
+    'sekunde': SECOND, 'sekunden': SECOND, 'minuten': MINUTE, 'stunde': HOUR, 'stunden': HOUR,
+    'tag': DAY, 'tagen': DAY, 'woche': WEEK, 'wochen': WEEK, 'monat': MONTH, 'monaten': MONTH,
+    'jahr': YEAR, 'jahren': YEAR,
+    # French
+    'seconde': SECOND, 'secondes': SECOND, 'heure': HOUR, 'heures': HOUR, 'jour': DAY, 'jours': DAY,
+    'semaine': WEEK, 'semaines': WEEK, 'mois': MONTH, 'an': YEAR, 'ans': YEAR,
+    # Spanish and Portuguese
+    'segundo': SECOND, 'segundos': SECOND, 'minuto': MINUTE, 'minutos': MINUTE, 'hora': HOUR, 'horas': HOUR,
+    'día': DAY, 'días': DAY, 'dia': DAY, 'dias': DAY, 'semana': WEEK, 'semanas': WEEK,
+    'mes': MONTH, 'meses': MONTH, 'mês': MONTH, 'año': YEAR, 'años': YEAR, 'ano': YEAR, 'anos': YEAR,
+    # Italian
+    'secondo': SECOND, 'secondi': SECOND, 'minuti': MINUTE, 'ora': HOUR, 'ore': HOUR, 'giorno': DAY, 'giorni': DAY,
+    'settimana': WEEK, 'settimane': WEEK, 'mese': MONTH, 'mesi': MONTH, 'anno': YEAR, 'anni': YEAR,
+    # Dutch
+    'seconden': SECOND, 'minuut': MINUTE, 'uur': HOUR, 'dag': DAY, 'dagen': DAY,
+    'weken': WEEK, 'maand': MONTH, 'maanden': MONTH, 'jaar': YEAR,
+    # Russian
+    'секунду': SECOND, 'секунды': SECOND, 'секунд': SECOND, 'минуту': MINUTE, 'минуты': MINUTE, 'минут': MINUTE,
+    'час': HOUR, 'часа': HOUR, 'часов': HOUR, 'день': DAY, 'дня': DAY, 'дней': DAY,
+    'неделю': WEEK, 'недели': WEEK, 'недель': WEEK, 'месяц': MONTH, 'месяца': MONTH, 'месяцев': MONTH,
+    'год': YEAR, 'года': YEAR, 'лет': YEAR,
+}
+
+RELATIVE_TIME_RE = re.compile(r'^(?:vor|il y a|hace|há|ha)?\s*(\d+)\s+(\w+)\s*(?:ago|fa|geleden|назад)?$')
+
+TIMEDELTAS = {SECOND: datetime.timedelta(seconds=1), MINUTE: datetime.timedelta(minutes=1),
+              HOUR: datetime.timedelta(hours=1), DAY: datetime.timedelta(days=1), WEEK: datetime.timedelta(weeks=1)}
+
+
+def normalize(text):
+    # Strip annotations such as '(edited)'
+    return ' '.join(text.split('(')[0].lower().split())
+
+
+def subtract_months(date, months):
+    year, month = divmod(date.year * 12 + date.month - 1 - months, 12)
+    month += 1
+    # Clamp the day to the length of the target month, like dateutil's relativedelta does
+    next_month = datetime.date(year + month // 12, month % 12 + 1, 1)
+    last_day = (next_month - datetime.timedelta(days=1)).day
+    return date.replace(year=year, month=month, day=min(date.day, last_day))
+
+
+def parse_relative_time(text, now):
+    """
+    Parses a relative time like '3 days ago' into a timestamp, relative to the timestamp `now`.
+    Returns None if the text is not understood.
+    """
+    match = RELATIVE_TIME_RE.match(normalize(text))
+    unit = UNITS.get(match.group(2)) if match else None
+    if unit is None:
+        return None
+
+    amount = int(match.group(1))
+    date = datetime.datetime.fromtimestamp(now)
+    if unit == MONTH:
+        date = subtract_months(date, amount)
+    elif unit == YEAR:
+        date = subtract_months(date, 12 * amount)
+    else:
+        date -= amount * TIMEDELTAS[unit]
+    return date.timestamp()
+
+
+@functools.lru_cache(maxsize=4096)
+def _parse_time(text, now):
+    timestamp = parse_relative_time(text, now)
+    if timestamp is None:
+        # dateparser takes a long time to import, so only load it when it is actually needed
+        import dateparser
+        date = dateparser.parse(text, settings={'RELATIVE_BASE': datetime.datetime.fromtimestamp(now)})
+        timestamp = date.timestamp() if date else None
+    return timestamp
+
+
+def parse_time(text, now):
+    """
+    Converts the time of a comment (e.g. '1 year ago (edited)') into a timestamp, relative to the time at which
+    the comment was fetched. Falls back to dateparser for formats that are not recognized. Returns None if the time
+    could not be parsed. Results are cached per normalized text and second.
+    """
+    return _parse_time(normalize(text), int(now))
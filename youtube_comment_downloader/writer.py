@@ -0,0 +1,183 @@
+import itertools
+import json
+import math
+import time
+from json.encoder import encode_basestring
+
+from .comment import as_dict
+
+INDENT = 4
+
+ENCODER = json.JSONEncoder(ensure_ascii=False)
+
+# Besides \n, str.splitlines also breaks lines at these characters, which json does not escape. to_json pads the
+# lines that follow them as well, so the fast path has to do the same to produce identical output.
+EXTRA_LINE_BREAKS = '\x85\u2028\u2029'
+
+
+def to_json(comment, indent=None):
+    comment_str = json.dumps(comment, ensure_ascii=False, indent=indent)
+    if indent is None:
+        return comment_str
+    padding = ' ' * (2 * indent) if indent else ''
+    return ''.join(padding + line for line in comment_str.splitlines(True))
+
+
+def get_string_encoder():
+    """
+    Returns a function that encodes a string to JSON, exactly like json.dumps(..., ensure_ascii=False) does. orjson
+    is used if it is installed, since it is a lot faster.
+    """
+    try:
+        import orjson
+    except ImportError:
+        return encode_basestring
+
+    def encode(value):
+        try:
+            return orjson.dumps(value).decode('utf8')
+        except TypeError:
+            # E.g. lone surrogates, which json lets through
+            return encode_basestring(value)
+    return encode
+
+
+class CommentWriter:
+    """
+    Writes comments to a file, either as line delimited JSON or as indented JSON, producing exactly the same output
+    as to_json. Comments are collected in a buffer that is written to the file once it holds `buffer_size`
+    characters. The optional callback is called with the number of comments written so far, at most once every
+    `interval` seconds (and once more when the writer is closed).
+
+    When appending to an earlier (partial) download, `count` is the number of comments already in the file and
+    `header` should be False. flush and tell can be used in place of those of the file (e.g. by a Checkpoint), so that
+    buffered comments are taken into account.
+    """
+
+    def __init__(self, fp, pretty=False, count=0, header=True, callback=None, interval=.2, buffer_size=1 << 16):
+        self.fp = fp
+        self.pretty = pretty
+        self.count = count
+        self.callback = callback
+        self.interval = interval
+        self.buffer_size = buffer_size
+        self.buffer = []
+        self.buffered = 0
+        self.last_callback = time.monotonic()
+        self.encode_string = get_string_encoder()
+        self.keys = {}
+
+        if pretty and header:
+            self.buffer.append('{\n' + ' ' * INDENT + '"comments": [\n')
+
+    def encode(self, comment):
+        # Comments are flat dictionaries, which are encoded here without going through json's (slow) indenting
+        # encoder. Anything else is left to to_json.
+        encode_string = self.encode_string
+        lines = []
+        for key, value in comment.items():
+            prefix = self.keys.get(key)
+            if prefix is None:
+                if type(key) is not str:
+                    return None
+                prefix = self.keys[key] = ' ' * (3 * INDENT) + encode_string(key) + ': '
+
+            value_type = type(value)
+            if value_type is str:
+                value = encode_string(value)
+            elif value_type is bool:
+                value = 'true' if value else 'false'
+            elif value is None:
+                value = 'null'
+            elif value_type is int:
+                value = int.__repr__(value)
+            elif value_type is float and math.isfinite(value):
+                value = float.__repr__(value)
+            elif value_type in (dict, list, tuple):
+                return None
+            else:
+                value = ENCODER.encode(value)
+            lines.append(prefix + value)
+
+        if not lines:
+            return ' ' * (2 * INDENT) + '{}'
+        text = ' ' * (2 * INDENT) + '{\n' + ',\n'.join(lines) + '\n' + ' ' * (2 * INDENT) + '}'
+        for char in EXTRA_LINE_BREAKS:
+            if char in text:
+                text = text.replace(char, char + ' ' * (2 * INDENT))
+        return text
+
+    def write(self, comment):
+        comment = as_dict(comment)
+        if self.pretty:
+            text = self.encode(comment)
+            if text is None:
+                text = to_json(comment, indent=INDENT)
+            # The separator is written in front of the comment, so we don't need to know whether more will follow
+            text = (',\n' if self.count else '') + text
+        else:
+            # json's C encoder is used for line delimited JSON, which is faster than encoding field by field
+            text = ENCODER.encode(comment) + '\n'
+        self.buffer.append(text)
+        self.buffered += len(text)
+        self.count += 1
+
+        if self.buffered >= self.buffer_size:
+            self.write_buffer()
+        if self.callback and time.monotonic() - self.last_callback >= self.interval:
+            self.last_callback = time.monotonic()
+            self.callback(self.count)
+
+    def write_buffer(self):
+        if self.buffer:
+            self.fp.write(''.join(self.buffer))
+            self.buffer = []
+            self.buffered = 0
+
+    def flush(self):
+        self.write_buffer()
+        self.fp.flush()
+
+    def tell(self):
+        self.write_buffer()
+        return self.fp.tell()
+
+    def close(self):
+        """
+        Writes what is left in the buffer (and the end of the JSON document), without closing the file itself.
+        """
+        if self.pretty:
+            self.buffer.append(('\n' if self.count else '') + ' ' * INDENT + ']\n}')
+        self.write_buffer()
+        if self.callback:
+            self.callback(self.count)
+
+
+def write_comments(fp, generator, pretty=False, limit=None, callback=None, count=0, header=True, interval=.2,
+                   checkpoint=None):
+    """
+    Write the comments produced by `generator` to `fp`, either as line delimited JSON or as indented JSON.
+    The optional callback is called with the number of comments written so far, at most once every `interval`
+    seconds. Returns that number. When appending to an earlier (partial) download, `count` is the number of comments
+    already in the file and `header` should be False.
+
+    Comments are buffered, so a Checkpoint that is updated while the comments are being downloaded should be passed
+    along. It then flushes the buffer before determining the position in the file.
+    """
+    writer = CommentWriter(fp, pretty=pretty, count=count, header=header, callback=callback, interval=interval)
+    if checkpoint:
+        checkpoint.fp = writer
+
+    if limit:
+        generator = itertools.islice(generator, max(limit - count, 0))
+
+    try:
+        for comment in generator:
+            writer.write(comment)
+    except BaseException:
+        # Keep the comments that were downloaded before the error, like an unbuffered write would have
+        writer.write_buffer()
+        raise
+
+    writer.close()
+    return writer.count